@@ -1,23 +1,72 @@
 import os
 import time
+import asyncio
+import threading
 import base64
 import mimetypes
 import re
 import csv
 import json
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
-import google.generativeai as genai
-from PIL import Image
-from docx import Document
-import pandas as pd
 from pathlib import Path
+import config
+from duplicate_index import (DEFAULT_DUPLICATE_THRESHOLD, compute_content_hash, compute_page_hash, open_page_index,
+                             texts_match)
+from normalization import TableNormalizer
+from record_index import get_record_index
+from review_writer import REVIEW_FORMATS, CONSOLIDATION_MODES, ReviewDocumentWriter, write_docx
+from scheduler import PRIORITY_CLASSES, DEFAULT_PRIORITY
+from manifest import load_manifest
+from page_splitter import plan_segments, render_segments, stitch_text
+from gap_filling import GapFiller
+from json_stream import StreamingJSONParser
+from profiling import JobProfiler, profiled
+from file_listing import get_listing_cache
+from model_pool import get_model_pool
+from table_mapping import TableMapper
 
 # === Config ===
-genai.configure(api_key="***your Google Gemini API key****")
+# Heavy dependencies (google.generativeai, pandas, python-docx, Pillow) and the
+# Gemini clients are loaded on first use so importing this module stays cheap.
+# Set GEMINI_API_KEY (or several in GEMINI_API_KEYS, and optionally
+# GEMINI_MODEL_NAME) in the environment; calls go through the model pool.
+
+
+def warm_up():
+    """Load heavy dependencies and build the model client ahead of the first request"""
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+    import docx  # noqa: F401
+    import PIL.Image  # noqa: F401
+    get_model_pool().warm_up()
+    print(f"🔥 Warm-up completed in {time.perf_counter() - start:.2f}s")
+
+@contextmanager
+def interprocess_lock(lock_path: str):
+    """Exclusive advisory file lock shared by every process writing to the same output folder"""
+    with open(lock_path, "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# Files whose records are written to the CSV tables together during batch runs
+BATCH_CSV_FLUSH_FILES = 50
 
-# Load the Gemini multimodal model
-model = genai.GenerativeModel(model_name="gemini-1.5-flash")
 
 # Database table definitions with common fields
 DATABASE_TABLES = {
@@ -42,6 +91,20 @@ class MedicalDataProcessor:
     def __init__(self):
         self.processed_data = {}
         self.cleansing_patterns = self._setup_cleansing_patterns()
+        # Vectorized date/unit normalization applied to each table before it is written
+        self.normalizer = TableNormalizer(self.cleansing_patterns)
+        self.normalize_output = True
+        # Keep the query index (record_index.py) in step with every CSV write
+        self.index_records = True
+        # Serializes CSV read-modify-write when files are processed concurrently
+        self._csv_lock = threading.Lock()
+        # Follow-up prompt for missing or implausible fields instead of a whole-document retry
+        self.gap_filler = GapFiller(DATABASE_TABLES)
+        # Structured sections -> table rows (table_mapping.SECTION_MAPPINGS), resolved once
+        self.table_mapper = TableMapper(DATABASE_TABLES)
+        self.fill_gaps = True
+        # Stream the structuring response and hand on list entries as they complete
+        self.stream_responses = config.get_stream_responses()
 
     def _setup_cleansing_patterns(self):
         """Setup regex patterns for data cleansing"""
@@ -81,10 +144,9 @@ class MedicalDataProcessor:
 
         return text.strip()
 
-    def extract_structured_data(self, text: str) -> Dict[str, Any]:
-        """Extract structured data using enhanced AI prompting"""
-
-        structured_prompt = f"""
+    def _build_structured_prompt(self, text: str) -> str:
+        """Build the prompt asking the model for structured JSON"""
+        return f"""
         Please analyze this medical document text and extract structured information. 
         Return the data in JSON format with the following categories:
 
@@ -154,22 +216,100 @@ class MedicalDataProcessor:
         Return only valid JSON without any additional text or formatting.
         """
 
+    def _parse_structured_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse the model's JSON answer, stripping code fences"""
+        # Clean the response to extract JSON
+        response_text = response_text.strip()
+
+        # Remove code blocks if present
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+
+        return json.loads(response_text)
+
+    def extract_structured_data(self, text: str, on_item=None) -> Dict[str, Any]:
+        """Extract structured data using enhanced AI prompting.
+
+        When streaming, on_item(section, index, entry) is called for each list
+        entry as soon as the model has finished writing it, and again for
+        entries that gap filling amends afterwards.
+        """
         try:
-            response = model.generate_content(structured_prompt)
-            # Clean the response to extract JSON
-            response_text = response.text.strip()
+            prompt = self._build_structured_prompt(text)
+            if self.stream_responses:
+                parser = StreamingJSONParser()
+                for chunk in get_model_pool().generate_content('structure', prompt, stream=True):
+                    self._hand_on_items(parser.feed(chunk.text), on_item)
+                structured_data = parser.close()
+            else:
+                response = get_model_pool().generate_content('structure', prompt)
+                structured_data = self._parse_structured_response(response.text)
+        except Exception as e:
+            print(f"Error in structured extraction: {e}")
+            return self._fallback_extraction(text)
 
-            # Remove code blocks if present
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
+        prompt, asked = self._gap_prompt(structured_data, text)
+        if prompt:
+            try:
+                response = get_model_pool().generate_content('structure', prompt)
+                self._apply_gap_answers(structured_data, asked, response.text, on_item)
+            except Exception as e:
+                print(f"Gap-filling follow-up failed: {e}")
+        return structured_data
 
-            return json.loads(response_text)
+    async def extract_structured_data_async(self, text: str, on_item=None) -> Dict[str, Any]:
+        """Async variant of extract_structured_data using the SDK's async call"""
+        try:
+            prompt = self._build_structured_prompt(text)
+            if self.stream_responses:
+                parser = StreamingJSONParser()
+                response = await get_model_pool().generate_content_async('structure', prompt, stream=True)
+                async for chunk in response:
+                    self._hand_on_items(parser.feed(chunk.text), on_item)
+                structured_data = parser.close()
+            else:
+                response = await get_model_pool().generate_content_async('structure', prompt)
+                structured_data = self._parse_structured_response(response.text)
         except Exception as e:
             print(f"Error in structured extraction: {e}")
             return self._fallback_extraction(text)
 
+        prompt, asked = self._gap_prompt(structured_data, text)
+        if prompt:
+            try:
+                response = await get_model_pool().generate_content_async('structure', prompt)
+                self._apply_gap_answers(structured_data, asked, response.text, on_item)
+            except Exception as e:
+                print(f"Gap-filling follow-up failed: {e}")
+        return structured_data
+
+    def _hand_on_items(self, items: List[Tuple[str, int, Any]], on_item):
+        """Pass list entries completed by the latest streamed chunk to on_item"""
+        if on_item is not None:
+            for section, index, item in items:
+                on_item(section, index, item)
+
+    def _gap_prompt(self, structured_data: Dict[str, Any], text: str) -> Tuple[Optional[str], List[Dict]]:
+        """Focused follow-up prompt for missing or implausible fields, if any need one"""
+        if not self.fill_gaps or not isinstance(structured_data, dict):
+            return None, []
+        gaps = self.gap_filler.find_gaps(structured_data)
+        if not gaps:
+            return None, []
+        return self.gap_filler.build_prompt(gaps, text)
+
+    def _apply_gap_answers(self, structured_data: Dict[str, Any], asked: List[Dict], response_text: str,
+                           on_item=None):
+        filled = self.gap_filler.apply(structured_data, asked, self._parse_structured_response(response_text))
+        print(f"🩹 Filled {filled}/{len(asked)} missing or implausible fields")
+        if on_item is not None and filled:
+            # List entries that may have changed since they were handed on
+            amended = {(gap['section'], gap['index']) for gap in asked if gap['index'] is not None}
+            self._hand_on_items([(section, index, structured_data[section][index])
+                                 for section, index in sorted(amended)], on_item)
+
     def _fallback_extraction(self, text: str) -> Dict[str, Any]:
         """Fallback extraction using regex patterns"""
         data = {
@@ -310,184 +450,159 @@ class MedicalDataProcessor:
     def convert_to_database_format(self, structured_data: Dict[str, Any], source_file: str, full_text: str,
                                    patient_id: str) -> Dict[str, List[Dict]]:
         """Convert structured data to database format with custom patient ID"""
-        database_records = {}
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return RecordBuilder(self, source_file, full_text, patient_id).build(structured_data)
 
-        # Create comprehensive notes from full text
-        comprehensive_notes = self._create_comprehensive_notes(structured_data, full_text)
-
-        # Patient Registration
-        if structured_data.get("PATIENT_INFO"):
-            patient_info = structured_data["PATIENT_INFO"]
-            if any(patient_info.values()):
-                name_parts = patient_info.get("name", "").split() if patient_info.get("name") else ["", ""]
-                first_name = name_parts[0] if name_parts else ""
-                last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-
-                database_records["patients_registration"] = [{
-                    "patient_id": patient_id,
-                    "first_name": first_name,
-                    "last_name": last_name,
-                    "date_of_birth": patient_info.get("dob", ""),
-                    "gender": patient_info.get("gender", ""),
-                    "phone": patient_info.get("phone", ""),
-                    "email": patient_info.get("email", ""),
-                    "address": patient_info.get("address", ""),
-                    "emergency_contact": "",
-                    "medical_record_number": patient_info.get("mrn", ""),
-                    "notes": comprehensive_notes.get("patient_notes", ""),
-                    "source_file": source_file,
-                    "processed_date": timestamp
-                }]
-
-        # Vitals History
-        if structured_data.get("VITALS") and any(structured_data["VITALS"].values()):
-            vitals = structured_data["VITALS"]
-            bp_parts = vitals.get("blood_pressure", "").split("/") if vitals.get("blood_pressure") else ["", ""]
-
-            database_records["vitals_history"] = [{
-                "patient_id": patient_id,
-                "blood_pressure_systolic": bp_parts[0] if len(bp_parts) > 0 else "",
-                "blood_pressure_diastolic": bp_parts[1] if len(bp_parts) > 1 else "",
-                "heart_rate": vitals.get("heart_rate", ""),
-                "temperature": vitals.get("temperature", ""),
-                "weight": vitals.get("weight", ""),
-                "height": vitals.get("height", ""),
-                "date_recorded": vitals.get("date", timestamp),
-                "notes": comprehensive_notes.get("vitals_notes", ""),
-                "source_file": source_file
-            }]
-
-        # Medications/Prescriptions
-        if structured_data.get("MEDICATIONS"):
-            database_records["prescription"] = []
-            for med in structured_data["MEDICATIONS"]:
-                if med.get("name"):
-                    database_records["prescription"].append({
-                        "patient_id": patient_id,
-                        "medication": med.get("name", ""),
-                        "dosage": med.get("dosage", ""),
-                        "frequency": med.get("frequency", ""),
-                        "start_date": med.get("start_date", timestamp),
-                        "end_date": med.get("end_date", ""),
-                        "doctor_id": "",
-                        "instructions": med.get("instructions", ""),
-                        "notes": comprehensive_notes.get("medication_notes", ""),
-                        "source_file": source_file
-                    })
-
-        # Allergies
-        if structured_data.get("ALLERGIES"):
-            database_records["allergy_records"] = []
-            for allergy in structured_data["ALLERGIES"]:
-                if allergy.get("allergen"):
-                    database_records["allergy_records"].append({
-                        "patient_id": patient_id,
-                        "allergen": allergy.get("allergen", ""),
-                        "reaction_type": allergy.get("reaction", ""),
-                        "severity": allergy.get("severity", ""),
-                        "date_recorded": timestamp,
-                        "notes": comprehensive_notes.get("allergy_notes", ""),
-                        "source_file": source_file
-                    })
+    def convert_batch_to_dataframes(self, documents: List[Dict[str, Any]]):
+        """Convert many documents' structured data straight into one DataFrame per table.
 
-        # Diagnoses
-        if structured_data.get("DIAGNOSES"):
-            database_records["diagnosis"] = []
-            for diag in structured_data["DIAGNOSES"]:
-                if diag.get("condition"):
-                    database_records["diagnosis"].append({
-                        "patient_id": patient_id,
-                        "primary_diagnosis": diag.get("condition", ""),
-                        "secondary_diagnosis": "",
-                        "icd_code": diag.get("icd_code", ""),
-                        "diagnosis_date": diag.get("date", timestamp),
-                        "doctor_id": "",
-                        "status": diag.get("status", "active"),
-                        "notes": comprehensive_notes.get("diagnosis_notes", ""),
-                        "source_file": source_file
-                    })
-
-        # Lab Results
-        if structured_data.get("LAB_RESULTS"):
-            database_records["bloodtests"] = []
-            for lab in structured_data["LAB_RESULTS"]:
-                if lab.get("test_name"):
-                    database_records["bloodtests"].append({
-                        "patient_id": patient_id,
-                        "test_type": lab.get("test_name", ""),
-                        "result_value": lab.get("result", ""),
-                        "unit": lab.get("unit", ""),
-                        "reference_range": lab.get("reference_range", ""),
-                        "test_date": lab.get("date", timestamp),
-                        "lab_id": "",
-                        "notes": comprehensive_notes.get("lab_notes", ""),
-                        "source_file": source_file
-                    })
+        Each document is a dict with structured_data, source_file, full_text
+        and patient_id; rows come out as convert_to_database_format would
+        make them, without building a dict per row.
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.table_mapper.dataframes(
+            (document['structured_data'], document['patient_id'], document['source_file'], timestamp,
+             self._create_comprehensive_notes({}, document['full_text']))
+            for document in documents)
 
-        # Symptoms
-        if structured_data.get("SYMPTOMS"):
-            database_records["symptoms_checker"] = []
-            for symptom in structured_data["SYMPTOMS"]:
-                if symptom.get("symptom"):
-                    database_records["symptoms_checker"].append({
-                        "patient_id": patient_id,
-                        "symptom": symptom.get("symptom", ""),
-                        "severity": symptom.get("severity", ""),
-                        "duration": symptom.get("duration", ""),
-                        "date_reported": symptom.get("date", timestamp),
-                        "notes": comprehensive_notes.get("symptom_notes", ""),
-                        "source_file": source_file
-                    })
+    def save_to_csv(self, database_records: Dict[str, List[Dict]], csv_output_folder: str):
+        """Save database records to consolidated CSV files by table type"""
+        import pandas as pd
+
+        # The thread lock covers concurrent files in this process; the file lock
+        # covers other worker processes appending to the same tables
+        with self._csv_lock, interprocess_lock(os.path.join(csv_output_folder, ".csv.lock")):
+            for table_name, records in database_records.items():
+                if records:
+                    csv_filename = f"{table_name}.csv"
+                    csv_path = os.path.join(csv_output_folder, csv_filename)
+
+                    df = pd.DataFrame(records)
+                    if self.normalize_output:
+                        df = self.normalizer.normalize(table_name, df)
+
+                    if os.path.exists(csv_path):
+                        existing_df = pd.read_csv(csv_path)
+                        combined_df = pd.concat([existing_df, df], ignore_index=True)
+                        combined_df.to_csv(csv_path, index=False)
+                        print(f"✅ Appended {len(records)} records to {csv_path}")
+                    else:
+                        df.to_csv(csv_path, index=False)
+                        print(f"✅ Created {csv_path} with {len(records)} records")
+
+                    if self.index_records:
+                        get_record_index(csv_output_folder).add_dataframe(table_name, df)
+
+
+    def normalize_csv_history(self, csv_output_folder: str) -> Dict[str, int]:
+        """Re-normalize previously written CSV tables in bulk"""
+        with self._csv_lock, interprocess_lock(os.path.join(csv_output_folder, ".csv.lock")):
+            row_counts = self.normalizer.normalize_csv_folder(csv_output_folder)
+            if self.index_records:
+                get_record_index(csv_output_folder).rebuild_from_csv(csv_output_folder)
+            return row_counts
+
+
+class RecordBuilder:
+    """Builds one document's database records, converting list entries as they arrive.
+
+    While a structured response is streamed, add_item() turns each completed
+    MEDICATIONS / LAB_RESULTS / ... entry into its row straight away (and
+    again if gap filling amends the entry). build() then assembles the
+    records for the final structured data, reusing those rows for the same
+    entry objects and converting everything else, so the result is the same
+    as converting the whole document at the end.
+    """
+
+    def __init__(self, processor: MedicalDataProcessor, source_file: str, full_text: str, patient_id: str):
+        self.processor = processor
+        self.source_file = source_file
+        self.patient_id = patient_id
+        self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Notes only depend on the document text, so they are ready before the first entry
+        self.notes = processor._create_comprehensive_notes({}, full_text)
+        self.started = time.perf_counter()
+        self.first_row_seconds: Optional[float] = None
+        # section -> index -> (entry, its row)
+        self._converted: Dict[str, Dict[int, Tuple[Dict[str, Any], Optional[Dict]]]] = {}
+
+    def _row(self, section: str, content: Any) -> Optional[Dict[str, Any]]:
+        return self.processor.table_mapper.row(section, content, self.patient_id, self.source_file,
+                                               self.timestamp, self.notes)
+
+    def add_item(self, section: str, index: int, item: Any):
+        """Convert one completed entry of a list section"""
+        sections = self.processor.table_mapper.sections
+        if section not in sections or not sections[section][1] or not isinstance(item, dict):
+            return
+        row = self._row(section, item)
+        if row is not None and self.first_row_seconds is None:
+            self.first_row_seconds = time.perf_counter() - self.started
+        self._converted.setdefault(section, {})[index] = (item, row)
 
-        # Family History
-        if structured_data.get("FAMILY_HISTORY"):
-            database_records["family_history"] = []
-            for fh in structured_data["FAMILY_HISTORY"]:
-                if fh.get("condition"):
-                    database_records["family_history"].append({
-                        "patient_id": patient_id,
-                        "relation": fh.get("relation", ""),
-                        "condition": fh.get("condition", ""),
-                        "age_of_onset": fh.get("age_of_onset", ""),
-                        "status": "reported",
-                        "notes": comprehensive_notes.get("family_history_notes", ""),
-                        "source_file": source_file
-                    })
+    def build(self, structured_data: Dict[str, Any]) -> Dict[str, List[Dict]]:
+        """Database records for the final structured data"""
+        database_records = {}
+        for section, (table, is_list) in self.processor.table_mapper.sections.items():
+            content = structured_data.get(section)
+            if not is_list:
+                row = self._row(section, content)
+                if row is not None:
+                    database_records[table] = [row]
+            elif content:
+                converted = self._converted.get(section, {})
+                rows = []
+                for index, item in enumerate(content):
+                    if index in converted and converted[index][0] is item:
+                        row = converted[index][1]
+                    else:
+                        row = self._row(section, item)
+                    if row is not None:
+                        rows.append(row)
+                database_records[table] = rows
+        return database_records
 
-        # Social History
-        if structured_data.get("SOCIAL_HISTORY") and any(structured_data["SOCIAL_HISTORY"].values()):
-            social = structured_data["SOCIAL_HISTORY"]
-            database_records["social_history"] = [{
-                "patient_id": patient_id,
-                "smoking_status": social.get("smoking", ""),
-                "alcohol_use": social.get("alcohol", ""),
-                "drug_use": "",
-                "exercise_frequency": social.get("exercise", ""),
-                "occupation": social.get("occupation", ""),
-                "notes": comprehensive_notes.get("social_history_notes", ""),
-                "source_file": source_file
-            }]
 
-        return database_records
+class BufferedRecordWriter:
+    """Collects database records from many files and saves them to the CSV tables in groups.
+
+    Each save re-reads the table, so writing once per group of files instead
+    of once per file keeps the per-document cost of large backfills low.
+    """
+
+    def __init__(self, processor: MedicalDataProcessor, csv_output_folder: str,
+                 flush_files: int = BATCH_CSV_FLUSH_FILES):
+        self.processor = processor
+        self.csv_output_folder = csv_output_folder
+        self.flush_files = flush_files
+        self.errors: List[Dict[str, Any]] = []
+        self._pending: Dict[str, List[Dict]] = {}
+        self._pending_files: List[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, filename: str, database_records: Dict[str, List[Dict]]):
+        """Queue one file's records, saving the group once it is full"""
+        with self._lock:
+            for table_name, records in database_records.items():
+                self._pending.setdefault(table_name, []).extend(records)
+            self._pending_files.append(filename)
+            full = len(self._pending_files) >= self.flush_files
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Save every queued record"""
+        with self._lock:
+            pending, filenames = self._pending, self._pending_files
+            self._pending, self._pending_files = {}, []
+        if not filenames:
+            return
 
-    def save_to_csv(self, database_records: Dict[str, List[Dict]], csv_output_folder: str):
-        """Save database records to consolidated CSV files by table type"""
-        for table_name, records in database_records.items():
-            if records:
-                csv_filename = f"{table_name}.csv"
-                csv_path = os.path.join(csv_output_folder, csv_filename)
-
-                df = pd.DataFrame(records)
-
-                if os.path.exists(csv_path):
-                    existing_df = pd.read_csv(csv_path)
-                    combined_df = pd.concat([existing_df, df], ignore_index=True)
-                    combined_df.to_csv(csv_path, index=False)
-                    print(f"✅ Appended {len(records)} records to {csv_path}")
-                else:
-                    df.to_csv(csv_path, index=False)
-                    print(f"✅ Created {csv_path} with {len(records)} records")
+        try:
+            self.processor.save_to_csv(pending, self.csv_output_folder)
+        except Exception as e:
+            print(f"❌ Error saving records for {len(filenames)} files: {e}")
+            self.errors.append({'filenames': filenames, 'error': str(e)})
 
 
 class MedicalOCRInterface:
@@ -499,6 +614,30 @@ class MedicalOCRInterface:
         self.input_folder = None
         self.output_folder = None
         self.selected_files = []
+        self.max_concurrency = config.get_max_concurrency()
+
+        # Near-duplicate detection for rescanned/re-faxed pages of the same patient; a match only counts once
+        # the bytes or the OCR text are identical to the earlier page
+        self.duplicate_detection = True
+        self.duplicate_threshold = DEFAULT_DUPLICATE_THRESHOLD
+        self.duplicate_policy = 'flag'  # 'flag' and skip the file, or 'reuse' the prior extraction
+        self._page_indexes = {}  # output folder -> its page index, kept open across runs
+
+        # Review artifacts: 'docx', 'markdown' or 'text', optionally consolidated per 'batch' or 'patient'
+        self.review_format = 'docx'
+        self.review_consolidate = None
+
+        # Optional patient registry (patient_directory.PatientDirectory) for ID validation and cross-checks
+        self.patient_directory = None
+
+        # Optional shared scheduler.FairScheduler: global cap and priority/fair-share ordering across requests
+        self.scheduler = None
+
+        # Multi-frame TIFFs and oversized scans are split into frames/strips that are OCR'd concurrently
+        self.tile_max_side = config.get_tile_max_side()
+        self.tile_overlap = config.get_tile_overlap()
+        self.max_decoded_bytes = config.get_max_decoded_mb() * 1024 * 1024
+        self.tile_concurrency = 4
 
     def validate_patient_id(self, patient_id: str) -> Tuple[bool, str]:
         """Validate patient ID input"""
@@ -515,6 +654,10 @@ class MedicalOCRInterface:
         if len(cleaned_id) > 50:
             return False, "Patient ID must be 50 characters or less"
 
+        # Check against the patient registry when one is loaded
+        if self.patient_directory is not None and self.patient_directory.get(cleaned_id) is None:
+            return False, "Patient ID not found in patient registry"
+
         return True, cleaned_id
 
     def validate_folder_path(self, folder_path: str) -> Tuple[bool, str]:
@@ -533,19 +676,12 @@ class MedicalOCRInterface:
         return True, str(path)
 
     def get_supported_image_files(self, folder_path: str) -> List[str]:
-        """Get list of supported image files in folder"""
-        supported_extensions = {'.png', '.jpg', '.jpeg', '.tiff', '.tif', '.bmp', '.webp'}
-        image_files = []
-
+        """Get list of supported image and PDF files in folder"""
         try:
-            folder = Path(folder_path)
-            for file in folder.iterdir():
-                if file.is_file() and file.suffix.lower() in supported_extensions:
-                    image_files.append(str(file))
-        except Exception as e:
+            return get_listing_cache().paths(folder_path)
+        except OSError as e:
             print(f"Error reading folder: {e}")
-
-        return sorted(image_files)
+            return []
 
     def set_patient_id(self, patient_id: str) -> bool:
         """Set and validate patient ID"""
@@ -580,31 +716,73 @@ class MedicalOCRInterface:
             print(f"Invalid output folder: {result}")
             return False
 
+    def set_duplicate_policy(self, policy: str) -> bool:
+        """Set how duplicate pages are handled ('flag' or 'reuse')"""
+        if policy not in ('reuse', 'flag'):
+            print(f"Invalid duplicate policy: {policy}")
+            return False
+        self.duplicate_policy = policy
+        return True
+
+    def set_patient_directory(self, directory) -> bool:
+        """Use a patient registry for ID validation and PATIENT_INFO cross-checks"""
+        self.patient_directory = directory
+        return directory is not None
+
+    def set_scheduler(self, scheduler) -> bool:
+        """Admit async pipeline files through a shared priority/fair-share scheduler"""
+        self.scheduler = scheduler
+        return scheduler is not None
+
+    def set_review_output(self, review_format: str, consolidate: Optional[str] = None) -> bool:
+        """Set the review artifact format and consolidation mode"""
+        if review_format not in REVIEW_FORMATS:
+            print(f"Invalid review format: {review_format}")
+            return False
+        if consolidate not in CONSOLIDATION_MODES:
+            print(f"Invalid review consolidation mode: {consolidate}")
+            return False
+        self.review_format = review_format
+        self.review_consolidate = consolidate
+        return True
+
+    def get_page_index(self, output_folder: Optional[str] = None):
+        """Get the near-duplicate page index for output_folder (default: the current output folder)"""
+        output_folder = output_folder or self.output_folder
+        if not self.duplicate_detection or not output_folder:
+            return None
+
+        # One index per folder, so runs writing to different folders never close each other's
+        key = os.path.abspath(output_folder)
+        page_index = self._page_indexes.get(key)
+        if page_index is None:
+            page_index = self._page_indexes[key] = open_page_index(output_folder, self.duplicate_threshold)
+            print(f"🔎 Loaded {len(page_index)} known pages for duplicate detection")
+        return page_index
+
     def get_available_files(self) -> List[Dict[str, str]]:
-        """Get available image files with metadata"""
+        """Get every available file with metadata; use list_available_files for large folders"""
         if not self.input_folder:
             return []
 
-        files = self.get_supported_image_files(self.input_folder)
-        file_info = []
+        try:
+            return get_listing_cache().describe_all(self.input_folder)
+        except OSError as e:
+            print(f"Error reading folder: {e}")
+            return []
 
-        for file_path in files:
-            path = Path(file_path)
-            try:
-                stat = path.stat()
-                size_mb = round(stat.st_size / (1024 * 1024), 2)
-                modified = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M")
-
-                file_info.append({
-                    'path': file_path,
-                    'name': path.name,
-                    'size_mb': size_mb,
-                    'modified': modified
-                })
-            except Exception as e:
-                print(f"Error getting file info for {file_path}: {e}")
+    def list_available_files(self, limit: int = 100, cursor: Optional[str] = None, name: Optional[str] = None,
+                             modified_from: Optional[str] = None,
+                             modified_to: Optional[str] = None) -> Dict[str, Any]:
+        """One page of available files: {'files', 'next_cursor', 'folder_total'}; see FileListingCache.page"""
+        if not self.input_folder:
+            return {'files': [], 'next_cursor': None, 'folder_total': 0}
 
-        return file_info
+        try:
+            return get_listing_cache().page(self.input_folder, limit, cursor, name, modified_from, modified_to)
+        except OSError as e:
+            print(f"Error reading folder: {e}")
+            return {'files': [], 'next_cursor': None, 'folder_total': 0}
 
     def set_selected_files(self, file_paths: List[str]) -> bool:
         """Set selected files for processing"""
@@ -642,60 +820,435 @@ class MedicalOCRInterface:
 
         return len(errors) == 0, errors
 
-    def extract_text_from_image(self, image_path: str) -> Optional[str]:
-        """Enhanced text extraction with better prompting"""
+    def _build_ocr_request(self, image_bytes: bytes, mime_type: str) -> List[Dict[str, Any]]:
+        """Build the multimodal OCR request for one image"""
+        return [
+            {"mime_type": mime_type, "data": image_bytes},
+            {"text": """
+            Extract ALL readable text from this medical document image with high accuracy. 
+            Preserve the structure and formatting as much as possible.
+            Pay special attention to:
+            - Patient names, dates of birth, contact information
+            - Medical record numbers, appointment dates
+            - Vital signs (blood pressure, heart rate, temperature, weight, height)
+            - Medications, dosages, and instructions
+            - Diagnoses, ICD codes, and medical conditions
+            - Lab results, test values, and reference ranges
+            - Allergies and reactions
+            - Symptoms and their descriptions
+            - Family history information
+            - Social history (smoking, alcohol, occupation)
+
+            Format the output as clear, readable text maintaining the original document structure.
+            """}
+        ]
+
+    def _guess_mime_type(self, image_path: str) -> str:
+        """Guess the MIME type sent to the model for a file"""
         mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type:
-            mime_type = "image/png"
+        return mime_type or "image/png"
+
+    def _prepare_pages(self, file_path: str, with_hash: bool) -> Tuple[Optional[int], Optional[List[Dict]]]:
+        """Page hash plus, for multi-frame or oversized scans, the rendered frames/strips (from a single decode)"""
+        segments = plan_segments(file_path, self.tile_max_side, self.tile_overlap)
+        if segments is None:
+            return (compute_page_hash(file_path) if with_hash else None), None
+
+        segments, page_hash = render_segments(file_path, segments, self.max_decoded_bytes, with_hash,
+                                              self.tile_max_side)
+        if len(segments) == 1 and 'skipped' in segments[0]:
+            # A single page too large to decode here goes to the model as the original file
+            print(f"⚠️ Sending {Path(file_path).name} unsplit")
+            return None, None
+        print(f"🧩 Split {Path(file_path).name} into {len(segments)} segments")
+        return page_hash, segments
+
+    def _extract_text_from_segments(self, image_path: str, segments: List[Dict]) -> Optional[str]:
+        """OCR frames/strips in a thread pool and stitch the text back together"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        def extract(segment):
+            if 'skipped' in segment:
+                return f"[{segment['skipped']}]"
+            response = get_model_pool().generate_content(
+                'ocr', self._build_ocr_request(segment['data'], segment['mime_type']))
+            return response.text.strip()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.tile_concurrency) as pool:
+                texts = list(pool.map(profiled(extract), segments))
+        except Exception as e:
+            print(f"❌ Error processing {image_path}: {e}")
+            return None
+        return stitch_text([{**segment, 'text': text} for segment, text in zip(segments, texts)])
+
+    async def _borrow_slot(self, semaphore: Optional[asyncio.Semaphore], priority: str) -> bool:
+        """Take a spare run slot and scheduler slot without waiting, only when no file is queued for them"""
+        if semaphore is not None:
+            if semaphore.locked():
+                return False
+            await semaphore.acquire()  # returns at once: a slot is free and nobody is waiting
+        if self.scheduler is not None and not self.scheduler.try_acquire(priority):
+            if semaphore is not None:
+                semaphore.release()
+            return False
+        return True
+
+    def _return_slot(self, semaphore: Optional[asyncio.Semaphore], priority: str):
+        if semaphore is not None:
+            semaphore.release()
+        if self.scheduler is not None:
+            self.scheduler.release(priority)
+
+    async def _extract_text_from_segments_async(self, image_path: str, segments: List[Dict],
+                                                priority: str = DEFAULT_PRIORITY,
+                                                semaphore: Optional[asyncio.Semaphore] = None) -> Optional[str]:
+        """OCR frames/strips (pages) concurrently and stitch the text back together.
+
+        Pages are fanned out under the same bounds as files: one worker runs
+        on the file's own run and scheduler slots, and up to
+        tile_concurrency - 1 more start on spare slots borrowed from the
+        run's semaphore and the scheduler, so pages never push a run past
+        its concurrency or the global model-call cap, and never hold slots
+        files are waiting for.
+        """
+        pending = list(enumerate(segments))
+        texts: List[Optional[str]] = [None] * len(segments)
+        workers = []
+
+        async def worker(borrowed: bool):
+            try:
+                while pending:
+                    index, segment = pending.pop(0)
+                    if 'skipped' in segment:
+                        texts[index] = f"[{segment['skipped']}]"
+                        continue
+                    response = await get_model_pool().generate_content_async(
+                        'ocr', self._build_ocr_request(segment['data'], segment['mime_type']))
+                    texts[index] = response.text.strip()
+                    # Slots freed since the file started can take on more of its pages
+                    if pending and len(workers) < min(self.tile_concurrency, len(segments)):
+                        await start_borrowed()
+            finally:
+                if borrowed:
+                    self._return_slot(semaphore, priority)
+
+        async def start_borrowed() -> bool:
+            if not await self._borrow_slot(semaphore, priority):
+                return False
+            workers.append(asyncio.ensure_future(worker(True)))
+            return True
+
+        workers.append(asyncio.ensure_future(worker(False)))
+        for _ in range(min(self.tile_concurrency, len(segments)) - 1):
+            if not await start_borrowed():
+                break
+
+        try:
+            # Workers started while others ran are gathered too
+            while not all(task.done() for task in workers):
+                await asyncio.gather(*workers)
+        except Exception as e:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            print(f"❌ Error processing {image_path}: {e}")
+            return None
+        return stitch_text([{**segment, 'text': text} for segment, text in zip(segments, texts)])
+
+    def extract_text_from_image(self, image_path: str, segments: Optional[List[Dict]] = None) -> Optional[str]:
+        """Enhanced text extraction with better prompting"""
+        if segments is not None:
+            return self._extract_text_from_segments(image_path, segments)
+
+        mime_type = self._guess_mime_type(image_path)
 
         try:
             with open(image_path, "rb") as f:
                 image_bytes = f.read()
 
-            response = model.generate_content([
-                {"mime_type": mime_type, "data": image_bytes},
-                {"text": """
-                Extract ALL readable text from this medical document image with high accuracy. 
-                Preserve the structure and formatting as much as possible.
-                Pay special attention to:
-                - Patient names, dates of birth, contact information
-                - Medical record numbers, appointment dates
-                - Vital signs (blood pressure, heart rate, temperature, weight, height)
-                - Medications, dosages, and instructions
-                - Diagnoses, ICD codes, and medical conditions
-                - Lab results, test values, and reference ranges
-                - Allergies and reactions
-                - Symptoms and their descriptions
-                - Family history information
-                - Social history (smoking, alcohol, occupation)
-
-                Format the output as clear, readable text maintaining the original document structure.
-                """}
-            ])
+            response = get_model_pool().generate_content('ocr', self._build_ocr_request(image_bytes, mime_type))
             return response.text.strip()
         except Exception as e:
             print(f"❌ Error processing {image_path}: {e}")
             return None
 
-    def save_text_to_word(self, text: str, output_path: str):
-        """Save extracted text to Word document"""
-        try:
-            doc = Document()
-            doc.add_heading('Extracted Medical Document Text', 0)
-            doc.add_paragraph(f'Patient ID: {self.patient_id}')
-            doc.add_paragraph(f'Processing Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
-            doc.add_paragraph('')  # Empty line
+    async def extract_text_from_image_async(self, image_path: str, segments: Optional[List[Dict]] = None,
+                                            priority: str = DEFAULT_PRIORITY,
+                                            semaphore: Optional[asyncio.Semaphore] = None) -> Optional[str]:
+        """Async text extraction; file reads run off the event loop.
+
+        Multi-frame and oversized scans are OCR'd page by page concurrently;
+        other files, PDFs included, are one model call (the model reads every
+        page of a PDF from a single request).
+        """
+        if segments is not None:
+            return await self._extract_text_from_segments_async(image_path, segments, priority, semaphore)
+
+        mime_type = self._guess_mime_type(image_path)
 
-            for line in text.split('\n'):
-                if line.strip():
-                    doc.add_paragraph(line.strip())
+        try:
+            image_bytes = await asyncio.to_thread(profiled(Path(image_path).read_bytes))
+            response = await get_model_pool().generate_content_async(
+                'ocr', self._build_ocr_request(image_bytes, mime_type))
+            return response.text.strip()
+        except Exception as e:
+            print(f"❌ Error processing {image_path}: {e}")
+            return None
 
-            doc.save(output_path)
+    def save_text_to_word(self, text: str, output_path: str, patient_id: Optional[str] = None):
+        """Save extracted text to Word document"""
+        try:
+            write_docx(text, output_path, patient_id or self.patient_id)
         except Exception as e:
             print(f"Error saving Word document: {e}")
 
-    def process_files(self, progress_callback=None) -> Dict[str, Any]:
-        """Process selected files and return results"""
+    def _new_results(self, total_files: int) -> Dict[str, Any]:
+        """Create an empty results dict for a processing run"""
+        return {
+            'success': True,
+            'total_files': total_files,
+            'processed_files': 0,
+            'total_records': 0,
+            'files_processed': [],
+            'files_failed': [],
+            'files_duplicate': [],
+            'patient_mismatches': [],
+            'csv_files_created': []
+        }
+
+    def _find_duplicate_candidate(self, file_path: str, patient_id: str, page_hash: Optional[int],
+                                  page_index) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """The closest earlier page of the same patient that hashes alike, and this file's content hash"""
+        if page_hash is None:
+            return None, None
+        return page_index.find(page_hash, patient_id), compute_content_hash(file_path)
+
+    def _confirm_duplicate(self, filename: str, candidate: Optional[Dict[str, Any]], results: Dict[str, Any],
+                           content_hash: Optional[str] = None,
+                           extracted_text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Record candidate as a duplicate if the bytes or the OCR text are the same; the hash alone is not enough"""
+        if candidate is None:
+            return None
+        if content_hash is not None and candidate['content_sha256'] == content_hash:
+            match = 'content'
+        elif extracted_text is not None and texts_match(candidate['extracted_text'], extracted_text):
+            match = 'text'
+        else:
+            return None
+
+        print(f"♻️  Duplicate of {candidate['source_file']} (same {match}, distance {candidate['distance']})")
+        results['files_duplicate'].append({
+            'filename': filename,
+            'duplicate_of': candidate['source_file'],
+            'duplicate_patient_id': candidate['patient_id'],
+            'distance': candidate['distance'],
+            'match': match,
+            'action': self.duplicate_policy
+        })
+        return candidate
+
+    def _cross_check_patient(self, filename: str, patient_id: str, structured_data: Dict[str, Any],
+                             results: Dict[str, Any]):
+        """Flag extracted patient details that disagree with the registry entry for patient_id"""
+        if self.patient_directory is None:
+            return
+
+        mismatches = self.patient_directory.cross_check(patient_id, structured_data.get("PATIENT_INFO") or {})
+        if mismatches:
+            print(f"⚠️  Patient details in {filename} do not match registry: {'; '.join(mismatches)}")
+            results['patient_mismatches'].append({
+                'filename': filename,
+                'patient_id': patient_id,
+                'mismatches': mismatches
+            })
+
+    def _store_structured_data(self, structured_data: Dict[str, Any], record_builder: RecordBuilder,
+                               csv_output_folder: str,
+                               record_writer: Optional[BufferedRecordWriter] = None) -> Dict[str, List[Dict]]:
+        """Convert structured data to database records and save them to CSV (or queue them on record_writer)"""
+        # Convert to database format with custom patient ID; streamed entries are already converted
+        print("🗄️  Converting to database format...")
+        database_records = record_builder.build(structured_data)
+        if record_builder.first_row_seconds is not None:
+            print(f"📡 First record was ready {record_builder.first_row_seconds:.2f}s into the structured response")
+
+        # Save to CSV
+        if database_records and record_writer is not None:
+            record_writer.add(record_builder.source_file, database_records)
+        elif database_records:
+            self.processor.save_to_csv(database_records, csv_output_folder)
+
+        return database_records
+
+    def _record_processed_file(self, filename: str, database_records: Dict[str, List[Dict]],
+                               word_output_path: str, results: Dict[str, Any]):
+        """Record a successfully processed file in the results"""
+        record_count = 0
+        if database_records:
+            record_count = sum(len(records) for records in database_records.values())
+            results['total_records'] += record_count
+            print(f"📊 Generated {record_count} total database records")
+
+            # Track CSV files created
+            for table_name in database_records.keys():
+                csv_file = f"{table_name}.csv"
+                if csv_file not in results['csv_files_created']:
+                    results['csv_files_created'].append(csv_file)
+        else:
+            print("⚠️  No structured data found to convert")
+
+        results['processed_files'] += 1
+        results['files_processed'].append({
+            'filename': filename,
+            'records_created': record_count,
+            'word_file': word_output_path
+        })
+
+    def _process_single_file(self, file_path: str, patient_id: str, csv_output_folder: str,
+                             page_index, review_writer: ReviewDocumentWriter, results: Dict[str, Any]):
+        """Run the full pipeline for one file"""
+        filename = Path(file_path).name
+
+        # Split multi-frame/oversized scans and check for a duplicate of a page already processed for this patient
+        page_hash, segments = self._prepare_pages(file_path, page_index is not None)
+        candidate, content_hash = self._find_duplicate_candidate(file_path, patient_id, page_hash, page_index)
+        duplicate = self._confirm_duplicate(filename, candidate, results, content_hash=content_hash)
+        if duplicate and self.duplicate_policy == 'flag':
+            return
+
+        # Extract text
+        if duplicate and duplicate['extracted_text']:
+            extracted_text = duplicate['extracted_text']
+        else:
+            extracted_text = self.extract_text_from_image(file_path, segments)
+
+        if not extracted_text:
+            print(f"❌ No text extracted from: {filename}")
+            results['files_failed'].append({
+                'filename': filename,
+                'error': 'No text extracted'
+            })
+            return
+
+        # A rescan whose bytes differ is only a duplicate if it reads the same
+        if candidate and not duplicate:
+            duplicate = self._confirm_duplicate(filename, candidate, results, extracted_text=extracted_text)
+            if duplicate and self.duplicate_policy == 'flag':
+                return
+
+        # Queue the original extraction for the background review writer
+        word_output_path = review_writer.submit(extracted_text, filename, patient_id)
+        print(f"📄 Review document queued: {word_output_path}")
+
+        # Cleanse the text
+        cleansed_text = self.processor.cleanse_text(extracted_text)
+        record_builder = RecordBuilder(self.processor, filename, cleansed_text, patient_id)
+
+        # Extract structured data
+        if duplicate and duplicate['structured_data'] is not None:
+            print("🧠 Reusing structured data from duplicate page")
+            structured_data = duplicate['structured_data']
+        else:
+            print("🧠 Extracting structured data...")
+            structured_data = self.processor.extract_structured_data(cleansed_text, record_builder.add_item)
+            if page_hash is not None:
+                page_index.add(page_hash, filename, patient_id, extracted_text, structured_data, content_hash)
+
+        self._cross_check_patient(filename, patient_id, structured_data, results)
+        database_records = self._store_structured_data(structured_data, record_builder, csv_output_folder)
+        self._record_processed_file(filename, database_records, word_output_path, results)
+
+    async def _process_single_file_async(self, file_path: str, patient_id: str, csv_output_folder: str,
+                                         page_index, review_writer: ReviewDocumentWriter,
+                                         results: Dict[str, Any],
+                                         record_writer: Optional[BufferedRecordWriter] = None,
+                                         priority: str = DEFAULT_PRIORITY,
+                                         semaphore: Optional[asyncio.Semaphore] = None):
+        """Async pipeline for one file; blocking stages run in worker threads, pages may borrow spare slots of semaphore"""
+        filename = Path(file_path).name
+
+        page_hash, segments = await asyncio.to_thread(profiled(self._prepare_pages), file_path, page_index is not None)
+        candidate, content_hash = await asyncio.to_thread(profiled(self._find_duplicate_candidate), file_path,
+                                                          patient_id, page_hash, page_index)
+        duplicate = self._confirm_duplicate(filename, candidate, results, content_hash=content_hash)
+        if duplicate and self.duplicate_policy == 'flag':
+            return
+
+        if duplicate and duplicate['extracted_text']:
+            extracted_text = duplicate['extracted_text']
+        else:
+            extracted_text = await self.extract_text_from_image_async(file_path, segments, priority, semaphore)
+
+        if not extracted_text:
+            print(f"❌ No text extracted from: {filename}")
+            results['files_failed'].append({
+                'filename': filename,
+                'error': 'No text extracted'
+            })
+            return
+
+        if candidate and not duplicate:
+            duplicate = self._confirm_duplicate(filename, candidate, results, extracted_text=extracted_text)
+            if duplicate and self.duplicate_policy == 'flag':
+                return
+
+        word_output_path = review_writer.submit(extracted_text, filename, patient_id)
+        print(f"📄 Review document queued: {word_output_path}")
+
+        cleansed_text = self.processor.cleanse_text(extracted_text)
+        record_builder = await asyncio.to_thread(profiled(RecordBuilder), self.processor, filename, cleansed_text, patient_id)
+
+        if duplicate and duplicate['structured_data'] is not None:
+            print(f"🧠 Reusing structured data from duplicate page for {filename}")
+            structured_data = duplicate['structured_data']
+        else:
+            print(f"🧠 Extracting structured data for {filename}...")
+            structured_data = await self.processor.extract_structured_data_async(cleansed_text,
+                                                                                 record_builder.add_item)
+            if page_hash is not None:
+                await asyncio.to_thread(profiled(page_index.add), page_hash, filename, patient_id,
+                                        extracted_text, structured_data, content_hash)
+
+        self._cross_check_patient(filename, patient_id, structured_data, results)
+        database_records = await asyncio.to_thread(profiled(self._store_structured_data), structured_data, record_builder,
+                                                   csv_output_folder, record_writer)
+        self._record_processed_file(filename, database_records, word_output_path, results)
+
+    def _open_review_writer(self, output_folder: str,
+                            review: Optional[Tuple[str, Optional[str]]] = None) -> ReviewDocumentWriter:
+        """Start the background review writer for a processing run, in the (format, consolidate) given or the interface's"""
+        review_format, consolidate = review or (self.review_format, self.review_consolidate)
+        return ReviewDocumentWriter(output_folder, review_format, consolidate)
+
+    def _close_review_writer(self, review_writer: ReviewDocumentWriter, results: Dict[str, Any]):
+        """Wait for review artifacts and record them in the results"""
+        results['review_errors'] = review_writer.close()
+        results['review_files'] = sorted({f['word_file'] for f in results['files_processed']})
+
+    def _print_summary(self, results: Dict[str, Any], csv_output_folder: str, output_folder: str):
+        """Print the end-of-run summary"""
+        print("\n" + "=" * 60)
+        print("🎉 PROCESSING COMPLETE!")
+        print(f"📁 Files processed: {results['processed_files']}")
+        if results['files_duplicate']:
+            print(f"♻️  Near-duplicate files: {len(results['files_duplicate'])}")
+        print(f"📊 Total database records created: {results['total_records']}")
+        print(f"💾 CSV files saved to: {csv_output_folder}")
+        print(f"📄 Review documents saved to: {output_folder}")
+        print("\n📋 CSV files are ready for database import!")
+        print("=" * 60)
+
+    def _profile_job(self, profile: Optional[bool]) -> bool:
+        """Whether to profile a job: the explicit flag, else OCR_PROFILE_JOBS"""
+        return config.get_profile_jobs() if profile is None else profile
+
+    def _profile_label(self, jobs: List[Tuple[str, str]]) -> str:
+        patient_ids = {patient_id for _, patient_id in jobs}
+        return patient_ids.pop() if len(patient_ids) == 1 else 'batch'
+
+    def process_files(self, progress_callback=None, profile: Optional[bool] = None) -> Dict[str, Any]:
+        """Process selected files and return results; with profiling, adds a 'profile' summary"""
         # Validate requirements
         is_valid, errors = self.validate_processing_requirements()
         if not is_valid:
@@ -705,17 +1258,21 @@ class MedicalOCRInterface:
                 'results': {}
             }
 
-        results = {
-            'success': True,
-            'total_files': len(self.selected_files),
-            'processed_files': 0,
-            'total_records': 0,
-            'files_processed': [],
-            'files_failed': [],
-            'csv_files_created': []
-        }
+        if not self._profile_job(profile):
+            return self._process_selected_files(progress_callback)
+
+        with JobProfiler(self.output_folder, self.patient_id) as profiler:
+            results = self._process_selected_files(progress_callback)
+        results['profile'] = profiler.summary
+        return results
+
+    def _process_selected_files(self, progress_callback=None) -> Dict[str, Any]:
+        """Run the sequential pipeline over the selected files"""
+        results = self._new_results(len(self.selected_files))
 
         csv_output_folder = os.path.join(self.output_folder, "csv_database_ready")
+        page_index = self.get_page_index(self.output_folder)
+        review_writer = self._open_review_writer(self.output_folder)
 
         print("🏥 Starting Enhanced Medical OCR Processing...")
         print("=" * 60)
@@ -736,58 +1293,8 @@ class MedicalOCRInterface:
             print("-" * 40)
 
             try:
-                # Extract text
-                extracted_text = self.extract_text_from_image(file_path)
-
-                if extracted_text:
-                    # Save original extraction to Word
-                    base_filename = Path(file_path).stem
-                    word_output_path = os.path.join(self.output_folder, f"{base_filename}_extracted.docx")
-                    self.save_text_to_word(extracted_text, word_output_path)
-                    print(f"📄 Word document saved: {word_output_path}")
-
-                    # Cleanse the text
-                    cleansed_text = self.processor.cleanse_text(extracted_text)
-
-                    # Extract structured data
-                    print("🧠 Extracting structured data...")
-                    structured_data = self.processor.extract_structured_data(cleansed_text)
-
-                    # Convert to database format with custom patient ID
-                    print("🗄️  Converting to database format...")
-                    database_records = self.processor.convert_to_database_format(
-                        structured_data, filename, cleansed_text, self.patient_id
-                    )
-
-                    # Save to CSV
-                    if database_records:
-                        self.processor.save_to_csv(database_records, csv_output_folder)
-                        record_count = sum(len(records) for records in database_records.values())
-                        results['total_records'] += record_count
-                        print(f"📊 Generated {record_count} total database records")
-
-                        # Track CSV files created
-                        for table_name in database_records.keys():
-                            csv_file = f"{table_name}.csv"
-                            if csv_file not in results['csv_files_created']:
-                                results['csv_files_created'].append(csv_file)
-                    else:
-                        print("⚠️  No structured data found to convert")
-
-                    results['processed_files'] += 1
-                    results['files_processed'].append({
-                        'filename': filename,
-                        'records_created': record_count if database_records else 0,
-                        'word_file': word_output_path
-                    })
-
-                else:
-                    print(f"❌ No text extracted from: {filename}")
-                    results['files_failed'].append({
-                        'filename': filename,
-                        'error': 'No text extracted'
-                    })
-
+                self._process_single_file(file_path, self.patient_id, csv_output_folder,
+                                          page_index, review_writer, results)
             except Exception as e:
                 print(f"❌ Error processing {filename}: {e}")
                 results['files_failed'].append({
@@ -795,21 +1302,211 @@ class MedicalOCRInterface:
                     'error': str(e)
                 })
 
+        self._close_review_writer(review_writer, results)
+
         # Final progress callback
         if progress_callback:
             progress_callback(100, "Processing complete")
 
-        print("\n" + "=" * 60)
-        print("🎉 PROCESSING COMPLETE!")
-        print(f"📁 Files processed: {results['processed_files']}")
-        print(f"📊 Total database records created: {results['total_records']}")
-        print(f"💾 CSV files saved to: {csv_output_folder}")
-        print(f"📄 Word documents saved to: {self.output_folder}")
-        print("\n📋 CSV files are ready for database import!")
-        print("=" * 60)
+        self._print_summary(results, csv_output_folder, self.output_folder)
+
+        return results
+
+    async def process_files_async(self, progress_callback=None, max_concurrency: Optional[int] = None,
+                                  priority: str = DEFAULT_PRIORITY, submitter: Optional[str] = None,
+                                  profile: Optional[bool] = None) -> Dict[str, Any]:
+        """Process selected files concurrently on the event loop and return results"""
+        # Snapshot the configuration before the first await so concurrent
+        # requests that reconfigure the shared interface cannot interfere
+        is_valid, errors = self.validate_processing_requirements()
+        if not is_valid:
+            return {
+                'success': False,
+                'error': f"Processing requirements not met: {'; '.join(errors)}",
+                'results': {}
+            }
+        if priority not in PRIORITY_CLASSES:
+            return {
+                'success': False,
+                'error': f"Priority must be one of: {', '.join(PRIORITY_CLASSES)}",
+                'results': {}
+            }
+
+        jobs = [(file_path, self.patient_id) for file_path in self.selected_files]
+        return await self._run_pipeline_async(jobs, self.output_folder, progress_callback, max_concurrency,
+                                              priority, submitter, profile=profile)
+
+    async def _run_pipeline_async(self, jobs: List[Tuple[str, str]], output_folder: str, progress_callback=None,
+                                  max_concurrency: Optional[int] = None, priority: str = DEFAULT_PRIORITY,
+                                  submitter: Optional[str] = None, csv_flush_files: int = 0,
+                                  profile: Optional[bool] = None,
+                                  review: Optional[Tuple[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """Fan (file_path, patient_id) jobs out over the async pipeline with bounded concurrency.
+
+        With a scheduler set, each file also waits for a global slot in its
+        priority class; fair sharing is per submitter, or per patient when no
+        submitter is given. With csv_flush_files, records are saved to CSV in
+        groups of that many files instead of once per file. With profiling,
+        the run is wrapped in a JobProfiler and results gain a 'profile' summary.
+        review is the run's (format, consolidate); by default the interface's
+        settings as they are when the run starts.
+        """
+        args = (jobs, output_folder, progress_callback, max_concurrency, priority, submitter, csv_flush_files,
+                review)
+        if not self._profile_job(profile):
+            return await self._execute_pipeline_async(*args)
+
+        with JobProfiler(output_folder, self._profile_label(jobs)) as profiler:
+            results = await self._execute_pipeline_async(*args)
+        results['profile'] = profiler.summary
+        return results
+
+    async def _execute_pipeline_async(self, jobs: List[Tuple[str, str]], output_folder: str, progress_callback,
+                                      max_concurrency: Optional[int], priority: str, submitter: Optional[str],
+                                      csv_flush_files: int,
+                                      review: Optional[Tuple[str, Optional[str]]] = None) -> Dict[str, Any]:
+        results = self._new_results(len(jobs))
+        scheduler = self.scheduler
+        csv_output_folder = os.path.join(output_folder, "csv_database_ready")
+        page_index = self.get_page_index(output_folder)
+        review_writer = self._open_review_writer(output_folder, review)
+        record_writer = (BufferedRecordWriter(self.processor, csv_output_folder, csv_flush_files)
+                         if csv_flush_files else None)
+
+        # Files waiting on the semaphore hold no image data; only in-flight files do. Pages of
+        # multi-frame/oversized scans borrow slots of the same semaphore when no file is waiting
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        completed = 0
+
+        print(f"🏥 Starting async Medical OCR Processing of {len(jobs)} files...")
+
+        async def run_job(file_path: str, patient_id: str):
+            nonlocal completed
+            filename = Path(file_path).name
+            async with semaphore, (scheduler.slot(priority, submitter or patient_id) if scheduler else nullcontext()):
+                print(f"🔍 Processing: {filename}")
+                try:
+                    await self._process_single_file_async(file_path, patient_id, csv_output_folder,
+                                                          page_index, review_writer, results, record_writer,
+                                                          priority, semaphore)
+                except Exception as e:
+                    print(f"❌ Error processing {filename}: {e}")
+                    results['files_failed'].append({
+                        'filename': filename,
+                        'error': str(e)
+                    })
+
+            completed += 1
+            if progress_callback:
+                progress_callback((completed / len(jobs)) * 100, f"Processed {filename}")
+
+        await asyncio.gather(*(run_job(file_path, patient_id) for file_path, patient_id in jobs))
+        if record_writer is not None:
+            await asyncio.to_thread(profiled(record_writer.flush))
+            results['csv_errors'] = record_writer.errors
+            if record_writer.errors:
+                unsaved = sum(len(error['filenames']) for error in record_writer.errors)
+                results['success'] = False
+                results['error'] = f"Failed to save records for {unsaved} files"
+        await asyncio.to_thread(profiled(self._close_review_writer), review_writer, results)
+
+        self._print_summary(results, csv_output_folder, output_folder)
 
         return results
 
+    def validate_batch(self, jobs: List[Tuple[str, str]]) -> Tuple[bool, List[str], List[Tuple[str, str]]]:
+        """Check a manifest's (file_path, patient_id) pairs; returns validity, errors and cleaned pairs"""
+        errors = []
+        if not jobs:
+            return False, ["Manifest has no entries"], []
+
+        cleaned = []
+        patient_ids: Dict[str, Tuple[bool, str]] = {}
+        files_by_name: Dict[str, str] = {}
+        for file_path, patient_id in jobs:
+            if patient_id not in patient_ids:
+                patient_ids[patient_id] = self.validate_patient_id(patient_id)
+            is_valid, result = patient_ids[patient_id]
+            if not is_valid:
+                errors.append(f"{file_path}: {result} ({patient_id})")
+                continue
+            if not os.path.isfile(file_path):
+                errors.append(f"{file_path}: file not found")
+                continue
+
+            # Output rows, review documents and the record index are keyed by file name
+            filename = Path(file_path).name
+            if filename in files_by_name and files_by_name[filename] != file_path:
+                errors.append(f"{file_path}: file name also used by {files_by_name[filename]}")
+                continue
+            files_by_name[filename] = file_path
+            cleaned.append((file_path, result))
+
+        return len(errors) == 0, errors, cleaned
+
+    def _summarize_by_patient(self, jobs: List[Tuple[str, str]], results: Dict[str, Any]) -> Dict[str, Dict]:
+        """Per-patient counts of files, records, failures, duplicates and registry mismatches"""
+        patient_by_file = {Path(file_path).name: patient_id for file_path, patient_id in jobs}
+        summary: Dict[str, Dict[str, Any]] = {}
+        for patient_id in patient_by_file.values():
+            summary.setdefault(patient_id, {'files': 0, 'processed_files': 0, 'records': 0,
+                                            'files_failed': [], 'files_duplicate': [], 'patient_mismatches': 0})
+            summary[patient_id]['files'] += 1
+
+        for entry in results['files_processed']:
+            patient = summary[patient_by_file[entry['filename']]]
+            patient['processed_files'] += 1
+            patient['records'] += entry['records_created']
+        for entry in results['files_failed']:
+            summary[patient_by_file[entry['filename']]]['files_failed'].append(entry['filename'])
+        for entry in results['files_duplicate']:
+            summary[patient_by_file[entry['filename']]]['files_duplicate'].append(entry['filename'])
+        for entry in results['patient_mismatches']:
+            summary[entry['patient_id']]['patient_mismatches'] += 1
+        return summary
+
+    async def process_batch_async(self, jobs: List[Tuple[str, str]], output_folder: Optional[str] = None,
+                                  progress_callback=None, max_concurrency: Optional[int] = None,
+                                  priority: str = 'bulk', submitter: Optional[str] = None,
+                                  profile: Optional[bool] = None, review_format: Optional[str] = None,
+                                  review_consolidate: Optional[str] = None) -> Dict[str, Any]:
+        """Process a multi-patient manifest of (file_path, patient_id) pairs through one shared pipeline.
+
+        review_format/review_consolidate apply to this batch only; without a
+        format, the interface's review settings at the time of the call are used.
+        """
+        # Taken before the first await, so requests reconfiguring the shared interface cannot change it
+        review = ((review_format, review_consolidate) if review_format is not None
+                  else (self.review_format, self.review_consolidate))
+        if review[0] not in REVIEW_FORMATS or review[1] not in CONSOLIDATION_MODES:
+            return {'success': False, 'error': "Invalid review format or consolidation mode", 'results': {}}
+        output_folder = output_folder or self.output_folder
+        is_valid, result = self.validate_folder_path(output_folder or '')
+        if not is_valid:
+            return {'success': False, 'error': f"Invalid output folder: {result}", 'results': {}}
+        output_folder = result
+        os.makedirs(os.path.join(output_folder, "csv_database_ready"), exist_ok=True)
+
+        if priority not in PRIORITY_CLASSES:
+            return {'success': False, 'error': f"Priority must be one of: {', '.join(PRIORITY_CLASSES)}", 'results': {}}
+
+        is_valid, errors, jobs = self.validate_batch(jobs)
+        if not is_valid:
+            return {'success': False, 'error': f"Invalid manifest entries: {'; '.join(errors)}", 'results': {}}
+
+        results = await self._run_pipeline_async(jobs, output_folder, progress_callback, max_concurrency,
+                                                 priority, submitter, csv_flush_files=BATCH_CSV_FLUSH_FILES,
+                                                 profile=profile, review=review)
+        results['patients'] = self._summarize_by_patient(jobs, results)
+        return results
+
+    def process_batch(self, jobs: List[Tuple[str, str]], output_folder: Optional[str] = None,
+                      progress_callback=None, max_concurrency: Optional[int] = None,
+                      profile: Optional[bool] = None) -> Dict[str, Any]:
+        """Blocking wrapper around process_batch_async for scripts and the console"""
+        return asyncio.run(self.process_batch_async(jobs, output_folder, progress_callback, max_concurrency,
+                                                    profile=profile))
+
 
 # Frontend Helper Functions
 def get_user_input_patient_id() -> Optional[str]:
@@ -843,29 +1540,53 @@ def get_user_input_folder(folder_type: str) -> Optional[str]:
             print(f"❌ {result}. Please try again.")
 
 
+# Files listed per page by the console selector
+CONSOLE_PAGE_SIZE = 20
+
+
 def get_user_file_selection(input_folder: str) -> List[str]:
     """Console-based file selection (for testing)"""
     interface = MedicalOCRInterface()
     interface.set_input_folder(input_folder)
 
-    available_files = interface.get_available_files()
-
-    if not available_files:
-        print("❌ No supported image files found in the folder.")
+    name_filter = None
+    page = interface.list_available_files(CONSOLE_PAGE_SIZE)
+    if not page['files']:
+        print("❌ No supported image or PDF files found in the folder.")
         return []
 
-    print(f"\n📄 Found {len(available_files)} supported image files:")
+    print(f"\n📄 Found {page['folder_total']} supported image and PDF files:")
     print("-" * 60)
 
-    for i, file_info in enumerate(available_files, 1):
-        print(f"{i:2d}. {file_info['name']} ({file_info['size_mb']} MB) - {file_info['modified']}")
-
+    # Files listed so far; numbers keep counting across pages
+    available_files = []
     while True:
+        for file_info in page['files']:
+            available_files.append(file_info)
+            print(f"{len(available_files):2d}. {file_info['name']} ({file_info['size_mb']} MB) - {file_info['modified']}")
+        if not page['files']:
+            print("No matching files.")
+
+        more = ", 'n' for the next page" if page['next_cursor'] else ""
         selection = input(
-            f"\n📋 Enter file numbers to process (1-{len(available_files)}, comma-separated, or 'all' for all files): ").strip()
+            f"\n📋 Enter file numbers to process (1-{len(available_files)}, comma-separated), "
+            f"'all' for all {'matching ' if name_filter else ''}files{more}, or /text to filter by name: ").strip()
+
+        if selection.lower() == 'n' and page['next_cursor']:
+            page = interface.list_available_files(CONSOLE_PAGE_SIZE, page['next_cursor'], name_filter)
+            continue
+
+        if selection.startswith('/'):
+            name_filter = selection[1:].strip() or None
+            available_files = []
+            page = interface.list_available_files(CONSOLE_PAGE_SIZE, name=name_filter)
+            continue
 
         if selection.lower() == 'all':
-            return [f['path'] for f in available_files]
+            if name_filter:
+                return [path for path in interface.get_supported_image_files(input_folder)
+                        if name_filter.lower() in os.path.basename(path).lower()]
+            return interface.get_supported_image_files(input_folder)
 
         try:
             indices = [int(x.strip()) - 1 for x in selection.split(',')]
@@ -961,6 +1682,49 @@ def main_console_interface():
         print(f"\n❌ Processing failed: {results.get('error', 'Unknown error')}")
 
 
+def batch_console_interface(argv: Optional[List[str]] = None):
+    """Console entry point for multi-patient manifest batches"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Process a manifest of scans for many patients")
+    parser.add_argument("manifest", help="CSV (file,patient_id) or JSON manifest; relative paths are "
+                                         "resolved against the manifest's folder")
+    parser.add_argument("--output", default=config.get_output_folder(), help="Output folder")
+    parser.add_argument("--concurrency", type=int, default=None, help="Files in flight at once")
+    parser.add_argument("--review-format", default="docx", choices=sorted(REVIEW_FORMATS))
+    parser.add_argument("--review-consolidate", default=None, choices=[mode for mode in CONSOLIDATION_MODES if mode])
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="Write CPU and allocation profiles to <output>/profiles")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read manifest: {e}")
+        return None
+
+    os.makedirs(args.output, exist_ok=True)
+    interface = MedicalOCRInterface()
+    interface.set_review_output(args.review_format, args.review_consolidate)
+    print(f"🏥 Batch of {len(jobs)} files for {len({patient_id for _, patient_id in jobs})} patients")
+
+    results = interface.process_batch(jobs, args.output, console_progress_callback, args.concurrency, args.profile)
+    if not results.get('patients'):
+        print(f"\n❌ Batch failed: {results.get('error', 'Unknown error')}")
+        return results
+
+    print(f"\n{'Patient':<20} {'Files':>6} {'Done':>6} {'Records':>8} {'Failed':>7} {'Dupes':>6} {'Mismatch':>9}")
+    for patient_id, summary in sorted(results['patients'].items()):
+        print(f"{patient_id:<20} {summary['files']:>6} {summary['processed_files']:>6} {summary['records']:>8} "
+              f"{len(summary['files_failed']):>7} {len(summary['files_duplicate']):>6} "
+              f"{summary['patient_mismatches']:>9}")
+    if results.get('error'):
+        print(f"\n⚠️  {results['error']}")
+    if results.get('profile', {}).get('enabled'):
+        print(f"\n🔬 Profile: {results['profile']['artifacts']['cpu_report']}")
+    return results
+
+
 # Example usage for GUI integration
 class GUIIntegrationExample:
     """Example showing how to integrate with a GUI framework"""
@@ -1027,5 +1791,10 @@ class GUIIntegrationExample:
 
 
 if __name__ == "__main__":
-    # Run console interface for testing
-    main_console_interface()
+    import sys
+
+    # python OCR.py <manifest> runs a batch; without arguments, the interactive console
+    if len(sys.argv) > 1:
+        batch_console_interface()
+    else:
+        main_console_interface()
@@ -1,11 +1,32 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from typing import List, Optional
-from OCR import MedicalOCRInterface
+import asyncio
+from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+import config
+from OCR import MedicalOCRInterface, warm_up
+from job_queue import JobQueue
+from record_index import get_record_index
+from patient_directory import PatientDirectory, load_patient_directory
+from single_flight import SingleFlight, request_key
+from scheduler import PRIORITY_CLASSES, DEFAULT_PRIORITY, get_scheduler
+from manifest import parse_manifest
+from model_pool import get_model_pool
+from resumable_upload import UPLOADS_FOLDER, UploadError, UploadStore
+from review_writer import REVIEW_FORMATS, CONSOLIDATION_MODES
 
-DEFAULT_OUTPUT_FOLDER = "/Users/xiangwenzhao/Desktop/OCR_Output"
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optional warm-up so the first request does not pay for heavy imports
+    if config.get_warm_up_on_startup():
+        await asyncio.to_thread(warm_up)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,49 +36,383 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-interface = MedicalOCRInterface()
+_interface: Optional[MedicalOCRInterface] = None
+
+
+def get_interface() -> MedicalOCRInterface:
+    """Get the shared processing interface, creating it on first use"""
+    global _interface
+    if _interface is None:
+        _interface = MedicalOCRInterface()
+        _interface.set_patient_directory(get_patient_directory())
+        _interface.set_scheduler(get_scheduler())
+    return _interface
+
+
+_patient_directory: Optional[PatientDirectory] = None
+_patient_directory_loaded = False
+
+
+def get_patient_directory() -> Optional[PatientDirectory]:
+    """Get the patient registry index (PATIENT_DIRECTORY_PATH), loading it on first use"""
+    global _patient_directory, _patient_directory_loaded
+    if not _patient_directory_loaded:
+        _patient_directory = load_patient_directory(config.get_patient_directory_path())
+        _patient_directory_loaded = True
+    return _patient_directory
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get the shared durable job queue (OCR_QUEUE_PATH)"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(config.get_queue_path())
+    return _job_queue
+
+
+_upload_store: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """Get the resumable upload store under the output folder (OCR_MAX_UPLOAD_MB, OCR_UPLOAD_EXPIRY_HOURS)"""
+    global _upload_store
+    if _upload_store is None:
+        _upload_store = UploadStore(os.path.join(config.get_output_folder(), UPLOADS_FOLDER),
+                                    config.get_max_upload_mb() * 1024 * 1024,
+                                    config.get_upload_expiry_hours() * 3600)
+    return _upload_store
+
 
-# Example mock function: replace with DB query if needed
 def get_patient_id_by_username(username: str) -> Optional[str]:
-    # Here you could query database; for now mock logic:
+    # Resolve through the patient registry when one is configured (exact names only; see unresolved_patient_error)
+    directory = get_patient_directory()
+    if directory is not None:
+        return directory.resolve_name(username)
+
+    # Development fallback without a registry
     mock_user_map = {
         "alice": "1001",
         "bob": "1002"
     }
     return mock_user_map.get(username.lower())  # Return ID if username found
 
-@app.post("/process")
-async def process_files(
-    patient_id: Optional[str] = Form(None),
-    patient_name: Optional[str] = Form(None),
-    files: List[UploadFile] = File(...)
-):
-    # Resolve patient ID from either patient_id or patient_name
+def resolve_patient_id(patient_id: Optional[str], patient_name: Optional[str]) -> Optional[str]:
+    """Resolve patient ID from either patient_id or patient_name"""
     resolved_patient_id = patient_id
     if not resolved_patient_id and patient_name:
         resolved_patient_id = get_patient_id_by_username(patient_name)
+    return resolved_patient_id
 
-    if not resolved_patient_id:
+
+def unresolved_patient_error(patient_name: Optional[str]) -> dict:
+    """Error response for a request whose patient could not be resolved, with registry suggestions for a typo"""
+    directory = get_patient_directory()
+    if not patient_name or directory is None:
         return {"success": False, "error": "Either Patient ID or Patient Name must be provided"}
 
-    # Use fixed output folder
-    output_folder = DEFAULT_OUTPUT_FOLDER
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    # A near match may be another patient, so it is offered for confirmation rather than used
+    suggestions = directory.search(patient_name)
+    return {"success": False,
+            "error": f"No single registry patient is named '{patient_name}'; "
+                     f"resend with the patient_id of the intended patient",
+            "suggestions": suggestions}
+
+
+async def read_uploads(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """Read uploaded files into (filename, content) pairs"""
+    return [(file.filename, await file.read()) for file in files]
 
-    # Save uploaded files
+
+async def write_uploads(uploads: List[Tuple[str, bytes]], output_folder: str) -> List[str]:
+    """Write (filename, content) pairs into the output folder and return their paths"""
     saved_paths = []
-    for file in files:
-        save_path = os.path.join(output_folder, file.filename)
-        with open(save_path, "wb") as f:
-            f.write(await file.read())
+    for filename, content in uploads:
+        save_path = os.path.join(output_folder, filename)
+        await asyncio.to_thread(Path(save_path).write_bytes, content)
         saved_paths.append(save_path)
+    return saved_paths
+
+
+async def save_uploads(files: List[UploadFile], output_folder: str) -> List[str]:
+    """Save uploaded files into the output folder and return their paths"""
+    return await write_uploads(await read_uploads(files), output_folder)
 
-    # Configure interface
-    interface.set_patient_id(resolved_patient_id)
+
+def check_process_options(patient_id: Optional[str], patient_name: Optional[str], review_format: str,
+                          review_consolidate: Optional[str], priority: str) -> Tuple[Optional[str], Optional[dict]]:
+    """(validated patient ID, None), or (None, error response) for a single-patient processing request"""
+    resolved_patient_id = resolve_patient_id(patient_id, patient_name)
+    if not resolved_patient_id:
+        return None, unresolved_patient_error(patient_name)
+
+    interface = get_interface()
+    if not interface.set_review_output(review_format, review_consolidate):
+        return None, {"success": False, "error": "review_format must be docx, markdown or text and "
+                                                 "review_consolidate must be batch or patient"}
+    if priority not in PRIORITY_CLASSES:
+        return None, {"success": False, "error": f"priority must be one of: {', '.join(PRIORITY_CLASSES)}"}
+    is_valid, result = interface.validate_patient_id(resolved_patient_id)
+    if not is_valid:
+        return None, {"success": False, "error": result}
+    return result, None
+
+
+async def process_saved_files(saved_paths: List[str], patient_id: str, output_folder: str, review_format: str,
+                              review_consolidate: Optional[str], priority: str, submitter: Optional[str],
+                              profile: bool):
+    """Run the pipeline on files already in the output folder"""
+    interface = get_interface()
+
+    # Configure interface; no awaits until processing has snapshotted it
+    interface.set_review_output(review_format, review_consolidate)
+    interface.set_patient_id(patient_id)
     interface.set_output_folder(output_folder)
     interface.set_selected_files(saved_paths)
 
-    # Process
-    result = interface.process_files()
-    return result
+    # Process on the event loop; files are admitted by priority class and shared fairly per submitter
+    # profile=True adds a CPU/allocation profile; otherwise OCR_PROFILE_JOBS decides
+    return await interface.process_files_async(priority=priority, submitter=submitter, profile=profile or None)
+
+
+# Identical /process requests (same patient, same uploads) that overlap share one pipeline run
+_process_flight = SingleFlight()
+
+
+@app.post("/process")
+async def process_files(
+    patient_id: Optional[str] = Form(None),
+    patient_name: Optional[str] = Form(None),
+    review_format: str = Form("docx"),
+    review_consolidate: Optional[str] = Form(None),
+    priority: str = Form(DEFAULT_PRIORITY),
+    submitter: Optional[str] = Form(None),
+    profile: bool = Form(False),
+    files: List[UploadFile] = File(...)
+):
+    resolved_patient_id, error = check_process_options(patient_id, patient_name, review_format,
+                                                       review_consolidate, priority)
+    if error:
+        return error
+
+    # Use the configured output folder (OCR_OUTPUT_FOLDER)
+    output_folder = config.get_output_folder()
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    uploads = await read_uploads(files)
+    key = await asyncio.to_thread(request_key, resolved_patient_id, uploads,
+                                  output_folder, review_format, review_consolidate, profile)
+
+    async def run_pipeline():
+        # Save uploaded files
+        saved_paths = await write_uploads(uploads, output_folder)
+        return await process_saved_files(saved_paths, resolved_patient_id, output_folder, review_format,
+                                         review_consolidate, priority, submitter, profile)
+
+    return await _process_flight.do(key, run_pipeline)
+
+
+@app.post("/process/batch")
+async def process_batch(
+    manifest: str = Form(...),
+    priority: str = Form("bulk"),
+    submitter: Optional[str] = Form(None),
+    review_format: str = Form("docx"),
+    review_consolidate: Optional[str] = Form(None),
+    profile: bool = Form(False),
+    files: List[UploadFile] = File(...)
+):
+    """Process uploads for many patients in one run; the manifest maps each upload's file name to a patient ID"""
+    try:
+        entries = parse_manifest(manifest)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    patient_by_file = {os.path.basename(file_name): patient_id for file_name, patient_id in entries}
+    uploaded = {file.filename for file in files}
+    unmapped = sorted(uploaded - set(patient_by_file))
+    missing = sorted(set(patient_by_file) - uploaded)
+    if unmapped or missing:
+        return {"success": False, "error": "Manifest and uploads do not match",
+                "files_without_patient": unmapped, "manifest_files_not_uploaded": missing}
+
+    # Checked here but passed to the run itself: the interface is shared and other requests
+    # may reconfigure it while the uploads are saved
+    if review_format not in REVIEW_FORMATS or review_consolidate not in CONSOLIDATION_MODES:
+        return {"success": False, "error": "review_format must be docx, markdown or text and "
+                                           "review_consolidate must be batch or patient"}
+
+    output_folder = config.get_output_folder()
+    os.makedirs(output_folder, exist_ok=True)
+    saved_paths = await save_uploads(files, output_folder)
+    jobs = [(path, patient_by_file[os.path.basename(path)]) for path in saved_paths]
+    return await get_interface().process_batch_async(jobs, output_folder, priority=priority, submitter=submitter,
+                                                     profile=profile or None, review_format=review_format,
+                                                     review_consolidate=review_consolidate)
+
+
+# Resumable uploads for large scans over unreliable links: POST /uploads, PUT the
+# bytes in chunks (GET /uploads/{id} says where to resume), then finalize to process
+
+@app.post("/uploads")
+async def create_upload(filename: str = Form(...), size: int = Form(...), sha256: Optional[str] = Form(None)):
+    """Start a resumable upload of `size` bytes, optionally with the file's SHA-256 to check on finalize"""
+    try:
+        upload = await asyncio.to_thread(get_upload_store().create, filename, size, sha256)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail())
+    return {"success": True, **upload.describe()}
+
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Append the request body at byte `offset`; answers 409 with the received count when out of step"""
+    try:
+        upload = await get_upload_store().write_chunk(upload_id, offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail())
+    return {"success": True, **upload.describe()}
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """How many bytes of the upload have been received, i.e. the offset to resume from"""
+    try:
+        upload = await asyncio.to_thread(get_upload_store().get, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail())
+    return upload.describe()
+
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Abandon an upload and delete what it has received"""
+    try:
+        await get_upload_store().discard(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail())
+    return {"success": True}
+
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    patient_id: Optional[str] = Form(None),
+    patient_name: Optional[str] = Form(None),
+    review_format: str = Form("docx"),
+    review_consolidate: Optional[str] = Form(None),
+    priority: str = Form(DEFAULT_PRIORITY),
+    submitter: Optional[str] = Form(None),
+    profile: bool = Form(False)
+):
+    """Check a completed upload and process it like /process; the file is moved, not copied"""
+    resolved_patient_id, error = check_process_options(patient_id, patient_name, review_format,
+                                                       review_consolidate, priority)
+    if error:
+        return error
+
+    output_folder = config.get_output_folder()
+    try:
+        saved_path, sha256 = await get_upload_store().finalize(upload_id, output_folder)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail())
+
+    results = await process_saved_files([saved_path], resolved_patient_id, output_folder, review_format,
+                                        review_consolidate, priority, submitter, profile)
+    return {**results, "upload": {"upload_id": upload_id, "sha256": sha256,
+                                  "saved_as": os.path.basename(saved_path)}}
+
+
+@app.get("/process/stats")
+async def process_stats():
+    """How many /process calls ran the pipeline or joined an identical one in flight, and gap-filling counts"""
+    return {**_process_flight.stats(), 'gap_filling': get_interface().processor.gap_filler.get_stats()}
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Global model-call slots in use and per-priority queue depth and wait times"""
+    return get_scheduler().stats()
+
+
+@app.get("/models/stats")
+async def model_stats():
+    """Per key/model request counts, throttling, health and latency of the model pool"""
+    return get_model_pool().get_stats()
+
+
+@app.post("/jobs")
+async def enqueue_job(
+    patient_id: Optional[str] = Form(None),
+    patient_name: Optional[str] = Form(None),
+    profile: bool = Form(False),
+    files: List[UploadFile] = File(...)
+):
+    """Save uploads and queue them for a worker process (see worker.py)"""
+    resolved_patient_id = resolve_patient_id(patient_id, patient_name)
+    if not resolved_patient_id:
+        return unresolved_patient_error(patient_name)
+
+    is_valid, result = get_interface().validate_patient_id(resolved_patient_id)
+    if not is_valid:
+        return {"success": False, "error": result}
+
+    output_folder = config.get_output_folder()
+    os.makedirs(output_folder, exist_ok=True)
+    saved_paths = await save_uploads(files, output_folder)
+
+    job_id = await asyncio.to_thread(get_job_queue().enqueue, {
+        'patient_id': result,
+        'output_folder': output_folder,
+        'files': saved_paths,
+        'profile': profile or None
+    })
+    return {"success": True, "job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Queue depth by status"""
+    return await asyncio.to_thread(get_job_queue().stats)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Current status (and results once done) of a queued job"""
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/patients/search")
+async def search_patients(name: str, limit: int = 5):
+    """Typo-tolerant patient name search against the registry"""
+    directory = get_patient_directory()
+    if directory is None:
+        raise HTTPException(status_code=404, detail="No patient directory configured")
+    return {"matches": directory.search(name, limit=min(limit, 50))}
+
+
+def get_output_record_index():
+    """Record index for the configured output folder's CSV tables"""
+    return get_record_index(os.path.join(config.get_output_folder(), "csv_database_ready"))
+
+
+@app.get("/patients/{patient_id}/records")
+async def patient_records(patient_id: str, table: Optional[str] = None, since: Optional[str] = None,
+                          limit: int = 100, cursor: Optional[int] = None):
+    """Extracted records for a patient, optionally for one table and from a date (YYYY-MM-DD) on"""
+    return await asyncio.to_thread(get_output_record_index().patient_records, patient_id, table, since, limit, cursor)
+
+
+@app.get("/documents/{source_file}")
+async def document_records(source_file: str, limit: int = 100, cursor: Optional[int] = None):
+    """Every record extracted from one source document"""
+    page = await asyncio.to_thread(get_output_record_index().document_records, source_file, limit, cursor)
+    if not page['records'] and cursor is None:
+        raise HTTPException(status_code=404, detail="No records for this document")
+    return page
@@ -0,0 +1,111 @@
+import os
+
+# Environment-driven settings. Values are read on each call so that tests
+# and process managers can change the environment before first use.
+
+
+def get_api_key() -> str:
+    """Google Gemini API key (GEMINI_API_KEY)"""
+    return os.environ.get("GEMINI_API_KEY", "")
+
+
+def get_model_name() -> str:
+    """Gemini model used for OCR and structuring (GEMINI_MODEL_NAME)"""
+    return os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+
+
+def get_api_keys() -> list:
+    """Gemini API keys requests are spread over (GEMINI_API_KEYS, comma-separated; defaults to GEMINI_API_KEY)"""
+    keys = [key.strip() for key in os.environ.get("GEMINI_API_KEYS", "").split(",") if key.strip()]
+    return keys or [get_api_key()]
+
+
+def get_ocr_model_name() -> str:
+    """Gemini model used to read text from scans (GEMINI_OCR_MODEL; defaults to GEMINI_MODEL_NAME)"""
+    return os.environ.get("GEMINI_OCR_MODEL", "") or get_model_name()
+
+
+def get_structuring_model_name() -> str:
+    """Gemini model used for structured extraction and gap filling (GEMINI_STRUCTURING_MODEL; defaults to GEMINI_MODEL_NAME)"""
+    return os.environ.get("GEMINI_STRUCTURING_MODEL", "") or get_model_name()
+
+
+def get_key_requests_per_minute() -> int:
+    """Requests per minute each key may send to each model; 0 means no client-side limit (GEMINI_KEY_RPM)"""
+    return int(os.environ.get("GEMINI_KEY_RPM", "0"))
+
+
+def get_key_cooldown_seconds() -> float:
+    """How long a key/model pair is rested after it is throttled or keeps failing (GEMINI_KEY_COOLDOWN)"""
+    return float(os.environ.get("GEMINI_KEY_COOLDOWN", "30"))
+
+
+def get_output_folder() -> str:
+    """Folder where uploads, Word documents and CSV tables are written (OCR_OUTPUT_FOLDER)"""
+    return os.environ.get("OCR_OUTPUT_FOLDER", os.path.expanduser("~/Desktop/OCR_Output"))
+
+
+def get_max_concurrency() -> int:
+    """Maximum number of files in flight in the async pipeline (OCR_MAX_CONCURRENCY)"""
+    return int(os.environ.get("OCR_MAX_CONCURRENCY", "8"))
+
+
+def get_max_model_calls() -> int:
+    """Maximum number of files calling the model at once across all API requests (OCR_MAX_MODEL_CALLS)"""
+    return int(os.environ.get("OCR_MAX_MODEL_CALLS", str(get_max_concurrency())))
+
+
+def get_tile_max_side() -> int:
+    """Scans with a longer side (in pixels) are split into overlapping tiles for OCR (OCR_TILE_MAX_SIDE)"""
+    return int(os.environ.get("OCR_TILE_MAX_SIDE", "4096"))
+
+
+def get_tile_overlap() -> int:
+    """Overlap in pixels between neighbouring tiles (OCR_TILE_OVERLAP)"""
+    return int(os.environ.get("OCR_TILE_OVERLAP", "256"))
+
+
+def get_max_decoded_mb() -> int:
+    """Largest decoded frame, in MB, the tiling stage will hold in memory (OCR_MAX_DECODED_MB)"""
+    return int(os.environ.get("OCR_MAX_DECODED_MB", "512"))
+
+
+def get_warm_up_on_startup() -> bool:
+    """Whether the API warms up heavy imports and the model client at startup (OCR_WARM_UP)"""
+    return os.environ.get("OCR_WARM_UP", "").lower() in ("1", "true", "yes")
+
+
+def get_queue_path() -> str:
+    """SQLite database holding the shared job queue (OCR_QUEUE_PATH)"""
+    return os.environ.get("OCR_QUEUE_PATH", os.path.join(get_output_folder(), "job_queue.sqlite"))
+
+
+def get_patient_directory_path() -> str:
+    """CSV or SQLite export of the patient registry (PATIENT_DIRECTORY_PATH); empty disables registry checks"""
+    return os.environ.get("PATIENT_DIRECTORY_PATH", "")
+
+
+def get_stream_responses() -> bool:
+    """Whether structured extraction streams the model response and converts entries as they arrive (OCR_STREAM_RESPONSES)"""
+    return os.environ.get("OCR_STREAM_RESPONSES", "").lower() in ("1", "true", "yes")
+
+
+def get_date_order() -> str:
+    """Order of numeric dates like 03/04/2024, 'MDY' or 'DMY' (OCR_DATE_ORDER); unset leaves ambiguous ones as written"""
+    order = os.environ.get("OCR_DATE_ORDER", "").strip().upper()
+    return order if order in ("MDY", "DMY") else ""
+
+
+def get_profile_jobs() -> bool:
+    """Whether every processing job is CPU- and allocation-profiled unless the caller says otherwise (OCR_PROFILE_JOBS)"""
+    return os.environ.get("OCR_PROFILE_JOBS", "").lower() in ("1", "true", "yes")
+
+
+def get_max_upload_mb() -> int:
+    """Largest file accepted by the resumable upload endpoints, in MB (OCR_MAX_UPLOAD_MB)"""
+    return int(os.environ.get("OCR_MAX_UPLOAD_MB", "2048"))
+
+
+def get_upload_expiry_hours() -> float:
+    """Hours an unfinished resumable upload is kept after its last chunk (OCR_UPLOAD_EXPIRY_HOURS)"""
+    return float(os.environ.get("OCR_UPLOAD_EXPIRY_HOURS", "24"))
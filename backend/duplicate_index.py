@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# Hash geometry: a 9x8 grayscale thumbnail gives 8 horizontal gradients per row -> 64 bits
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+# Default maximum Hamming distance for two pages to count as the same paper
+DEFAULT_DUPLICATE_THRESHOLD = 6
+
+# Files are hashed in blocks of this size for the exact-content check
+CONTENT_HASH_BLOCK = 1024 * 1024
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def compute_page_hash(image_path: str) -> Optional[int]:
+    """Compute a 64-bit difference hash (dHash) for the first page of an image file"""
+    from PIL import Image
+
+    try:
+        with Image.open(image_path) as img:
+            # Let JPEG decode at reduced size; the hash only needs a thumbnail
+            img.draft('L', (HASH_WIDTH * 32, HASH_HEIGHT * 32))
+            return hash_image(img)
+    except Exception as e:
+        print(f"Could not compute page hash for {image_path}: {e}")
+        return None
+
+
+def compute_content_hash(file_path: str) -> Optional[str]:
+    """SHA-256 of a file's bytes, confirming that a perceptual match is the very same scan"""
+    hasher = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(CONTENT_HASH_BLOCK), b''):
+                hasher.update(block)
+    except OSError as e:
+        print(f"Could not compute content hash for {file_path}: {e}")
+        return None
+    return hasher.hexdigest()
+
+
+def texts_match(text_a: Optional[str], text_b: Optional[str]) -> bool:
+    """Whether two extractions are the same text, ignoring whitespace and case.
+
+    Same-template forms hash alike, so a perceptual match alone is not
+    enough to reuse a structured extraction; identical text is, since
+    structuring it again would give the same result.
+    """
+    if not text_a or not text_b:
+        return False
+    return _WHITESPACE.sub(' ', text_a).strip().lower() == _WHITESPACE.sub(' ', text_b).strip().lower()
+
+
+def hash_image(img) -> int:
+    """dHash of an already opened (or decoded) PIL image"""
+    from PIL import Image
+
+    thumb = img.convert('L').resize((HASH_WIDTH, HASH_HEIGHT), Image.Resampling.LANCZOS)
+    pixels = list(thumb.getdata())
+
+    page_hash = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for col in range(HASH_WIDTH - 1):
+            page_hash = (page_hash << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return page_hash
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two page hashes"""
+    return bin(hash_a ^ hash_b).count('1')
+
+
+class MultiIndexHashTable:
+    """Multi-index hash table for Hamming-radius lookups over 64-bit page hashes.
+
+    The hash is split into (max_distance + 1) disjoint bit chunks. Two hashes
+    within max_distance bits must agree exactly on at least one chunk, so a
+    lookup only verifies entries sharing a chunk value instead of walking the
+    whole index.
+    """
+
+    def __init__(self, max_distance: int, hash_bits: int = (HASH_WIDTH - 1) * HASH_HEIGHT):
+        self.max_distance = max_distance
+        chunk_count = min(max_distance + 1, hash_bits)
+        self.chunks = []
+        shift = 0
+        for i in range(chunk_count):
+            width = hash_bits // chunk_count + (1 if i < hash_bits % chunk_count else 0)
+            self.chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [{} for _ in self.chunks]
+        self.hashes = []
+        self.entry_ids = []
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, page_hash: int, entry_id: int):
+        """Insert a hash under every chunk table"""
+        slot = len(self.hashes)
+        self.hashes.append(page_hash)
+        self.entry_ids.append(entry_id)
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            table.setdefault((page_hash >> shift) & mask, []).append(slot)
+
+    def search(self, page_hash: int) -> List[Tuple[int, int]]:
+        """Return (distance, entry_id) pairs within max_distance, closest first"""
+        matches = []
+        seen = set()
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            for slot in table.get((page_hash >> shift) & mask, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                distance = hamming_distance(page_hash, self.hashes[slot])
+                if distance <= self.max_distance:
+                    matches.append((distance, self.entry_ids[slot]))
+
+        matches.sort()
+        return matches
+
+
+class PageHashIndex:
+    """Persistent near-duplicate page index backed by SQLite with an in-memory hash table.
+
+    Lookups are scoped to one patient: forms printed from the same template
+    hash alike whoever filled them in, so a page is only ever matched
+    against pages already processed for the same patient ID.
+    """
+
+    def __init__(self, db_path: str, threshold: int = DEFAULT_DUPLICATE_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.table = MultiIndexHashTable(threshold)
+        self._patients: Dict[int, str] = {}  # entry id -> patient id, to scope lookups without a query
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                page_hash TEXT NOT NULL,
+                source_file TEXT,
+                patient_id TEXT,
+                extracted_text TEXT,
+                structured_data TEXT,
+                created_at TEXT,
+                content_sha256 TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if 'content_sha256' not in columns:
+            # Indexes created before the exact-content check; their pages can still match on text
+            self._conn.execute("ALTER TABLE pages ADD COLUMN content_sha256 TEXT")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Rebuild the in-memory table from the hashes stored on disk"""
+        for entry_id, page_hash, patient_id in self._conn.execute("SELECT id, page_hash, patient_id FROM pages"):
+            self.table.add(int(page_hash, 16), entry_id)
+            self._patients[entry_id] = patient_id
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def find(self, page_hash: int, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Return the closest known page of the same patient within the threshold, or None"""
+        with self._lock:
+            matches = [(distance, entry_id) for distance, entry_id in self.table.search(page_hash)
+                       if self._patients.get(entry_id) == patient_id]
+            if not matches:
+                return None
+
+            distance, entry_id = matches[0]
+            row = self._conn.execute(
+                "SELECT source_file, patient_id, extracted_text, structured_data, content_sha256 "
+                "FROM pages WHERE id = ?",
+                (entry_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            'entry_id': entry_id,
+            'distance': distance,
+            'source_file': row[0],
+            'patient_id': row[1],
+            'extracted_text': row[2],
+            'structured_data': json.loads(row[3]) if row[3] else None,
+            'content_sha256': row[4]
+        }
+
+    def add(self, page_hash: int, source_file: str, patient_id: str, extracted_text: str,
+            structured_data: Optional[Dict[str, Any]], content_sha256: Optional[str] = None) -> int:
+        """Record a processed page so later rescans can reuse its extraction"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO pages (page_hash, source_file, patient_id, extracted_text, structured_data, created_at, "
+                "content_sha256) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (f"{page_hash:016x}", source_file, patient_id, extracted_text,
+                 json.dumps(structured_data) if structured_data is not None else None,
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"), content_sha256)
+            )
+            self._conn.commit()
+            entry_id = cursor.lastrowid
+            self.table.add(page_hash, entry_id)
+            self._patients[entry_id] = patient_id
+        return entry_id
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def open_page_index(output_folder: str, threshold: int = DEFAULT_DUPLICATE_THRESHOLD) -> PageHashIndex:
+    """Open (or create) the page hash index stored in an output folder"""
+    return PageHashIndex(os.path.join(output_folder, "page_hash_index.sqlite"), threshold)
@@ -0,0 +1,186 @@
+import os
+import time
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+# Scans and documents the pipeline accepts; PDFs are sent to the model as they are
+SUPPORTED_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.tiff', '.tif', '.bmp', '.webp', '.pdf'})
+
+# Largest page a listing call may return
+MAX_PAGE_SIZE = 1000
+
+# Folder listings kept in memory, least recently used dropped first
+CACHED_FOLDERS = 16
+
+# A folder changed this recently may change again within the same mtime tick, so it is not cached
+RACY_SECONDS = 2.0
+
+
+class FolderListing:
+    """Supported files of one folder, sorted by name, as os.scandir saw them.
+
+    Keeps the DirEntry objects so their stat data is fetched at most once
+    (and for free on Windows, where scandir returns it with the names).
+    """
+
+    def __init__(self, folder: str, mtime_ns: int, entries: List[os.DirEntry]):
+        self.folder = folder
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.names = [entry.name for entry in entries]
+        self._lower_names: Optional[List[str]] = None
+        self._described: Dict[int, Optional[Dict[str, Any]]] = {}
+
+    def lower_names(self) -> List[str]:
+        if self._lower_names is None:
+            self._lower_names = [name.lower() for name in self.names]
+        return self._lower_names
+
+    def describe(self, index: int) -> Optional[Dict[str, Any]]:
+        """path, name, size_mb and modified for one file, or None if it can no longer be read"""
+        if index not in self._described:
+            entry = self.entries[index]
+            try:
+                stat = entry.stat()
+                self._described[index] = {
+                    'path': entry.path,
+                    'name': entry.name,
+                    'size_mb': round(stat.st_size / (1024 * 1024), 2),
+                    'modified': datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M"),
+                    'mtime': stat.st_mtime
+                }
+            except OSError as e:
+                print(f"Error getting file info for {entry.path}: {e}")
+                self._described[index] = None
+        return self._described[index]
+
+
+class FileListingCache:
+    """Input-folder listings built with os.scandir and cached until the folder's mtime changes.
+
+    Adding, removing or renaming a file changes the folder's mtime, so one
+    stat of the folder tells whether a cached listing is still current.
+    Files rewritten in place keep a cached size/date until the next rescan.
+    """
+
+    def __init__(self, max_folders: int = CACHED_FOLDERS):
+        self.max_folders = max_folders
+        self._listings: 'OrderedDict[str, FolderListing]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'scans': 0}
+
+    def listing(self, folder: str) -> FolderListing:
+        """Current listing of a folder; raises OSError if it cannot be read"""
+        folder = os.path.abspath(folder)
+        mtime_ns = os.stat(folder).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(folder)
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                self._listings.move_to_end(folder)
+                self.stats['hits'] += 1
+                return cached
+
+        with os.scandir(folder) as scan:
+            entries = [entry for entry in scan
+                       if os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file()]
+        entries.sort(key=lambda entry: entry.name)
+        listing = FolderListing(folder, mtime_ns, entries)
+
+        with self._lock:
+            self.stats['scans'] += 1
+            if time.time() - mtime_ns / 1e9 >= RACY_SECONDS:
+                self._listings[folder] = listing
+                self._listings.move_to_end(folder)
+                while len(self._listings) > self.max_folders:
+                    self._listings.popitem(last=False)
+            else:
+                self._listings.pop(folder, None)
+        return listing
+
+    def paths(self, folder: str) -> List[str]:
+        """Every supported file in the folder, sorted"""
+        return [entry.path for entry in self.listing(folder).entries]
+
+    def describe_all(self, folder: str) -> List[Dict[str, Any]]:
+        """Every supported file with its metadata"""
+        listing = self.listing(folder)
+        files = []
+        for index in range(len(listing.entries)):
+            info = listing.describe(index)
+            if info is not None:
+                files.append(_public(info))
+        return files
+
+    def page(self, folder: str, limit: int = 100, cursor: Optional[str] = None, name: Optional[str] = None,
+             modified_from: Optional[str] = None, modified_to: Optional[str] = None) -> Dict[str, Any]:
+        """One page of supported files sorted by name.
+
+        cursor is the next_cursor of the previous page (the last file name
+        returned), so paging stays consistent while files are added. name
+        matches case-insensitively anywhere in the file name; modified_from
+        and modified_to are inclusive YYYY-MM-DD dates.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = _day_start(modified_from) if modified_from else None
+        before = _day_start(modified_to, days=1) if modified_to else None
+        needle = name.lower() if name else None
+
+        listing = self.listing(folder)
+        lower_names = listing.lower_names() if needle else None
+
+        def matches(index: int) -> bool:
+            if needle is not None and needle not in lower_names[index]:
+                return False
+            if after is None and before is None:
+                return True
+            # Only date filters need the files' stat data
+            info = listing.describe(index)
+            return (info is not None and (after is None or info['mtime'] >= after)
+                    and (before is None or info['mtime'] < before))
+
+        index = bisect.bisect_right(listing.names, cursor) if cursor else 0
+        files = []
+        has_more = False
+        while index < len(listing.entries):
+            if matches(index):
+                if len(files) == limit:
+                    has_more = True
+                    break
+                info = listing.describe(index)
+                if info is not None:
+                    files.append(_public(info))
+            index += 1
+
+        return {
+            'files': files,
+            'next_cursor': files[-1]['name'] if has_more else None,
+            'folder_total': len(listing.entries)
+        }
+
+
+def _public(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in info.items() if key != 'mtime'}
+
+
+def _day_start(date: str, days: int = 0) -> float:
+    """Local midnight starting a YYYY-MM-DD date, optionally `days` later"""
+    try:
+        return (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=days)).timestamp()
+    except ValueError:
+        raise ValueError(f"Dates must be YYYY-MM-DD, got {date!r}")
+
+
+_cache: Optional[FileListingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_listing_cache() -> FileListingCache:
+    """Process-wide listing cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FileListingCache()
+        return _cache
@@ -0,0 +1,249 @@
+import re
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# Characters of document text kept on each side of a keyword hit, and the excerpt budget per prompt
+WINDOW_CHARS = 250
+MAX_EXCERPT_CHARS = 2400
+
+# Fields asked for in one follow-up prompt at most
+MAX_GAPS_PER_PROMPT = 12
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_BLOOD_PRESSURE = re.compile(r'(\d{2,3})\s*/\s*(\d{2,3})')
+_YEAR = re.compile(r'\b(1[89]\d{2}|20\d{2})\b|\b\d{1,2}[/.-]\d{1,2}[/.-](\d{2})\b')
+
+
+def _first_number(value: str) -> Optional[float]:
+    match = _NUMBER.search(value)
+    return float(match.group()) if match else None
+
+
+def _in_range(low: float, high: float):
+    def check(value: str) -> bool:
+        number = _first_number(value)
+        return number is not None and low <= number <= high
+    return check
+
+
+def _plausible_blood_pressure(value: str) -> bool:
+    match = _BLOOD_PRESSURE.search(value)
+    if not match:
+        return False
+    systolic, diastolic = int(match.group(1)), int(match.group(2))
+    return 60 <= systolic <= 260 and 30 <= diastolic <= 160 and systolic > diastolic
+
+
+def _plausible_temperature(value: str) -> bool:
+    number = _first_number(value)
+    return number is not None and (30 <= number <= 45 or 86 <= number <= 113)
+
+
+def _plausible_date(value: str) -> bool:
+    match = _YEAR.search(value)
+    if match is None:
+        # Month-name dates without a four-digit year still need some digits
+        return bool(re.search(r'\d', value)) and bool(re.search(r'[A-Za-z]{3}', value))
+    if match.group(1):
+        return int(match.group(1)) <= datetime.now().year
+    return True
+
+
+def _plausible_birth_date(value: str) -> bool:
+    match = _YEAR.search(value)
+    if match and match.group(1):
+        return 1890 <= int(match.group(1)) <= datetime.now().year
+    return _plausible_date(value)
+
+
+def _has_digit(value: str) -> bool:
+    return bool(re.search(r'\d', value))
+
+
+# Fields checked after structured extraction:
+# (section, field) -> (table, column, required, plausibility check or None, description, context keywords)
+# Object sections are only checked when they hold some value; list items when their anchor field is set.
+FIELD_RULES = {
+    ('PATIENT_INFO', 'name'): ('patients_registration', 'first_name', True, None,
+                               "the patient's full name", ['name', 'patient']),
+    ('PATIENT_INFO', 'dob'): ('patients_registration', 'date_of_birth', True, _plausible_birth_date,
+                              "the patient's date of birth", ['date of birth', 'birth', 'born', 'dob']),
+    ('PATIENT_INFO', 'phone'): ('patients_registration', 'phone', False, lambda v: len(re.sub(r'\D', '', v)) >= 10,
+                                "the patient's phone number", ['phone', 'tel', 'cell', 'mobile']),
+    ('VITALS', 'blood_pressure'): ('vitals_history', 'blood_pressure_systolic', False, _plausible_blood_pressure,
+                                   "blood pressure as systolic/diastolic", ['blood pressure', 'bp']),
+    ('VITALS', 'heart_rate'): ('vitals_history', 'heart_rate', False, _in_range(20, 250),
+                               "heart rate (beats per minute)", ['heart rate', 'pulse', 'bpm']),
+    ('VITALS', 'temperature'): ('vitals_history', 'temperature', False, _plausible_temperature,
+                                "body temperature with its unit", ['temperature', 'temp']),
+    ('VITALS', 'weight'): ('vitals_history', 'weight', False, _in_range(0.5, 800),
+                           "body weight with its unit", ['weight', 'wt', 'kg', 'lb']),
+    ('VITALS', 'height'): ('vitals_history', 'height', False, _has_digit,
+                           "height with its unit", ['height', 'ht', 'cm', 'tall']),
+    ('VITALS', 'date'): ('vitals_history', 'date_recorded', True, _plausible_date,
+                         "the date the vitals were taken", ['date', 'visit', 'seen', 'recorded']),
+    ('MEDICATIONS', 'dosage'): ('prescription', 'dosage', True, _has_digit,
+                                "the dosage of {anchor}", []),
+    ('MEDICATIONS', 'frequency'): ('prescription', 'frequency', True, None,
+                                   "how often {anchor} is taken", []),
+    ('LAB_RESULTS', 'result'): ('bloodtests', 'result_value', True, None,
+                                "the result of lab test {anchor}", []),
+    ('LAB_RESULTS', 'unit'): ('bloodtests', 'unit', True, None,
+                              "the unit of lab test {anchor}", []),
+    ('LAB_RESULTS', 'date'): ('bloodtests', 'test_date', True, _plausible_date,
+                              "the date of lab test {anchor}", []),
+    ('DIAGNOSES', 'date'): ('diagnosis', 'diagnosis_date', False, _plausible_date,
+                            "the date {anchor} was diagnosed", []),
+}
+
+# Field identifying each list item; its value anchors the text window for the item's gaps
+LIST_ANCHORS = {'MEDICATIONS': 'name', 'LAB_RESULTS': 'test_name', 'DIAGNOSES': 'condition'}
+
+
+class GapFiller:
+    """Finds missing or implausible fields in structured extractions and fills them with one small prompt.
+
+    Instead of re-running the full structuring prompt, the follow-up asks
+    only for the fields that failed validation and only sends the parts of
+    the document text around their keywords (or around the medication /
+    lab test they belong to). Fields without any matching text are not
+    asked for, since the document most likely does not contain them.
+    """
+
+    def __init__(self, database_tables: Dict[str, List[str]]):
+        for (section, field), (table, column, *_) in FIELD_RULES.items():
+            if column not in database_tables.get(table, []):
+                raise ValueError(f"{section}.{field} maps to unknown column {table}.{column}")
+
+        self._lock = threading.Lock()
+        self.stats = {'documents_checked': 0, 'documents_with_gaps': 0, 'fields_missing': 0,
+                      'fields_implausible': 0, 'fields_requested': 0, 'fields_filled': 0,
+                      'followup_calls': 0, 'followup_prompt_chars': 0}
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def find_gaps(self, structured_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fields that are required but empty, or present but implausible"""
+        gaps = []
+        for (section, field), (table, column, required, check, description, keywords) in FIELD_RULES.items():
+            content = structured_data.get(section)
+            if isinstance(content, dict):
+                if any(content.values()):
+                    gap = self._check(content, field, required, check)
+                    if gap:
+                        gaps.append({'section': section, 'index': None, 'field': field, 'reason': gap,
+                                     'value': content.get(field), 'description': description,
+                                     'keywords': keywords})
+            elif isinstance(content, list):
+                anchor_field = LIST_ANCHORS.get(section)
+                for index, item in enumerate(content):
+                    if not isinstance(item, dict) or not str(item.get(anchor_field) or '').strip():
+                        continue
+                    anchor = str(item[anchor_field]).strip()
+                    gap = self._check(item, field, required, check)
+                    if gap:
+                        gaps.append({'section': section, 'index': index, 'field': field, 'reason': gap,
+                                     'value': item.get(field), 'description': description.format(anchor=anchor),
+                                     'keywords': [anchor]})
+
+        self._count(documents_checked=1, documents_with_gaps=1 if gaps else 0,
+                    fields_missing=sum(gap['reason'] == 'missing' for gap in gaps),
+                    fields_implausible=sum(gap['reason'] == 'implausible' for gap in gaps))
+        return gaps
+
+    def _check(self, content: Dict[str, Any], field: str, required: bool, check) -> Optional[str]:
+        value = str(content.get(field) or '').strip()
+        if not value:
+            return 'missing' if required else None
+        if check is not None and not check(value):
+            return 'implausible'
+        return None
+
+    def text_window(self, text: str, keywords: List[str]) -> List[Tuple[int, int]]:
+        """(start, end) spans of text around the first hits of each keyword"""
+        lowered = text.lower()
+        spans = []
+        for keyword in keywords:
+            pattern = re.compile(rf'(?<!\w){re.escape(keyword.lower())}(?!\w)')
+            for hit in list(pattern.finditer(lowered))[:2]:
+                spans.append((max(0, hit.start() - WINDOW_CHARS), min(len(text), hit.end() + WINDOW_CHARS)))
+        return spans
+
+    def build_prompt(self, gaps: List[Dict[str, Any]], text: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Follow-up prompt for the gaps that have matching text; returns (prompt, gaps asked)"""
+        asked = []
+        spans = []
+        for gap in gaps:
+            gap_spans = self.text_window(text, gap['keywords'])
+            if gap_spans and len(asked) < MAX_GAPS_PER_PROMPT:
+                asked.append(gap)
+                spans.extend(gap_spans)
+        if not asked:
+            return None, []
+
+        # Merge overlapping windows and keep within the excerpt budget
+        excerpts = []
+        used = 0
+        for start, end in sorted(spans):
+            if excerpts and start <= excerpts[-1][1]:
+                excerpts[-1][1] = max(excerpts[-1][1], end)
+            else:
+                excerpts.append([start, end])
+        excerpt_text = []
+        for number, (start, end) in enumerate(excerpts, 1):
+            end = min(end, start + MAX_EXCERPT_CHARS - used)
+            if end <= start:
+                break
+            excerpt_text.append(f"[{number}] ...{text[start:end]}...")
+            used += end - start
+
+        fields = []
+        for number, gap in enumerate(asked):
+            line = f"f{number}: {gap['description']}"
+            if gap['reason'] == 'implausible':
+                line += f" (read as \"{gap['value']}\", which looks wrong)"
+            fields.append(line)
+        fields = '\n        '.join(fields)
+        answer_template = json.dumps({f"f{number}": "" for number in range(len(asked))})
+        prompt = f"""
+        Some fields could not be read from a medical document. Using ONLY the excerpts below,
+        give each field's value as written in the document, or "" if the excerpts do not contain it.
+
+        Fields:
+        {fields}
+
+        Excerpts:
+        {chr(10).join(excerpt_text)}
+
+        Return only valid JSON in this form: {answer_template}
+        """
+        self._count(followup_calls=1, fields_requested=len(asked), followup_prompt_chars=len(prompt))
+        return prompt, asked
+
+    def apply(self, structured_data: Dict[str, Any], asked: List[Dict[str, Any]], answers: Dict[str, Any]) -> int:
+        """Merge follow-up answers that pass validation into structured_data; returns fields filled"""
+        filled = 0
+        for number, gap in enumerate(asked):
+            value = str(answers.get(f"f{number}") or '').strip()
+            if not value:
+                continue
+            check = FIELD_RULES[(gap['section'], gap['field'])][3]
+            if check is not None and not check(value):
+                continue
+
+            section = structured_data[gap['section']]
+            target = section if gap['index'] is None else section[gap['index']]
+            target[gap['field']] = value
+            filled += 1
+
+        self._count(fields_filled=filled)
+        return filled
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
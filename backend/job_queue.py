@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import functools
+from typing import Dict, Any, Optional
+
+# Seconds a leased job stays invisible to other workers before it is handed out again
+DEFAULT_VISIBILITY_TIMEOUT = 300
+
+# Attempts before a job is moved to the dead-letter state
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Base delay for retrying a failed job; doubles with each attempt
+DEFAULT_RETRY_DELAY = 10
+
+
+def _synchronized(method):
+    """Serialize access to the queue's connection across threads"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class JobQueue:
+    """Durable job queue stored in SQLite (WAL mode) shared by the API and worker processes.
+
+    Jobs move through queued -> leased -> done. A leased job whose lease
+    expires (for example because its worker died) becomes visible again and
+    is retried; after max_attempts it is dead-lettered instead. A job whose
+    files only partly failed is done, and its failed files continue as a
+    follow-up job with the attempts that are left.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                last_error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires_at)")
+
+    @_synchronized
+    def enqueue(self, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """Add a job and return its id"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT INTO jobs (payload, status, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?)",
+            (json.dumps(payload), max_attempts, now, now, now)
+        )
+        return cursor.lastrowid
+
+    @_synchronized
+    def lease(self, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Claim the oldest available job for a worker, or return None if the queue is empty"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that already used every attempt go to the dead-letter state
+            self._conn.execute(
+                "UPDATE jobs SET status = 'dead', lease_owner = NULL, updated_at = ?, "
+                "last_error = COALESCE(last_error, 'Lease expired') "
+                "WHERE status = 'leased' AND lease_expires_at <= ? AND attempts >= max_attempts",
+                (now, now)
+            )
+
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                "UNION ALL "
+                "SELECT id FROM jobs WHERE status = 'leased' AND lease_expires_at <= ? "
+                "ORDER BY id LIMIT 1",
+                (now, now)
+            ).fetchone()
+
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+
+            self._conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + visibility_timeout, now, row[0])
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return self._get(row[0])
+
+    @_synchronized
+    def heartbeat(self, job_id: int, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> bool:
+        """Extend a lease; returns False if the worker no longer owns the job"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (now + visibility_timeout, now, job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    @_synchronized
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Mark a leased job as done and store its result"""
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (json.dumps(result, default=str), time.time(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    @_synchronized
+    def complete_with_retry(self, job_id: int, worker_id: str, result: Dict[str, Any], retry_payload: Dict[str, Any],
+                            error: str, retry_delay: float = DEFAULT_RETRY_DELAY) -> Optional[Dict[str, Any]]:
+        """Mark a partly failed job as done and, in the same transaction, queue retry_payload for the rest.
+
+        The follow-up job inherits the attempts already spent, so the failed
+        files are retried with backoff until the job's max_attempts is used
+        up and then dead-lettered, like a job that failed outright. Returns
+        the follow-up's id and status, or None if the worker no longer owns
+        the job (nothing is changed then).
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+
+            attempts, max_attempts = row
+            status = 'dead' if attempts >= max_attempts else 'queued'
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (payload, status, attempts, max_attempts, available_at, last_error, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (json.dumps(retry_payload), status, attempts, max_attempts,
+                 now + retry_delay * (2 ** (attempts - 1)), error, now, now)
+            )
+            retry = {'job_id': cursor.lastrowid, 'status': status}
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (json.dumps({**result, 'retry_job': retry}, default=str), now, job_id)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return retry
+
+    @_synchronized
+    def fail(self, job_id: int, worker_id: str, error: str, retry_delay: float = DEFAULT_RETRY_DELAY) -> str:
+        """Release a failed job for retry with backoff, or dead-letter it; returns the new status"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return 'lost'
+
+            attempts, max_attempts = row
+            status = 'dead' if attempts >= max_attempts else 'queued'
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, available_at = ?, lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (status, error, now + retry_delay * (2 ** (attempts - 1)), now, job_id)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        return status
+
+    @_synchronized
+    def requeue_dead(self, job_id: int) -> bool:
+        """Give a dead-lettered job a fresh set of attempts"""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'dead'",
+            (now, now, job_id)
+        )
+        return cursor.rowcount == 1
+
+    @_synchronized
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Return a job's current state"""
+        return self._get(job_id)
+
+    def _get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT id, payload, status, attempts, max_attempts, lease_owner, lease_expires_at, "
+            "last_error, result, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return {
+            'id': row[0],
+            'payload': json.loads(row[1]),
+            'status': row[2],
+            'attempts': row[3],
+            'max_attempts': row[4],
+            'lease_owner': row[5],
+            'lease_expires_at': row[6],
+            'last_error': row[7],
+            'result': json.loads(row[8]) if row[8] else None,
+            'created_at': row[9],
+            'updated_at': row[10]
+        }
+
+    @_synchronized
+    def stats(self) -> Dict[str, int]:
+        """Count jobs by status"""
+        counts = {'queued': 0, 'leased': 0, 'done': 0, 'dead': 0}
+        for status, count in self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    @_synchronized
+    def close(self):
+        """Close the database connection"""
+        self._conn.close()
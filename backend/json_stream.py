@@ -0,0 +1,204 @@
+import re
+import sys
+import json
+from typing import Dict, List, Any, Tuple
+
+# Outside strings: a whole string, a structural character (or the opening quote of a string that
+# continues in the next chunk), or a run of characters belonging to a number/true/false/null
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]",:]|[^\s{}\[\]",:]+')
+# Inside an array element or a nested object only brackets and strings matter
+_NESTED_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]"]')
+# Inside strings: the closing quote or an escape
+_STRING_STOP = re.compile(r'["\\]')
+
+
+def _interned_object(pairs):
+    return {sys.intern(key): value for key, value in pairs}
+
+
+# Elements are decoded one at a time, so share key strings between them the
+# way a single json.loads of the whole document would
+_decoder = json.JSONDecoder(object_pairs_hook=_interned_object)
+
+
+class StreamingJSONParser:
+    """Parses a JSON object that arrives in chunks, such as a streamed model response.
+
+    feed() returns each element of the object's top-level arrays as soon as
+    the element is complete, so callers can act on the first MEDICATIONS or
+    LAB_RESULTS entry while the rest is still being generated. close()
+    returns the whole object. Text before the opening brace (e.g. a code
+    fence) and after the closing one is ignored. Only the part of the input
+    belonging to an unfinished value is kept in memory.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._offset = 0          # absolute position of _buffer[0]
+        self._pos = 0             # absolute position of the next character to scan
+        self._depth = 0
+        self._done = False
+        self._in_string = False
+        self._string_start = None
+        self._expect_key = True
+        self._key = None
+        self._value_start = None  # start of the current top-level value
+        self._array = None        # parsed elements while the current top-level value is an array
+        self._element_start = None
+        self.result: Dict[str, Any] = {}
+
+    def feed(self, chunk: str) -> List[Tuple[str, int, Any]]:
+        """Add text; returns (key, index, element) for every top-level array element completed by it"""
+        if self._done or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        end = self._offset + len(self._buffer)
+
+        while self._pos < end and not self._done:
+            if self._in_string:
+                match = _STRING_STOP.search(self._buffer, self._pos - self._offset)
+                if match is None:
+                    self._pos = end
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(self._buffer):
+                        # The escaped character is in the next chunk
+                        self._pos = self._offset + match.start()
+                        break
+                    self._pos = self._offset + match.end() + 1
+                    continue
+                self._pos = self._offset + match.end()
+                self._in_string = False
+                self._close_string(completed)
+                continue
+
+            nested = self._depth > 2 or (self._depth == 2 and self._array is None)
+            match = (_NESTED_TOKEN if nested else _TOKEN).search(self._buffer, self._pos - self._offset)
+            if match is None:
+                self._pos = end
+                break
+            start = self._offset + match.start()
+            self._pos = self._offset + match.end()
+            token = match.group()
+            if len(token) > 1 and token[0] == '"':
+                # The whole string arrived in this chunk
+                self._token('"', start, completed)
+                self._in_string = False
+                self._close_string(completed)
+            else:
+                self._token(token, start, completed)
+
+        self._compact()
+        return completed
+
+    def close(self) -> Dict[str, Any]:
+        """The complete object; raises ValueError when the input ended early"""
+        if not self._done:
+            raise ValueError("JSON response ended before the top-level object was complete")
+        return self.result
+
+    def _token(self, token: str, start: int, completed: List[Tuple[str, int, Any]]):
+        if self._depth == 0:
+            if token == '{':
+                self._depth = 1
+            elif token == '[':
+                raise ValueError("Expected a JSON object, got an array")
+            return
+
+        if token == '"':
+            self._in_string = True
+            self._string_start = start
+            if self._depth == 1 and not self._expect_key:
+                self._value_start = start
+            elif self._depth == 2 and self._array is not None and self._element_start is None:
+                self._element_start = start
+            return
+
+        if token == ':':
+            if self._depth == 1:
+                self._expect_key = False
+            return
+
+        if token == ',':
+            if self._depth == 1:
+                self._finish_value(start)
+                self._expect_key = True
+            elif self._depth == 2 and self._array is not None:
+                self._finish_element(start, completed)
+            return
+
+        if token in '{[':
+            if self._depth == 1:
+                if self._expect_key:
+                    raise ValueError(f"Unexpected {token!r} where a key was expected")
+                self._value_start = start
+                if token == '[':
+                    self._array = []
+            elif self._depth == 2 and self._array is not None and self._element_start is None:
+                self._element_start = start
+            self._depth += 1
+            return
+
+        if token in '}]':
+            if self._depth == 1:
+                self._finish_value(start)
+                self._depth = 0
+                self._done = True
+                return
+            if self._depth == 2 and self._array is not None:
+                self._finish_element(start, completed)
+            self._depth -= 1
+            if self._depth == 2 and self._array is not None:
+                self._finish_element(start + 1, completed)
+            elif self._depth == 1:
+                self._finish_value(start + 1)
+            return
+
+        # Start of a number, true, false or null
+        if self._depth == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = start
+        elif self._depth == 2 and self._array is not None and self._element_start is None:
+            self._element_start = start
+
+    def _close_string(self, completed: List[Tuple[str, int, Any]]):
+        if self._depth == 1 and self._expect_key:
+            self._key = _decoder.decode(self._slice(self._string_start, self._pos))
+        elif self._depth == 1:
+            self._finish_value(self._pos)
+        elif self._depth == 2 and self._array is not None:
+            self._finish_element(self._pos, completed)
+        self._string_start = None
+
+    def _finish_value(self, end: int):
+        if self._value_start is None:
+            return
+        if self._array is not None:
+            value, self._array = self._array, None
+        else:
+            value = _decoder.decode(self._slice(self._value_start, end))
+        self.result[self._key] = value
+        self._value_start = None
+
+    def _finish_element(self, end: int, completed: List[Tuple[str, int, Any]]):
+        if self._element_start is None:
+            return
+        element = _decoder.decode(self._slice(self._element_start, end))
+        self._element_start = None
+        completed.append((self._key, len(self._array), element))
+        self._array.append(element)
+
+    def _slice(self, start: int, end: int) -> str:
+        return self._buffer[start - self._offset:end - self._offset]
+
+    def _compact(self):
+        """Drop scanned text that no unfinished key or value still needs"""
+        keep = self._pos
+        for start in (self._string_start, self._element_start,
+                      None if self._array is not None else self._value_start):
+            if start is not None:
+                keep = min(keep, start)
+        if keep > self._offset:
+            self._buffer = self._buffer[keep - self._offset:]
+            self._offset = keep
+
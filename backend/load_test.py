@@ -0,0 +1,490 @@
+import os
+import sys
+import io
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+# Bump when report fields change meaning so old reports are not compared blindly
+REPORT_SCHEMA_VERSION = 1
+
+# Synthetic upload profiles: (page width, page height, pages, format)
+UPLOAD_PROFILES = {
+    'photo': (1200, 1600, 1, 'JPEG'),   # phone photo of a form
+    'scan': (2550, 3300, 1, 'JPEG'),    # letter page scanned at 300 dpi
+    'fax': (1728, 2200, 1, 'PNG'),      # bilevel fax page
+    'pdf': (1700, 2200, 3, 'PDF'),      # three-page scanned PDF at 200 dpi
+}
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'PDF': 'application/pdf'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'PDF': '.pdf'}
+
+FAKE_TEXT = (
+    "Patient: John Smith\nDOB: 01/02/1980\nPhone: (613) 555 1234\n"
+    "BP 120/80  HR 72  Weight 180 lbs  Height 5'10\"  Temp 98.6F\n"
+    "Medications: Lisinopril 10mg daily; Metformin 500mg twice daily\n"
+    "Allergies: Penicillin (rash)\nHbA1c 6.1 % (2024-03-04)"
+)
+
+FAKE_STRUCTURED = {
+    "PATIENT_INFO": {"name": "John Smith", "dob": "01/02/1980", "phone": "(613) 555 1234"},
+    "VITALS": {"blood_pressure": "120/80", "heart_rate": "72", "weight": "180 lbs",
+               "height": "5'10\"", "temperature": "98.6F", "date": "03/04/2024"},
+    "MEDICATIONS": [{"name": "Lisinopril", "dosage": "10mg", "frequency": "daily"},
+                    {"name": "Metformin", "dosage": "500mg", "frequency": "twice daily"}],
+    "ALLERGIES": [{"allergen": "Penicillin", "reaction": "rash"}],
+    "LAB_RESULTS": [{"test_name": "HbA1c", "result": "6.1", "unit": "%", "date": "2024-03-04"}]
+}
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    """Streamed response: the text in chunks, with the response latency spread over them"""
+
+    CHUNK_CHARS = 64
+
+    def __init__(self, text: str, delay: float):
+        self.chunks = [text[i:i + self.CHUNK_CHARS] for i in range(0, len(text), self.CHUNK_CHARS)]
+        self.chunk_delay = delay / max(1, len(self.chunks))
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.chunk_delay)
+            yield _FakeResponse(chunk)
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.chunk_delay)
+            yield _FakeResponse(chunk)
+
+
+class FakeModel:
+    """Stand-in for the Gemini model with a configurable response latency.
+
+    OCR requests (a [prompt, image] list) get canned page text; structuring
+    prompts (a string) get canned JSON, so the rest of the pipeline runs
+    for real. stream=True is supported for OCR_STREAM_RESPONSES runs.
+    """
+
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 200):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def _respond(self, contents) -> _FakeResponse:
+        return _FakeResponse(FAKE_TEXT if isinstance(contents, list) else json.dumps(FAKE_STRUCTURED))
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        if stream:
+            return _FakeStream(self._respond(contents).text, self._delay())
+        time.sleep(self._delay())
+        return self._respond(contents)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        if stream:
+            return _FakeStream(self._respond(contents).text, self._delay())
+        await asyncio.sleep(self._delay())
+        return self._respond(contents)
+
+
+def render_page(width: int, height: int, seed: int):
+    """A white page with rows of dark word-like blocks, roughly the density of a filled form"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    margin = width // 12
+    line_height = max(12, height // 60)
+    for y in range(margin, height - margin, line_height * 2):
+        x = margin + rng.randint(0, width // 20)
+        while x < width - margin:
+            word = rng.randint(line_height, line_height * 5)
+            draw.rectangle([x, y, min(x + word, width - margin), y + line_height], fill=rng.randint(0, 80))
+            x += word + rng.randint(line_height // 2, line_height)
+    return page
+
+
+def make_upload(profile: str, seed: int) -> Tuple[str, bytes, str]:
+    """Render one synthetic upload: (filename, content, mime type)"""
+    width, height, pages, image_format = UPLOAD_PROFILES[profile]
+    images = [render_page(width, height, seed * 100 + page) for page in range(pages)]
+    if image_format == 'PNG':
+        images = [image.convert('1') for image in images]
+
+    buffer = io.BytesIO()
+    if image_format == 'PDF':
+        images[0].save(buffer, 'PDF', resolution=200, save_all=True, append_images=images[1:])
+    elif image_format == 'JPEG':
+        images[0].save(buffer, 'JPEG', quality=85)
+    else:
+        images[0].save(buffer, 'PNG', optimize=True)
+    return f"{profile}_{seed}{EXTENSIONS[image_format]}", buffer.getvalue(), MIME_TYPES[image_format]
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc, otherwise ps); None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(['ps', '-o', 'rss=', '-p', str(pid)], capture_output=True, text=True, timeout=5)
+        return int(output.stdout.strip()) / 1024
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoadTest:
+    """Closed-loop load generator: N clients each upload, wait for the response, and repeat"""
+
+    def __init__(self, base_url: str, target: str, profiles: List[str], files_per_request: int = 1,
+                 server_pid: Optional[int] = None, patient_id: str = "1001", timeout: float = 600):
+        self.base_url = base_url.rstrip('/')
+        self.target = target
+        self.profiles = profiles
+        self.files_per_request = files_per_request
+        self.server_pid = server_pid
+        self.patient_id = patient_id
+        self.timeout = timeout
+        self._uploads: Dict[str, List[Tuple[str, bytes, str]]] = {}
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+
+    def prepare(self, variants: int = 4):
+        """Pre-render a few distinct pages per profile so generation stays out of the measurements"""
+        for profile in self.profiles:
+            self._uploads[profile] = [make_upload(profile, seed) for seed in range(variants)]
+            sizes = [len(content) for _, content, _ in self._uploads[profile]]
+            print(f"🖼️  {profile}: {len(sizes)} variants, ~{sum(sizes) / len(sizes) / 1024:.0f} KB each")
+
+    def _next_files(self) -> List[Tuple[str, Tuple[str, bytes, str]]]:
+        """Upload payload for one request; each file gets a unique name and content"""
+        files = []
+        for _ in range(self.files_per_request):
+            with self._sequence_lock:
+                self._sequence += 1
+                sequence = self._sequence
+            profile = self.profiles[sequence % len(self.profiles)]
+            filename, content, mime_type = random.choice(self._uploads[profile])
+            # Trailing bytes keep decoders happy but make every upload distinct, so the
+            # service's in-flight coalescing does not collapse the generated load
+            name, extension = os.path.splitext(filename)
+            files.append(('files', (f"{name}_{sequence}{extension}", content + os.urandom(16), mime_type)))
+        return files
+
+    def _client(self, deadline: float, samples: List[Tuple[float, Optional[str]]]):
+        import requests
+
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            files = self._next_files()
+            start = time.perf_counter()
+            error = None
+            try:
+                response = session.post(f"{self.base_url}/process", data={'patient_id': self.patient_id},
+                                        files=files, timeout=self.timeout)
+                if response.status_code != 200:
+                    error = f"HTTP {response.status_code}"
+                else:
+                    body = response.json()
+                    result = body.get('result', body) if self.target == 'main' else body
+                    if not result.get('success'):
+                        error = result.get('error', 'unsuccessful')
+                    elif result.get('files_failed'):
+                        error = "file failed: " + str(result['files_failed'][0].get('error'))
+            except Exception as e:
+                error = type(e).__name__
+            samples.append((time.perf_counter() - start, error))
+
+    def _watch_rss(self, stop: threading.Event, readings: List[float]):
+        while True:
+            rss = process_rss_mb(self.server_pid)
+            if rss is not None:
+                readings.append(rss)
+            if stop.wait(0.25):
+                return
+
+    def run_step(self, concurrency: int, duration: float) -> Dict[str, Any]:
+        """Run `concurrency` clients for `duration` seconds and summarize the step"""
+        samples: List[Tuple[float, Optional[str]]] = []
+        rss_readings: List[float] = []
+        stop = threading.Event()
+        watcher = None
+        if self.server_pid:
+            watcher = threading.Thread(target=self._watch_rss, args=(stop, rss_readings), daemon=True)
+            watcher.start()
+
+        start = time.monotonic()
+        deadline = start + duration
+        clients = [threading.Thread(target=self._client, args=(deadline, samples), daemon=True)
+                   for _ in range(concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - start
+
+        stop.set()
+        if watcher:
+            watcher.join()
+
+        latencies = [latency * 1000 for latency, error in samples if error is None]
+        errors: Dict[str, int] = {}
+        for _, error in samples:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+
+        def rounded(value):
+            return round(value, 1) if value is not None else None
+
+        return {
+            'concurrency': concurrency,
+            'duration_s': round(elapsed, 2),
+            'requests': len(samples),
+            'succeeded': len(latencies),
+            'errors': sum(errors.values()),
+            'error_rate': round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+            'error_kinds': dict(sorted(errors.items())),
+            'throughput_rps': round(len(latencies) / elapsed, 3),
+            'files_per_s': round(len(latencies) * self.files_per_request / elapsed, 3),
+            'latency_ms': {
+                'p50': rounded(percentile(latencies, 0.50)),
+                'p95': rounded(percentile(latencies, 0.95)),
+                'p99': rounded(percentile(latencies, 0.99)),
+                'max': rounded(max(latencies) if latencies else None),
+                'mean': rounded(sum(latencies) / len(latencies) if latencies else None)
+            },
+            'server_rss_mb': {
+                'start': rounded(rss_readings[0] if rss_readings else None),
+                'peak': rounded(max(rss_readings) if rss_readings else None),
+                'end': rounded(rss_readings[-1] if rss_readings else None)
+            }
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📈 Load test: {report['target']} @ {report['config']['model_latency_ms']}ms fake model, "
+          f"profiles={','.join(report['config']['profiles'])}")
+    print(f"{'conc':>5} {'reqs':>6} {'err%':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'rss MB':>8}")
+    for step in report['steps']:
+        latency = step['latency_ms']
+        rss = step['server_rss_mb']['peak']
+
+        def cell(value):
+            return f"{value:8.0f}" if value is not None else f"{'-':>8}"
+
+        print(f"{step['concurrency']:>5} {step['requests']:>6} {step['error_rate'] * 100:>6.1f} "
+              f"{step['throughput_rps']:>7.2f} {cell(latency['p50'])} {cell(latency['p95'])} "
+              f"{cell(latency['p99'])} {cell(rss)}")
+
+
+def compare_reports(baseline: Dict[str, Any], candidate: Dict[str, Any]):
+    """Print per-concurrency changes between two reports"""
+    if baseline.get('schema_version') != candidate.get('schema_version'):
+        print("⚠️  Reports use different schema versions; comparing anyway")
+    if baseline['config'] != candidate['config']:
+        print("⚠️  Reports were produced with different settings")
+
+    baseline_steps = {step['concurrency']: step for step in baseline['steps']}
+    print(f"{'conc':>5} {'req/s':>16} {'p95 ms':>18} {'p99 ms':>18} {'err%':>12} {'rss MB':>16}")
+    for step in candidate['steps']:
+        old = baseline_steps.get(step['concurrency'])
+        if old is None:
+            continue
+
+        def change(new_value, old_value, width):
+            if new_value is None or old_value is None:
+                return f"{'-':>{width}}"
+            delta = f"{(new_value - old_value) / old_value * 100:+.0f}%" if old_value else ""
+            return f"{new_value:.1f} ({delta})".rjust(width)
+
+        print(f"{step['concurrency']:>5} {change(step['throughput_rps'], old['throughput_rps'], 16)} "
+              f"{change(step['latency_ms']['p95'], old['latency_ms']['p95'], 18)} "
+              f"{change(step['latency_ms']['p99'], old['latency_ms']['p99'], 18)} "
+              f"{step['error_rate'] * 100:>5.1f} vs {old['error_rate'] * 100:<4.1f} "
+              f"{change(step['server_rss_mb']['peak'], old['server_rss_mb']['peak'], 16)}")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def start_server(target: str, port: int, latency_ms: float, jitter_ms: float, workdir: str) -> subprocess.Popen:
+    """Launch the target API with the fake model in a subprocess and wait until it answers"""
+    import requests
+
+    env = dict(os.environ)
+    env['OCR_OUTPUT_FOLDER'] = os.path.join(workdir, 'output')
+    env.pop('PATIENT_DIRECTORY_PATH', None)
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve', '--target', target, '--port', str(port),
+         '--model-latency', str(latency_ms), '--model-jitter', str(jitter_ms)],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited early; see {log.name}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1).status_code == 200:
+                return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within 60s; see {log.name}")
+
+
+def serve(args):
+    """Run app.py or main.py with the fake model (used by the run command)"""
+    import uvicorn
+    import model_pool
+
+    # One fake model per configured key and model, so GEMINI_API_KEYS / GEMINI_KEY_RPM runs exercise the pool
+    model_pool._pool = model_pool.ModelPool.from_config(
+        lambda api_key, model_name: FakeModel(args.model_latency, args.model_jitter))
+    if args.target == 'app':
+        import app as target_module
+    else:
+        import main as target_module
+
+    # Measure the pipeline rather than near-duplicate reuse of the synthetic pages
+    target_module.get_interface().duplicate_detection = False
+    uvicorn.run(target_module.app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+def run(args):
+    profiles = args.profiles.split(',')
+    unknown = [profile for profile in profiles if profile not in UPLOAD_PROFILES]
+    if unknown:
+        sys.exit(f"Unknown upload profiles: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='ocr_load_')
+    server = None
+    base_url = args.url
+    server_pid = args.server_pid
+    if not base_url:
+        port = _free_port()
+        print(f"🚀 Starting {args.target} on port {port} (work dir {workdir})")
+        server = start_server(args.target, port, args.model_latency, args.model_jitter, workdir)
+        base_url = f"http://127.0.0.1:{port}"
+        server_pid = server.pid
+
+    report = {
+        'schema_version': REPORT_SCHEMA_VERSION,
+        'target': args.target,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'config': {'concurrency': levels, 'step_duration_s': args.duration, 'profiles': profiles,
+                   'files_per_request': args.files_per_request, 'model_latency_ms': args.model_latency,
+                   'model_jitter_ms': args.model_jitter},
+        'steps': []
+    }
+
+    try:
+        load = LoadTest(base_url, args.target, profiles, args.files_per_request, server_pid)
+        load.prepare()
+        for concurrency in levels:
+            print(f"⏱️  {concurrency} concurrent clients for {args.duration}s...")
+            step = load.run_step(concurrency, args.duration)
+            report['steps'].append(step)
+            print(f"   {step['throughput_rps']} req/s, p95 {step['latency_ms']['p95']} ms, "
+                  f"errors {step['errors']}/{step['requests']}")
+            if step['error_rate'] > args.stop_error_rate:
+                print(f"🛑 Error rate above {args.stop_error_rate:.0%}; stopping the ramp")
+                break
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\n💾 Report saved to {args.output}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    compare_reports(baseline, candidate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /process API with a fake extraction engine")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Ramp concurrent uploads and report latency, throughput and RSS")
+    run_parser.add_argument('--target', choices=('app', 'main'), default='app', help="API module to test")
+    run_parser.add_argument('--url', help="Test an already running server instead of starting one")
+    run_parser.add_argument('--server-pid', type=int, help="PID of the --url server, for RSS sampling")
+    run_parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="Comma-separated concurrency ramp")
+    run_parser.add_argument('--duration', type=float, default=30, help="Seconds per concurrency level")
+    run_parser.add_argument('--profiles', default='photo,scan,fax,pdf',
+                            help=f"Upload mix, from: {', '.join(UPLOAD_PROFILES)}")
+    run_parser.add_argument('--files-per-request', type=int, default=1)
+    run_parser.add_argument('--stop-error-rate', type=float, default=0.5,
+                            help="Stop ramping once a level's error rate exceeds this")
+    run_parser.add_argument('--output', help="Write the JSON report here")
+
+    for command_parser in (run_parser, commands.add_parser('serve', help=argparse.SUPPRESS)):
+        command_parser.add_argument('--model-latency', type=float, default=800, help="Fake model latency (ms)")
+        command_parser.add_argument('--model-jitter', type=float, default=200, help="Fake model jitter (ms)")
+    serve_parser = commands.choices['serve']
+    serve_parser.add_argument('--target', choices=('app', 'main'), default='app')
+    serve_parser.add_argument('--port', type=int, required=True)
+
+    compare_parser = commands.add_parser('compare', help="Compare two saved reports")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+
+    args = parser.parse_args()
+    {'run': run, 'serve': serve, 'compare': compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
 from OCR import MedicalOCRInterface
+from pathlib import Path
 import os
+import asyncio
 
 app = FastAPI()
 
@@ -14,7 +16,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-interface = MedicalOCRInterface()
+_interface = None
+
+
+def get_interface() -> MedicalOCRInterface:
+    """Get the shared processing interface, creating it on first use"""
+    global _interface
+    if _interface is None:
+        _interface = MedicalOCRInterface()
+    return _interface
 
 @app.post("/process")
 async def process_files(
@@ -27,17 +37,16 @@ async def process_files(
 
     for file in files:
         path = f"uploads/{file.filename}"
-        with open(path, "wb") as f:
-            f.write(await file.read())
+        await asyncio.to_thread(Path(path).write_bytes, await file.read())
         saved_files.append(path)
 
-    
+    interface = get_interface()
     interface.set_patient_id(patient_id)
     interface.set_selected_files(saved_files)
-    interface.set_output_folder("outputs")
     os.makedirs("outputs", exist_ok=True)
+    interface.set_output_folder("outputs")
 
-    result = interface.process_files()
+    result = await interface.process_files_async()
 
     return {
         "message": "Processing complete",
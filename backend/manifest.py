@@ -0,0 +1,66 @@
+import os
+import csv
+import json
+from typing import List, Tuple
+
+# Column names accepted for each field in a CSV manifest
+FILE_COLUMNS = ('file', 'filename', 'path', 'file_path')
+PATIENT_COLUMNS = ('patient_id', 'patient', 'id')
+
+
+def parse_manifest(content: str) -> List[Tuple[str, str]]:
+    """Parse a batch manifest into (file, patient_id) pairs.
+
+    Accepts JSON, either {"file": "patient_id", ...} or
+    [{"file": ..., "patient_id": ...}, ...], or a CSV with a header row
+    naming a file column and a patient_id column.
+    """
+    content = content.lstrip('\ufeff').strip()
+    if not content:
+        raise ValueError("Manifest is empty")
+
+    if content[0] in '[{':
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Manifest is not valid JSON: {e}")
+        if isinstance(data, dict):
+            entries = list(data.items())
+        else:
+            entries = []
+            for item in data:
+                if not isinstance(item, dict):
+                    raise ValueError("Manifest list entries must be objects with file and patient_id")
+                entries.append((_pick(item, FILE_COLUMNS), _pick(item, PATIENT_COLUMNS)))
+    else:
+        reader = csv.DictReader(content.splitlines())
+        fieldnames = {name.strip().lower(): name for name in reader.fieldnames or []}
+        file_column = next((fieldnames[name] for name in FILE_COLUMNS if name in fieldnames), None)
+        patient_column = next((fieldnames[name] for name in PATIENT_COLUMNS if name in fieldnames), None)
+        if file_column is None or patient_column is None:
+            raise ValueError("Manifest CSV needs a file column and a patient_id column")
+        entries = [(row[file_column], row[patient_column]) for row in reader]
+
+    pairs = []
+    for line, (file_path, patient_id) in enumerate(entries, 1):
+        file_path = str(file_path or '').strip()
+        patient_id = str(patient_id or '').strip()
+        if not file_path or not patient_id:
+            raise ValueError(f"Manifest entry {line} is missing a file or patient ID")
+        pairs.append((file_path, patient_id))
+    return pairs
+
+
+def _pick(item: dict, names: Tuple[str, ...]):
+    lowered = {str(key).lower(): value for key, value in item.items()}
+    return next((lowered[name] for name in names if name in lowered), None)
+
+
+def load_manifest(manifest_path: str) -> List[Tuple[str, str]]:
+    """Read a manifest file; relative file paths are resolved against the manifest's folder"""
+    with open(manifest_path, encoding='utf-8') as f:
+        pairs = parse_manifest(f.read())
+
+    base_folder = os.path.dirname(os.path.abspath(manifest_path))
+    return [(os.path.normpath(os.path.join(base_folder, os.path.expanduser(file_path))), patient_id)
+            for file_path, patient_id in pairs]
@@ -0,0 +1,375 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+import config
+
+# Roles a model call is routed by; each role has its own model name (see config)
+ROLES = ('ocr', 'structure')
+
+# Failures in a row, other than throttling, after which a client is rested like a throttled one
+MAX_CONSECUTIVE_FAILURES = 3
+# The cool-down doubles for each throttle in a row, up to this multiple
+MAX_COOLDOWN_FACTOR = 8
+# Longest sleep while waiting for a client to free up before checking again
+MAX_WAIT_SECONDS = 5.0
+# Recent call latencies kept per client for percentiles
+LATENCY_SAMPLES = 500
+
+# Server errors worth retrying on another key (they are not the key's fault)
+_TRANSIENT_CODES = (500, 502, 503, 504)
+
+_build_lock = threading.Lock()
+
+# The SDK has no per-model API key, so models for the extra keys get their own service
+# clients through these GenerativeModel attributes. They are not public API: the SDK is
+# pinned in requirements.txt and tests/test_model_pool.py fails if they stop being used
+SDK_CLIENT_ATTRIBUTES = ('_client', '_async_client')
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def is_throttled(error: Exception) -> bool:
+    """Whether an SDK error means the key hit its rate limit or quota (HTTP 429 / ResourceExhausted)"""
+    return getattr(error, 'code', None) == 429 or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+
+
+def _is_transient(error: Exception) -> bool:
+    return getattr(error, 'code', None) in _TRANSIENT_CODES or type(error).__name__ in (
+        'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded')
+
+
+def _build_model(api_key: str, model_name: str, own_clients: bool):
+    """A GenerativeModel sending its requests with api_key"""
+    import google.generativeai as genai
+
+    if not own_clients:
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(model_name=model_name)
+
+    # genai.configure holds a single process-wide key, so models for the other
+    # keys get their own service client (the async one is made on first async use,
+    # inside the event loop that will run it)
+    from google.ai import generativelanguage as glm
+
+    model = genai.GenerativeModel(model_name=model_name)
+    missing = [name for name in SDK_CLIENT_ATTRIBUTES if not hasattr(model, name)]
+    if missing:
+        # Refuse rather than let every call silently go out with the default key
+        raise RuntimeError(f"This google-generativeai version has no GenerativeModel.{', '.join(missing)}, so "
+                           f"calls cannot be sent with separate API keys; install the version in requirements.txt")
+    model._client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+    return model
+
+
+class ModelClient:
+    """One API key paired with one model: its request budget, health and call stats.
+
+    State is only changed by ModelPool while holding the pool's lock.
+    """
+
+    def __init__(self, name: str, model_name: str, api_key: str = '', requests_per_minute: int = 0,
+                 own_clients: bool = False, model=None):
+        self.name = name
+        self.model_name = model_name
+        self.api_key = api_key
+        self.requests_per_minute = requests_per_minute
+        self.own_clients = own_clients
+        self._model = model
+        self._tokens = float(requests_per_minute)
+        self._refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.consecutive_throttles = 0
+        self.stats = {'requests': 0, 'succeeded': 0, 'failed': 0, 'throttled': 0, 'cooldowns': 0}
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._total_latency = 0.0
+
+    def get_model(self):
+        """The SDK model for this key, built on first use"""
+        if self._model is None:
+            with _build_lock:
+                if self._model is None:
+                    self._model = _build_model(self.api_key, self.model_name, self.own_clients)
+        return self._model
+
+    def get_async_model(self):
+        """The SDK model, with this key's async client attached; call from the event loop"""
+        model = self.get_model()
+        if self.own_clients and model._async_client is None:
+            from google.ai import generativelanguage as glm
+
+            model._async_client = glm.GenerativeServiceAsyncClient(client_options={'api_key': self.api_key})
+        return model
+
+    def _refill(self, now: float):
+        if self.requests_per_minute:
+            self._tokens = min(float(self.requests_per_minute),
+                               self._tokens + (now - self._refilled_at) * self.requests_per_minute / 60)
+            self._refilled_at = now
+
+    def remaining(self, now: float) -> float:
+        """Requests this client may still send in the current minute (unbounded without a limit)"""
+        if not self.requests_per_minute:
+            return float('inf')
+        self._refill(now)
+        return self._tokens
+
+    def ready_in(self, now: float) -> float:
+        """Seconds until this client can take a request; 0 when it can now"""
+        wait = max(0.0, self.cooldown_until - now)
+        if self.requests_per_minute and self.remaining(now) < 1:
+            wait = max(wait, (1 - self._tokens) * 60 / self.requests_per_minute)
+        return wait
+
+    def take(self, now: float):
+        if self.requests_per_minute:
+            self._refill(now)
+            self._tokens -= 1
+        self.in_flight += 1
+        self.stats['requests'] += 1
+
+    def succeeded(self, latency: float):
+        self.stats['succeeded'] += 1
+        self.consecutive_failures = 0
+        self.consecutive_throttles = 0
+        self._latencies.append(latency)
+        self._total_latency += latency
+
+    def rest(self, seconds: float, now: float):
+        self.cooldown_until = max(self.cooldown_until, now + seconds)
+        self.stats['cooldowns'] += 1
+
+    def describe(self, now: float) -> Dict[str, Any]:
+        latencies = list(self._latencies)
+        cooldown = max(0.0, self.cooldown_until - now)
+        remaining = self.remaining(now)
+        return {
+            'name': self.name,
+            'model': self.model_name,
+            **self.stats,
+            'in_flight': self.in_flight,
+            'healthy': cooldown == 0,
+            'cooldown_seconds': round(cooldown, 1),
+            'remaining_this_minute': None if remaining == float('inf') else int(remaining),
+            'latency_ms': {
+                'avg': round(self._total_latency / self.stats['succeeded'] * 1000, 1),
+                'p50': round(_percentile(latencies, 0.50) * 1000, 1),
+                'p95': round(_percentile(latencies, 0.95) * 1000, 1)
+            } if latencies else None
+        }
+
+
+class ModelPool:
+    """Spreads model calls over every configured API key and model.
+
+    A call names a role ('ocr' or 'structure'), which picks the model; of
+    the clients serving that role (one per key), it goes to the healthy one
+    with the most request budget left this minute, fewest calls in flight
+    (then fewest calls so far) breaking ties. A throttled client is rested
+    for a cool-down that doubles while the throttling continues, and the
+    call is retried on another key; a client that keeps failing is rested
+    the same way. When every client is out of budget or resting, callers
+    wait for the first to free up instead of sending requests bound to be
+    rejected. Safe to use from the event loop and from worker threads at
+    once.
+    """
+
+    def __init__(self, routes: Dict[str, List[ModelClient]], cooldown_seconds: float = 30.0):
+        for role in ROLES:
+            if not routes.get(role):
+                raise ValueError(f"No model clients configured for role {role!r}")
+        self.routes = routes
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, model_factory=None) -> 'ModelPool':
+        """Pool over GEMINI_API_KEYS × the OCR and structuring models; model_factory(key, model_name) overrides the SDK"""
+        keys = config.get_api_keys()
+        models = {'ocr': config.get_ocr_model_name(), 'structure': config.get_structuring_model_name()}
+        requests_per_minute = config.get_key_requests_per_minute()
+
+        # Roles using the same model share its clients, and so its per-key budget
+        clients: Dict[Tuple[int, str], ModelClient] = {}
+        routes = {}
+        for role, model_name in models.items():
+            routes[role] = []
+            for index, key in enumerate(keys):
+                if (index, model_name) not in clients:
+                    clients[(index, model_name)] = ModelClient(
+                        f"key{index + 1}/{model_name}", model_name, key, requests_per_minute,
+                        own_clients=index > 0,
+                        model=model_factory(key, model_name) if model_factory else None)
+                routes[role].append(clients[(index, model_name)])
+        return cls(routes, config.get_key_cooldown_seconds())
+
+    def clients(self) -> List[ModelClient]:
+        unique = []
+        for role in ROLES:
+            unique.extend(client for client in self.routes[role] if client not in unique)
+        return unique
+
+    def warm_up(self):
+        """Build every client's model ahead of the first request"""
+        for client in self.clients():
+            client.get_model()
+
+    @staticmethod
+    def _rank(client: ModelClient, now: float) -> Tuple[float, int, int]:
+        # Most budget left, then fewest calls in flight, then fewest calls so far (spreads idle traffic)
+        return client.remaining(now), -client.in_flight, -client.stats['requests']
+
+    def _pick(self, role: str, exclude: List[ModelClient]) -> Tuple[Optional[ModelClient], float]:
+        """(client, 0) holding a request on the best client, or (None, seconds until one frees up)"""
+        if role not in self.routes:
+            raise ValueError(f"Unknown model role: {role}")
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            wait = None
+            for client in self.routes[role]:
+                if client in exclude:
+                    continue
+                ready_in = client.ready_in(now)
+                if ready_in > 0:
+                    wait = ready_in if wait is None else min(wait, ready_in)
+                elif best is None or self._rank(client, now) > self._rank(best, now):
+                    best = client
+            if best is not None:
+                best.take(now)
+                return best, 0.0
+            return None, wait or 0.0
+
+    def _finish(self, client: ModelClient, latency: float, error: Optional[Exception] = None) -> bool:
+        """Record a finished call; True when the error means the call should be tried on another key"""
+        now = time.monotonic()
+        message = None
+        with self._lock:
+            client.in_flight -= 1
+            if error is None:
+                client.succeeded(latency)
+                return False
+
+            if is_throttled(error):
+                client.stats['throttled'] += 1
+                client.consecutive_throttles += 1
+                seconds = self.cooldown_seconds * min(2 ** (client.consecutive_throttles - 1), MAX_COOLDOWN_FACTOR)
+                client.rest(seconds, now)
+                message = f"⏸️  {client.name} was throttled; resting it for {seconds:.0f}s"
+                retry = True
+            else:
+                client.stats['failed'] += 1
+                client.consecutive_failures += 1
+                if client.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    client.consecutive_failures = 0
+                    client.rest(self.cooldown_seconds, now)
+                    message = f"⏸️  {client.name} failed {MAX_CONSECUTIVE_FAILURES} times in a row; " \
+                              f"resting it for {self.cooldown_seconds:.0f}s"
+                retry = _is_transient(error)
+
+        if message:
+            print(message)
+        return retry
+
+    def _acquire(self, role: str, tried: List[ModelClient]) -> ModelClient:
+        while True:
+            client, wait = self._pick(role, tried)
+            if client is not None:
+                return client
+            time.sleep(min(wait, MAX_WAIT_SECONDS))
+
+    async def _acquire_async(self, role: str, tried: List[ModelClient]) -> ModelClient:
+        while True:
+            client, wait = self._pick(role, tried)
+            if client is not None:
+                return client
+            await asyncio.sleep(min(wait, MAX_WAIT_SECONDS))
+
+    def generate_content(self, role: str, contents, stream: bool = False, **kwargs):
+        """model.generate_content on the best client for role; with stream=True, an iterator of chunks"""
+        tried = []
+        while True:
+            client = self._acquire(role, tried)
+            start = time.perf_counter()
+            try:
+                response = client.get_model().generate_content(contents, stream=stream, **kwargs)
+            except Exception as e:
+                tried.append(client)
+                if not self._finish(client, time.perf_counter() - start, e) or len(tried) >= len(self.routes[role]):
+                    raise
+                continue
+
+            if stream:
+                return self._stream(client, response, start)
+            self._finish(client, time.perf_counter() - start)
+            return response
+
+    async def generate_content_async(self, role: str, contents, stream: bool = False, **kwargs):
+        """Async variant of generate_content; with stream=True, an async iterator of chunks"""
+        tried = []
+        while True:
+            client = await self._acquire_async(role, tried)
+            start = time.perf_counter()
+            try:
+                response = await client.get_async_model().generate_content_async(contents, stream=stream, **kwargs)
+            except Exception as e:
+                tried.append(client)
+                if not self._finish(client, time.perf_counter() - start, e) or len(tried) >= len(self.routes[role]):
+                    raise
+                continue
+
+            if stream:
+                return self._stream_async(client, response, start)
+            self._finish(client, time.perf_counter() - start)
+            return response
+
+    def _stream(self, client: ModelClient, response, start: float):
+        # The client's request stays in flight until the last chunk has arrived
+        error = None
+        try:
+            for chunk in response:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(client, time.perf_counter() - start, error)
+
+    async def _stream_async(self, client: ModelClient, response, start: float):
+        error = None
+        try:
+            async for chunk in response:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(client, time.perf_counter() - start, error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-client request counts, health and latency, and which clients serve each role"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'routes': {role: [client.name for client in clients] for role, clients in self.routes.items()},
+                'clients': [client.describe(now) for client in self.clients()]
+            }
+
+
+_pool: Optional[ModelPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    """Process-wide model pool built from the GEMINI_* settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool.from_config()
+        return _pool
@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+from typing import Dict, Optional
+import config
+
+# Date columns rewritten to ISO 8601 (YYYY-MM-DD) per output table
+DATE_COLUMNS = {
+    'patients_registration': ['date_of_birth'],
+    'medical_history': ['diagnosis_date'],
+    'allergy_records': ['date_recorded'],
+    'prescription': ['start_date', 'end_date'],
+    'vitals_history': ['date_recorded'],
+    'bloodtests': ['test_date'],
+    'diagnosis': ['diagnosis_date'],
+    'symptoms_checker': ['date_reported'],
+}
+
+MONTH_NAMES = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+# Column listing, per row, the date columns left as written because day and month could not be told apart
+AMBIGUOUS_DATES_COLUMN = 'ambiguous_dates'
+
+LBS_TO_KG = 0.45359237
+INCH_TO_CM = 2.54
+
+
+class TableNormalizer:
+    """Vectorized normalization of per-table DataFrames into ISO dates and canonical units.
+
+    Raw model strings are kept; dates are rewritten in place when they parse
+    and canonical numeric columns (weight_kg, height_cm, temperature_c, ...)
+    are added next to the raw values. Every step works on whole columns with
+    pandas string/regex operations rather than looping over rows.
+
+    Numeric dates such as 03/04/2024 are read in date_order ('MDY' or
+    'DMY', default OCR_DATE_ORDER). Without one, only dates that can be read
+    one way are rewritten; ambiguous ones are left as written and named in
+    the row's ambiguous_dates column, so a later bulk pass with the order
+    set can convert them.
+    """
+
+    def __init__(self, cleansing_patterns: Dict[str, re.Pattern], date_order: Optional[str] = None):
+        self.patterns = cleansing_patterns
+        self.date_order = config.get_date_order() if date_order is None else date_order
+        if self.date_order not in ('MDY', 'DMY', ''):
+            raise ValueError(f"Unknown date order: {self.date_order}")
+
+    def normalize(self, table_name: str, df):
+        """Return a normalized copy of one table's DataFrame"""
+        if df.empty:
+            return df
+
+        df = df.copy()
+        date_columns = [column for column in DATE_COLUMNS.get(table_name, []) if column in df.columns]
+        if date_columns:
+            flags = []
+            for column in date_columns:
+                df[column] = self.normalize_dates(df[column])
+                ambiguous = self._by_unique(df[column], self._ambiguous_dates).astype(bool)
+                flags.append(ambiguous.map({True: column, False: ''}))
+            df[AMBIGUOUS_DATES_COLUMN] = (flags[0].str.cat(flags[1:], sep=',') if len(flags) > 1 else flags[0]) \
+                .str.replace(r',+', ',', regex=True).str.strip(',')
+            ambiguous_count = int((df[AMBIGUOUS_DATES_COLUMN] != '').sum())
+            if ambiguous_count:
+                print(f"⚠️  {ambiguous_count} {table_name} rows have dates with unclear day/month order, left as "
+                      f"written (set OCR_DATE_ORDER to MDY or DMY)")
+
+        if table_name == 'patients_registration' and 'phone' in df.columns:
+            df['phone'] = self._by_unique(df['phone'], self._normalize_phones)
+        elif table_name == 'vitals_history':
+            self._normalize_vitals(df)
+        elif table_name == 'bloodtests' and 'result_value' in df.columns:
+            df['result_numeric'] = self._by_unique(df['result_value'], self._first_number)
+
+        return df
+
+    def normalize_tables(self, tables: Dict[str, object]) -> Dict[str, object]:
+        """Normalize a dict of table name -> DataFrame"""
+        return {table_name: self.normalize(table_name, df) for table_name, df in tables.items()}
+
+    def normalize_csv_folder(self, csv_folder: str) -> Dict[str, int]:
+        """Re-normalize every table CSV in a folder in place; returns rows per table"""
+        import pandas as pd
+
+        row_counts = {}
+        for filename in sorted(os.listdir(csv_folder)):
+            table_name, extension = os.path.splitext(filename)
+            if extension != '.csv':
+                continue
+
+            csv_path = os.path.join(csv_folder, filename)
+            df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+            normalized = self.normalize(table_name, df)
+
+            temp_path = f"{csv_path}.tmp"
+            normalized.to_csv(temp_path, index=False)
+            os.replace(temp_path, csv_path)
+            row_counts[table_name] = len(normalized)
+            print(f"✅ Normalized {len(normalized)} records in {csv_path}")
+
+        return row_counts
+
+    def _by_unique(self, series, transform):
+        """Apply a column transform to the distinct values only and broadcast the result back.
+
+        Dates, units and readings repeat heavily across a table's history, so
+        this usually shrinks the work by orders of magnitude.
+        """
+        import pandas as pd
+
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        transformed = transform(pd.Series(uniques, dtype=object))
+        return pd.Series(transformed.to_numpy()[codes], index=series.index)
+
+    def _text(self, series):
+        """Series as stripped strings with missing values as empty strings"""
+        return series.fillna('').astype(str).str.strip()
+
+    def _number(self, series):
+        import pandas as pd
+
+        return pd.to_numeric(series, errors='coerce').astype(float)
+
+    def _first_number(self, series):
+        return self._number(self._text(series).str.extract(r'(-?\d+(?:\.\d+)?)', expand=False))
+
+    def normalize_dates(self, series):
+        """Rewrite recognizable dates as YYYY-MM-DD; unparseable values are left unchanged"""
+        return self._by_unique(series, self._normalize_dates)
+
+    def _normalize_dates(self, series):
+        import pandas as pd
+
+        text = self._text(series)
+        result = pd.Series(None, index=text.index, dtype=object)
+
+        # Year-first numeric dates: 2024-03-04, 2024/3/4, optionally followed by a time
+        parts = text.str.extract(r'^(?P<y>\d{4})[/.-](?P<m>\d{1,2})[/.-](?P<d>\d{1,2})(?:\D|$)')
+        result = result.fillna(self._assemble(parts['y'], parts['m'], parts['d']))
+
+        # Day/month numeric dates: 03/04/2024, 3-4-24; a part over 12 can only be the day, otherwise the
+        # configured order decides, and without one the date is left as written
+        parts = self._day_month_parts(text)
+        first, second = self._number(parts['a']), self._number(parts['b'])
+        if self.date_order == 'DMY':
+            day_first = ~(second > 12)
+        else:
+            day_first = first > 12
+        month = parts['a'].where(~day_first, parts['b'])
+        day = parts['b'].where(~day_first, parts['a'])
+        dates = self._assemble(self._expand_year(parts['y']), month, day)
+        if not self.date_order:
+            dates = dates.where(~self._unclear_order(first, second))
+        result = result.fillna(dates)
+
+        # Month-name dates: March 4, 2024 / 4 Mar 2024
+        lowered = text.str.lower()
+        parts = lowered.str.extract(r'^(?P<mon>[a-z]{3})[a-z]*\.?\s+(?P<d>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<y>\d{4})')
+        result = result.fillna(self._assemble(parts['y'], parts['mon'].map(MONTH_NAMES), parts['d']))
+        parts = lowered.str.extract(r'^(?P<d>\d{1,2})(?:st|nd|rd|th)?\s+(?P<mon>[a-z]{3})[a-z]*\.?,?\s+(?P<y>\d{4})')
+        result = result.fillna(self._assemble(parts['y'], parts['mon'].map(MONTH_NAMES), parts['d']))
+
+        return result.fillna(series)
+
+    def _day_month_parts(self, text):
+        return text.str.extract(r'^(?P<a>\d{1,2})[/.-](?P<b>\d{1,2})[/.-](?P<y>\d{2,4})(?:\D|$)')
+
+    def _unclear_order(self, first, second):
+        """Day and month could be either way round: both parts are 1-12 and differ"""
+        return ((first <= 12) & (second <= 12) & (first != second)).fillna(False).astype(bool)
+
+    def _ambiguous_dates(self, series):
+        """Values still in day/month form whose order is unclear (always none with a configured order)"""
+        import pandas as pd
+
+        if self.date_order:
+            return pd.Series(False, index=series.index)
+        parts = self._day_month_parts(self._text(series))
+        return self._unclear_order(self._number(parts['a']), self._number(parts['b']))
+
+    def _expand_year(self, years):
+        """Expand two-digit years: 00-30 -> 2000s, otherwise 1900s"""
+        numeric = self._number(years)
+        expanded = numeric.where(numeric >= 100, numeric + 2000)
+        expanded = expanded.where(~((numeric < 100) & (numeric > 30)), numeric + 1900)
+        return expanded
+
+    def _assemble(self, years, months, days):
+        """Build ISO date strings from year/month/day columns; invalid dates become NaN"""
+        import pandas as pd
+
+        frame = pd.DataFrame({'year': self._number(years), 'month': self._number(months), 'day': self._number(days)})
+        dates = pd.to_datetime(frame, errors='coerce')
+        return dates.dt.strftime('%Y-%m-%d').astype(object).where(dates.notna())
+
+    def _normalize_phones(self, series):
+        """Rewrite 10-digit phone numbers as ###-###-####"""
+        text = self._text(series).str.replace(r'[()]', '', regex=True)
+        digits = text.str.extract(self.patterns['phone'].pattern, expand=False).str.replace(r'\D', '', regex=True)
+        formatted = digits.str[:3] + '-' + digits.str[3:6] + '-' + digits.str[6:]
+        return formatted.fillna(series)
+
+    def _weight_kg(self, series):
+        text = self._text(series)
+        parts = text.str.extract(self.patterns['weight'].pattern, flags=re.IGNORECASE)
+        is_pounds = parts[1].str.lower().str.startswith(('lb', 'pound')).fillna(False).astype(bool)
+        # Unitless weights are taken as kilograms
+        value = self._number(parts[0]).fillna(self._first_number(text))
+        return value.where(~is_pounds, value * LBS_TO_KG).round(1)
+
+    def _height_cm(self, series):
+        text = self._text(series)
+        parts = text.str.extract(self.patterns['height'].pattern)
+        imperial = (self._number(parts[0]) * 12 + self._number(parts[1]).fillna(0)) * INCH_TO_CM
+        # Unitless heights in a plausible centimetre range are taken as centimetres
+        bare = self._first_number(text)
+        bare = bare.where((bare >= 40) & (bare <= 250))
+        return self._number(parts[2]).fillna(imperial).fillna(bare).round(1)
+
+    def _temperature_c(self, series):
+        text = self._text(series)
+        parts = text.str.extract(r'(\d{2,3}(?:\.\d+)?)\s*°?\s*([CF])?', flags=re.IGNORECASE)
+        value = self._number(parts[0])
+        unit = parts[1].str.upper()
+        # Unitless readings above 50 can only be Fahrenheit
+        is_fahrenheit = ((unit == 'F') | (unit.isna() & (value > 50))).fillna(False).astype(bool)
+        return value.where(~is_fahrenheit, (value - 32) * 5 / 9).round(1)
+
+    def _normalize_vitals(self, df):
+        """Add canonical numeric vitals columns"""
+        for raw, canonical, transform in (('blood_pressure_systolic', 'bp_systolic_mmhg', self._first_number),
+                                          ('blood_pressure_diastolic', 'bp_diastolic_mmhg', self._first_number),
+                                          ('heart_rate', 'heart_rate_bpm', self._first_number),
+                                          ('weight', 'weight_kg', self._weight_kg),
+                                          ('height', 'height_cm', self._height_cm),
+                                          ('temperature', 'temperature_c', self._temperature_c)):
+            if raw in df.columns:
+                df[canonical] = self._by_unique(df[raw], transform).astype(float)
+
+
+def main():
+    """Re-normalize an existing csv_database_ready folder in bulk"""
+    if len(sys.argv) != 2:
+        print("Usage: python normalization.py <csv_database_ready folder>")
+        sys.exit(1)
+
+    from OCR import MedicalDataProcessor
+
+    # Through the processor, so workers appending rows are locked out and the record index is rebuilt
+    MedicalDataProcessor().normalize_csv_history(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
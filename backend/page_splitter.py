@@ -0,0 +1,178 @@
+import io
+import re
+import math
+from difflib import SequenceMatcher
+from typing import Dict, List, Any, Optional, Tuple
+
+from duplicate_index import hash_image
+
+# Defaults for splitting; MedicalOCRInterface reads overrides from config
+DEFAULT_TILE_MAX_SIDE = 4096
+DEFAULT_TILE_OVERLAP = 256
+DEFAULT_MAX_DECODED_BYTES = 512 * 1024 * 1024
+
+# Lines compared at each strip boundary when removing text read twice in an overlap, and how
+# many partially cut lines may sit between the shared run and the strip edge
+STITCH_WINDOW_LINES = 20
+STITCH_MAX_CUT_LINES = 3
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def strip_boxes(width: int, height: int, max_side: int,
+                overlap: int) -> List[Tuple[int, Tuple[int, int, int, int]]]:
+    """(row, box) full-width strips covering an image top to bottom, overlapping by `overlap` pixels.
+
+    Strips always span the whole width so each one keeps the page's reading
+    order. On frames wider than max_side, strip height and overlap grow with
+    the width so that every strip fits max_side once scaled down to it.
+    """
+    ratio = max(1.0, width / max_side)
+    strip_height = int(max_side * ratio)
+    overlap = int(min(overlap, max_side // 4) * ratio)
+    if height <= strip_height:
+        return [(0, (0, 0, width, height))]
+
+    count = math.ceil((height - overlap) / (strip_height - overlap))
+    step = math.ceil((height - overlap) / count)
+    return [(row, (0, top, width, min(top + step + overlap, height)))
+            for row, top in enumerate(range(0, step * count, step))]
+
+
+def plan_segments(image_path: str, max_side: int = DEFAULT_TILE_MAX_SIDE,
+                  overlap: int = DEFAULT_TILE_OVERLAP) -> Optional[List[Dict[str, Any]]]:
+    """Frames and strips a scan has to be split into, or None when it can be sent as it is.
+
+    Only reads image headers (and TIFF frame directories); nothing is decoded.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(image_path) as img:
+            frames = getattr(img, 'n_frames', 1)
+            sizes = []
+            for frame in range(frames):
+                img.seek(frame)
+                sizes.append(img.size)
+    except Exception:
+        # Not an image PIL can read (e.g. PDF); the model gets the file as is
+        return None
+
+    if frames == 1 and max(sizes[0]) <= max_side:
+        return None
+
+    return [{'frame': frame, 'row': row, 'box': box}
+            for frame, (width, height) in enumerate(sizes)
+            for row, box in strip_boxes(width, height, max_side, overlap)]
+
+
+def _encode(strip) -> Tuple[bytes, str]:
+    """Encode a strip losslessly for bilevel faxes and as high-quality JPEG otherwise"""
+    buffer = io.BytesIO()
+    if strip.mode in ('1', 'P'):
+        strip.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'image/png'
+    if strip.mode not in ('L', 'RGB'):
+        strip = strip.convert('RGB')
+    strip.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue(), 'image/jpeg'
+
+
+def render_segments(image_path: str, segments: List[Dict[str, Any]],
+                    max_decoded_bytes: int = DEFAULT_MAX_DECODED_BYTES, with_hash: bool = False,
+                    max_side: int = DEFAULT_TILE_MAX_SIDE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Decode each frame once, cut its strips and encode them for the model.
+
+    Frames are decoded one at a time and released before the next, so peak
+    memory is one decoded frame plus its encoded strips. Strips wider than
+    max_side are scaled down to it. A frame larger than max_decoded_bytes is
+    decoded at reduced scale when the format allows it (JPEG); otherwise it
+    is not decoded and comes back as a single segment with a 'skipped'
+    reason instead of 'data', so the rest of the file is still read. With
+    with_hash, the first frame's page hash is computed from the same decode.
+    Returns the segments with 'data' and 'mime_type' added, and the page
+    hash (or None).
+    """
+    from PIL import Image
+
+    rendered = []
+    page_hash = None
+    with Image.open(image_path) as img:
+        for frame in sorted({segment['frame'] for segment in segments}):
+            img.seek(frame)
+            width, height = img.size
+            frame_bytes = width * height * len(img.getbands())
+            scale = 1.0
+            if frame_bytes > max_decoded_bytes:
+                # JPEG can decode at 1/2, 1/4 or 1/8 scale; take the largest that fits
+                reduction = next((r for r in (2, 4, 8) if frame_bytes / (r * r) <= max_decoded_bytes), None)
+                if img.format == 'JPEG' and reduction:
+                    img.draft(img.mode, (width // reduction, height // reduction))
+                    scale = img.size[0] / width
+                if width * height * scale * scale * len(img.getbands()) > max_decoded_bytes:
+                    reason = (f"Page {frame + 1} not read: {width}x{height} needs {frame_bytes // 2 ** 20} MB "
+                              f"decoded, over the {max_decoded_bytes // 2 ** 20} MB limit")
+                    print(f"⚠️ {reason}")
+                    rendered.append({'frame': frame, 'row': 0, 'box': None, 'skipped': reason})
+                    continue
+
+            # Decode the frame once; seeking to the next frame replaces it
+            img.load()
+            if with_hash and page_hash is None:
+                page_hash = hash_image(img)
+
+            for segment in (segment for segment in segments if segment['frame'] == frame):
+                box = tuple(int(round(edge * scale)) for edge in segment['box'])
+                strip = img.crop(box)
+                if strip.width > max_side:
+                    strip = strip.resize((max_side, max(1, round(strip.height * max_side / strip.width))))
+                data, mime_type = _encode(strip)
+                rendered.append({**segment, 'data': data, 'mime_type': mime_type})
+
+    return rendered, page_hash
+
+
+def _normalized(line: str) -> str:
+    return _WHITESPACE.sub(' ', line).strip().lower()
+
+
+def merge_overlapping(previous: str, following: str, window: int = STITCH_WINDOW_LINES) -> str:
+    """Join two texts read from overlapping strips, dropping the lines read in both.
+
+    Finds the longest run of identical lines between the end of `previous`
+    and the start of `following`. Text before the run in `following` and
+    after it in `previous` is the partially cut border of a strip and is
+    dropped too.
+    """
+    previous_lines = previous.rstrip('\n').split('\n') if previous else []
+    following_lines = following.split('\n') if following else []
+    if not previous_lines or not following_lines:
+        return '\n'.join(previous_lines + following_lines)
+
+    tail_start = max(0, len(previous_lines) - window)
+    tail = [_normalized(line) for line in previous_lines[tail_start:]]
+    head = [_normalized(line) for line in following_lines[:window]]
+    match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+
+    # The shared run must hold real text and sit at the strip edges; anything else is a coincidence
+    cut_previous = len(tail) - (match.a + match.size)
+    if (match.size == 0 or not any(tail[match.a:match.a + match.size])
+            or cut_previous > STITCH_MAX_CUT_LINES or match.b > STITCH_MAX_CUT_LINES):
+        return '\n'.join(previous_lines + following_lines)
+
+    kept_previous = previous_lines[:tail_start + match.a + match.size]
+    return '\n'.join(kept_previous + following_lines[match.b + match.size:])
+
+
+def stitch_text(segments: List[Dict[str, Any]]) -> str:
+    """Combine per-strip 'text' into one document: strips top to bottom, frames as pages"""
+    pages = []
+    for frame in sorted({segment['frame'] for segment in segments}):
+        page = ''
+        for segment in sorted((s for s in segments if s['frame'] == frame), key=lambda s: s['row']):
+            page = merge_overlapping(page, segment.get('text') or '')
+        pages.append(page.strip())
+
+    if len(pages) == 1:
+        return pages[0]
+    return '\n\n'.join(f"--- Page {number} ---\n{page}" for number, page in enumerate(pages, 1))
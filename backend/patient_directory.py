@@ -0,0 +1,400 @@
+import os
+import re
+import csv
+import sqlite3
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+
+# Column names accepted for each field in a registry export
+FIELD_ALIASES = {
+    'patient_id': ('patient_id', 'id', 'patientid'),
+    'first_name': ('first_name', 'firstname', 'given_name'),
+    'last_name': ('last_name', 'lastname', 'surname', 'family_name'),
+    'name': ('name', 'full_name', 'patient_name'),
+    'date_of_birth': ('date_of_birth', 'dob', 'birth_date'),
+    'mrn': ('mrn', 'medical_record_number'),
+}
+
+# Maximum edit distance tolerated by fuzzy name search
+DEFAULT_MAX_EDITS = 2
+
+# Query tokens whose similar vocabulary tokens are remembered (common names are searched again and again)
+SIMILAR_TOKEN_CACHE_SIZE = 10000
+
+
+_TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+
+def name_tokens(name: str) -> List[str]:
+    """Lowercase, accent-free alphabetic tokens of a name, sorted so 'Smith, John' == 'John Smith'"""
+    if not name:
+        return []
+    text = name.lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return sorted(_TOKEN_PATTERN.findall(text))
+
+
+def normalize_name(name: str) -> str:
+    """Normalized form of a name used for exact matching"""
+    return ' '.join(name_tokens(name))
+
+
+def _trigrams(token: str) -> List[str]:
+    padded = f"  {token} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+# Most trigrams of a token one edit can remove (a transposition touches four)
+TRIGRAMS_PER_EDIT = 4
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent transpositions as one edit (optimal string alignment).
+
+    Returns limit + 1 as soon as the distance must exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def _edit_distances(token: str, candidates, limit: int):
+    """edit_distance from token to every row of a (count, length) array of character codes, all at once"""
+    import numpy as np
+
+    count, length = candidates.shape
+    query = np.frombuffer(token.encode('ascii'), dtype=np.uint8)
+    before_previous = None
+    previous = np.tile(np.arange(length + 1, dtype=np.int16), (count, 1))
+    for i in range(1, len(query) + 1):
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        for j in range(1, length + 1):
+            cost = previous[:, j - 1] + (candidates[:, j - 1] != query[i - 1])
+            np.minimum(cost, previous[:, j] + 1, out=cost)
+            np.minimum(cost, current[:, j - 1] + 1, out=cost)
+            if i > 1 and j > 1:
+                swapped = (candidates[:, j - 2] == query[i - 1]) & (candidates[:, j - 1] == query[i - 2])
+                cost = np.where(swapped, np.minimum(cost, before_previous[:, j - 2] + 1), cost)
+            current[:, j] = cost
+        before_previous, previous = previous, current
+    return np.minimum(previous[:, length], limit + 1)
+
+
+_MRN_SEPARATORS = re.compile(r'[\s\-_./#:]+')
+
+
+def normalize_mrn(value: Any) -> str:
+    """Uppercase MRN with whitespace and separators removed: 'mrn-001 23' -> 'MRN00123'"""
+    return _MRN_SEPARATORS.sub('', str(value or '')).upper()
+
+
+class PatientDirectory:
+    """In-memory patient registry index with exact ID, normalized-name and fuzzy name lookup.
+
+    Records are stored column-wise. Each patient is posted under the
+    tokens of their name, and the (much smaller) token vocabulary is
+    indexed by character trigrams, bigrams and characters. A fuzzy query
+    finds similar tokens through those indexes, intersects the patient
+    postings of those tokens, and only verifies full-name edit distance on
+    that small set. One edit removes at most four of a token's trigrams (a
+    transposition), so a token within max_edits of a query token with G
+    distinct trigrams shares at least G - 4 * max_edits of them, and only
+    tokens passing that count are verified. Short names have too few
+    trigrams for that bound; they are compared with every vocabulary token
+    of a near length instead, in one vectorized pass per length.
+    Across a name's tokens the edits add up, so a match also needs some
+    token within max_edits / (number of tokens) of its query token.
+    """
+
+    def __init__(self):
+        self.patient_ids: List[str] = []
+        self.names: List[str] = []
+        self.dobs: List[str] = []
+        self.mrns: List[str] = []
+        self._normalized: List[str] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_mrn: Dict[str, int] = {}
+        # token -> patient indexes, and trigram -> token ids over the token vocabulary
+        self._token_ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self._token_postings: List[array] = []
+        self._grams: Dict[str, List[int]] = {}
+        # token length -> token ids, and (token ids, character codes) arrays built from them on demand
+        self._tokens_by_length: Dict[int, List[int]] = {}
+        self._length_arrays: Dict[int, Tuple[Any, Any]] = {}
+        self._similar_cache: Dict[Tuple[str, int], Dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.patient_ids)
+
+    def add(self, patient_id: str, name: str, date_of_birth: str = '', mrn: str = ''):
+        """Add one registry entry"""
+        patient_id = str(patient_id).strip()
+        if not patient_id or patient_id in self._by_id:
+            return
+
+        index = len(self.patient_ids)
+        tokens = name_tokens(name)
+        normalized = ' '.join(tokens)
+        self.patient_ids.append(patient_id)
+        self.names.append(name)
+        self.dobs.append(date_of_birth or '')
+        self.mrns.append(mrn or '')
+        self._normalized.append(normalized)
+        self._by_id[patient_id] = index
+        self._by_name.setdefault(normalized, []).append(index)
+        if mrn:
+            self._by_mrn[str(mrn).strip()] = index
+        for token in set(tokens):
+            token_id = self._token_ids.get(token)
+            if token_id is None:
+                token_id = self._add_token(token)
+            self._token_postings[token_id].append(index)
+
+    def _add_token(self, token: str) -> int:
+        token_id = len(self._tokens)
+        self._token_ids[token] = token_id
+        self._tokens.append(token)
+        self._token_postings.append(array('i'))
+        for gram in _trigrams(token):
+            self._grams.setdefault(gram, []).append(token_id)
+        self._tokens_by_length.setdefault(len(token), []).append(token_id)
+        self._length_arrays.pop(len(token), None)
+        self._similar_cache.clear()
+        return token_id
+
+    @classmethod
+    def load(cls, path: str) -> 'PatientDirectory':
+        """Load a registry export from a CSV file or a SQLite database (table 'patients')"""
+        directory = cls()
+        if path.lower().endswith('.csv'):
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f)
+                directory._add_rows(reader, next(reader, []))
+        else:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                cursor = conn.execute("SELECT * FROM patients")
+                directory._add_rows(cursor, [description[0] for description in cursor.description])
+            finally:
+                conn.close()
+
+        print(f"📇 Loaded {len(directory)} patients from {path}")
+        return directory
+
+    def _add_rows(self, rows, fieldnames: List[str]):
+        """Add rows given as sequences in fieldnames order"""
+        lookup = {name.strip().lower(): position for position, name in enumerate(fieldnames)}
+        columns = {field: next((lookup[alias] for alias in aliases if alias in lookup), None)
+                   for field, aliases in FIELD_ALIASES.items()}
+        if columns['patient_id'] is None:
+            raise ValueError("Patient directory export has no patient_id column")
+
+        def getter(key):
+            position = columns[key]
+            if position is None:
+                return lambda row: ''
+            return lambda row: str(row[position]).strip() if row[position] is not None else ''
+
+        get_id, get_name, get_first, get_last, get_dob, get_mrn = (
+            getter(key) for key in ('patient_id', 'name', 'first_name', 'last_name', 'date_of_birth', 'mrn'))
+        for row in rows:
+            name = get_name(row) or f"{get_first(row)} {get_last(row)}".strip()
+            self.add(get_id(row), name, get_dob(row), get_mrn(row))
+
+    def _record(self, index: int) -> Dict[str, str]:
+        return {
+            'patient_id': self.patient_ids[index],
+            'name': self.names[index],
+            'date_of_birth': self.dobs[index],
+            'mrn': self.mrns[index]
+        }
+
+    def get(self, patient_id: str) -> Optional[Dict[str, str]]:
+        """Exact lookup by patient ID"""
+        index = self._by_id.get(str(patient_id).strip())
+        return self._record(index) if index is not None else None
+
+    def get_by_mrn(self, mrn: str) -> Optional[Dict[str, str]]:
+        """Exact lookup by medical record number"""
+        index = self._by_mrn.get(str(mrn).strip())
+        return self._record(index) if index is not None else None
+
+    def find_by_name(self, name: str) -> List[Dict[str, str]]:
+        """Exact lookup by normalized name"""
+        return [self._record(index) for index in self._by_name.get(normalize_name(name), [])]
+
+    def _similar_tokens(self, token: str, max_edits: int) -> Dict[int, int]:
+        """Token ids within max_edits of a query token, with their edit distances"""
+        key = (token, max_edits)
+        similar = self._similar_cache.get(key)
+        if similar is None:
+            similar = self._find_similar_tokens(token, max_edits)
+            if len(self._similar_cache) >= SIMILAR_TOKEN_CACHE_SIZE:
+                self._similar_cache.clear()
+            self._similar_cache[key] = similar
+        return similar
+
+    def _find_similar_tokens(self, token: str, max_edits: int) -> Dict[int, int]:
+        grams = _trigrams(token)
+        needed = len(grams) - TRIGRAMS_PER_EDIT * max_edits
+        if needed <= 0:
+            return self._scan_similar_tokens(token, max_edits)
+
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._grams.get(gram, ()))
+        similar = {}
+        for candidate, shared in counts.items():
+            if shared >= needed:
+                distance = edit_distance(token, self._tokens[candidate], max_edits)
+                if distance <= max_edits:
+                    similar[candidate] = distance
+        return similar
+
+    def _scan_similar_tokens(self, token: str, max_edits: int) -> Dict[int, int]:
+        """Compare a short token with every vocabulary token whose length is within max_edits"""
+        import numpy as np
+
+        similar = {}
+        for length in range(max(1, len(token) - max_edits), len(token) + max_edits + 1):
+            arrays = self._length_array(length)
+            if arrays is None:
+                continue
+            token_ids, characters = arrays
+            distances = _edit_distances(token, characters, max_edits)
+            within = np.flatnonzero(distances <= max_edits)
+            similar.update(zip(token_ids[within].tolist(), distances[within].tolist()))
+        return similar
+
+    def _length_array(self, length: int):
+        arrays = self._length_arrays.get(length)
+        if arrays is None and self._tokens_by_length.get(length):
+            import numpy as np
+
+            token_ids = np.array(self._tokens_by_length[length], dtype=np.int64)
+            text = ''.join(self._tokens[token_id] for token_id in token_ids).encode('ascii')
+            characters = np.frombuffer(text, dtype=np.uint8).reshape(len(token_ids), length)
+            arrays = self._length_arrays[length] = (token_ids, characters)
+        return arrays
+
+    def search(self, name: str, limit: int = 5, max_edits: int = DEFAULT_MAX_EDITS) -> List[Dict[str, Any]]:
+        """Typo-tolerant name search; results carry an edit distance and a 0-1 score"""
+        tokens = name_tokens(name)
+        if not tokens:
+            return []
+        query = ' '.join(tokens)
+
+        # Patients must have a similar token for every query token, and a close one for at least one
+        close_edits = max_edits // len(tokens)
+        token_matches = []
+        close_matches = set()
+        for token in set(tokens):
+            patients = set()
+            for token_id, distance in self._similar_tokens(token, max_edits).items():
+                patients.update(self._token_postings[token_id])
+                if distance <= close_edits:
+                    close_matches.update(self._token_postings[token_id])
+            if not patients:
+                return []
+            token_matches.append(patients)
+
+        token_matches.sort(key=len)
+        candidates = close_matches.intersection(*token_matches)
+
+        scored = []
+        for index in candidates:
+            distance = edit_distance(query, self._normalized[index], max_edits)
+            if distance <= max_edits:
+                scored.append((distance, self._normalized[index], index))
+
+        scored.sort()
+        results = []
+        for distance, normalized, index in scored[:limit]:
+            record = self._record(index)
+            record['distance'] = distance
+            record['score'] = round(1 - distance / max(len(query), len(normalized)), 3)
+            results.append(record)
+        return results
+
+    def resolve_name(self, name: str, fuzzy: bool = False, max_edits: int = DEFAULT_MAX_EDITS) -> Optional[str]:
+        """Resolve a name to a single patient ID, or None if it is unknown or ambiguous.
+
+        Only an exact (normalized) name resolves unless fuzzy is set: a
+        typo-tolerant match may be a different patient, so callers should
+        offer search() results for confirmation instead.
+        """
+        exact = self.find_by_name(name)
+        if exact:
+            return exact[0]['patient_id'] if len(exact) == 1 else None
+        if not fuzzy:
+            return None
+
+        matches = self.search(name, limit=2, max_edits=max_edits)
+        if not matches:
+            return None
+        if len(matches) > 1 and matches[1]['distance'] == matches[0]['distance']:
+            return None
+        return matches[0]['patient_id']
+
+    def cross_check(self, patient_id: str, patient_info: Dict[str, Any]) -> List[str]:
+        """Compare extracted PATIENT_INFO (name, dob, mrn) with the registry entry for patient_id"""
+        record = self.get(patient_id)
+        if record is None:
+            return [f"Patient ID {patient_id} is not in the registry"]
+        if not patient_info:
+            return []
+
+        mismatches = []
+        name = patient_info.get('name') or ''
+        if name and record['name']:
+            expected = normalize_name(record['name'])
+            if edit_distance(normalize_name(name), expected, DEFAULT_MAX_EDITS) > DEFAULT_MAX_EDITS:
+                mismatches.append(f"Name '{name}' does not match registry name '{record['name']}'")
+
+        dob = patient_info.get('dob') or ''
+        if dob and record['date_of_birth'] and not self._same_date(dob, record['date_of_birth']):
+            mismatches.append(f"DOB '{dob}' does not match registry DOB '{record['date_of_birth']}'")
+
+        mrn = patient_info.get('mrn') or ''
+        if mrn and record['mrn'] and normalize_mrn(mrn) != normalize_mrn(record['mrn']):
+            mismatches.append(f"MRN '{mrn}' does not match registry MRN '{record['mrn']}'")
+
+        return mismatches
+
+    def _same_date(self, extracted: str, registered: str) -> bool:
+        """Whether two dates can be the same day; without OCR_DATE_ORDER either reading of 03/04/1980 counts"""
+        import pandas as pd
+        from normalization import TableNormalizer
+
+        date_order = TableNormalizer({}).date_order
+        readings = [TableNormalizer({}, order).normalize_dates(pd.Series([extracted, registered], dtype=object))
+                    for order in ((date_order,) if date_order else ('MDY', 'DMY'))]
+        return any(first[0] == second[1] for first in readings for second in readings)
+
+
+def load_patient_directory(path: Optional[str]) -> Optional[PatientDirectory]:
+    """Load the registry export at path, or return None if no directory is configured"""
+    if not path:
+        return None
+    if not os.path.exists(path):
+        print(f"Patient directory not found: {path}")
+        return None
+    return PatientDirectory.load(path)
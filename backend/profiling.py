@@ -0,0 +1,205 @@
+import os
+import io
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+# Entries listed in the results summary; the text reports next to the outputs list more
+SUMMARY_TOP = 10
+REPORT_TOP = 40
+# Stack depth kept per allocation; deeper is slower while profiling
+TRACEMALLOC_FRAMES = 4
+
+# Functions from this folder are the pipeline stages the summary ranks
+_PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# From Python 3.12 cProfile runs on sys.monitoring: a single profiler per process, which
+# already sees every thread, so worker threads get no profiler of their own
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# cProfile and tracemalloc are per process, so only one job is profiled at a time
+_profiling_lock = threading.Lock()
+_current: ContextVar[Optional['JobProfiler']] = ContextVar('job_profiler', default=None)
+
+
+def profiled(fn):
+    """fn itself, or fn wrapped to be CPU-profiled in whichever thread runs it when the current job is profiled"""
+    profiler = _current.get()
+    return fn if profiler is None else profiler.wrap(fn)
+
+
+class JobProfiler:
+    """CPU (cProfile) and allocation (tracemalloc) profile of one processing job.
+
+    Use as a context manager around the job. The calling thread is profiled
+    for the whole block, and work the job hands to other threads is
+    profiled when it goes through profiled() (on Python 3.12+ the one
+    profiler already covers every thread). On exit, a .prof file (for
+    pstats or snakeviz), a CPU report and a top-allocations report are
+    written to <output_folder>/profiles, and `summary` holds the headline
+    numbers for the results dict. In the async pipeline the event loop is
+    shared, so coroutine work of requests running at the same time is
+    included in the CPU profile. Allocation tracking is process-wide.
+    """
+
+    def __init__(self, output_folder: str, label: str = 'job'):
+        self.output_folder = os.path.join(output_folder, 'profiles')
+        self.label = re.sub(r'[^\w.-]', '_', label)
+        self.summary: Dict[str, Any] = {'enabled': False}
+        self._profile = cProfile.Profile()
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._threads_lock = threading.Lock()
+        self._token = None
+        self._owns_lock = False
+        self._started_tracing = False
+
+    def __enter__(self) -> 'JobProfiler':
+        if not _profiling_lock.acquire(blocking=False):
+            self.summary = {'enabled': False, 'reason': 'Another job is being profiled'}
+            print("⚠️  Profiling skipped: another job is being profiled")
+            return self
+        self._owns_lock = True
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        try:
+            self._profile.enable()
+        except Exception as e:
+            # e.g. another profiler is already active in this process
+            if self._started_tracing:
+                tracemalloc.stop()
+            self._owns_lock = False
+            _profiling_lock.release()
+            self.summary = {'enabled': False, 'reason': f"Profiler could not start: {e}"}
+            print(f"⚠️  Profiling skipped: {e}")
+            return self
+
+        tracemalloc.reset_peak()
+        self._token = _current.set(self)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def wrap(self, fn):
+        """fn profiled into this job in the thread that runs it"""
+        if not PER_THREAD_PROFILES:
+            return fn
+
+        def run(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except Exception as e:
+                # A profiler that cannot start leaves the stage unprofiled, not failed
+                print(f"⚠️  Stage not profiled: {e}")
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._threads_lock:
+                    self._thread_profiles.append(profile)
+        return run
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._owns_lock:
+            return False
+
+        try:
+            self._profile.disable()
+            wall_seconds = time.perf_counter() - self._wall_start
+            cpu_seconds = time.process_time() - self._cpu_start
+            _current.reset(self._token)
+
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            ])
+            if self._started_tracing:
+                tracemalloc.stop()
+
+            self.summary = self._write_reports(wall_seconds, cpu_seconds, current_bytes, peak_bytes, snapshot)
+        except Exception as e:
+            print(f"❌ Error writing profile: {e}")
+            self.summary = {'enabled': True, 'error': str(e)}
+        finally:
+            _profiling_lock.release()
+        return False
+
+    def _write_reports(self, wall_seconds: float, cpu_seconds: float, current_bytes: int, peak_bytes: int,
+                       snapshot) -> Dict[str, Any]:
+        os.makedirs(self.output_folder, exist_ok=True)
+        base_path = os.path.join(self.output_folder, f"{self.label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+        stats = pstats.Stats(self._profile)
+        with self._threads_lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+            threads_profiled = len(self._thread_profiles)
+        stats.dump_stats(f"{base_path}.prof")
+
+        report = io.StringIO()
+        stats.stream = report
+        report.write(f"Wall {wall_seconds:.3f}s, process CPU {cpu_seconds:.3f}s, "
+                     f"{threads_profiled} worker-thread calls profiled\n\n== By own time ==\n")
+        stats.sort_stats('tottime').print_stats(REPORT_TOP)
+        report.write("\n== By cumulative time ==\n")
+        stats.sort_stats('cumulative').print_stats(REPORT_TOP)
+        with open(f"{base_path}_cpu.txt", 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+
+        allocations = snapshot.statistics('lineno')
+        with open(f"{base_path}_allocations.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Peak traced {peak_bytes / 2 ** 20:.1f} MB, still allocated at the end "
+                    f"{current_bytes / 2 ** 20:.1f} MB\n\n== Top allocation sites still held ==\n")
+            for statistic in allocations[:REPORT_TOP]:
+                f.write(f"{statistic}\n")
+            f.write("\n== Largest allocation stacks ==\n")
+            for statistic in snapshot.statistics('traceback')[:SUMMARY_TOP]:
+                f.write(f"\n{statistic.size / 1024:.1f} KiB in {statistic.count} blocks\n")
+                f.write('\n'.join(statistic.traceback.format()) + '\n')
+
+        # Pipeline functions by cumulative time: where the job's wall time went, waits included
+        # (time a coroutine spends awaiting the model is not counted; compare wall and CPU seconds)
+        pipeline_functions = [(key, value) for key, value in stats.stats.items()
+                              if key[0] != '~' and os.path.dirname(os.path.abspath(key[0])) == _PACKAGE_FOLDER
+                              and os.path.abspath(key[0]) != os.path.abspath(__file__)]
+        top_functions = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in sorted(
+                pipeline_functions, key=lambda item: item[1][3], reverse=True)[:SUMMARY_TOP]:
+            top_functions.append({
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'own_seconds': round(own, 4),
+                'cumulative_seconds': round(cumulative, 4)
+            })
+
+        print(f"🔬 Profile written to {base_path}.prof")
+        return {
+            'enabled': True,
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'peak_traced_mb': round(peak_bytes / 2 ** 20, 2),
+            'threads_profiled': threads_profiled,
+            'top_functions': top_functions,
+            'top_allocations': [{
+                'location': f"{os.path.basename(statistic.traceback[0].filename)}:{statistic.traceback[0].lineno}",
+                'size_kb': round(statistic.size / 1024, 1),
+                'count': statistic.count
+            } for statistic in allocations[:SUMMARY_TOP]],
+            'artifacts': {
+                'profile': f"{base_path}.prof",
+                'cpu_report': f"{base_path}_cpu.txt",
+                'allocations': f"{base_path}_allocations.txt"
+            }
+        }
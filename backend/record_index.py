@@ -0,0 +1,168 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from normalization import DATE_COLUMNS
+
+INDEX_FILENAME = "records_index.sqlite"
+
+# Largest page a query may return
+MAX_PAGE_SIZE = 1000
+
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+class RecordIndex:
+    """SQLite index over the rows written to csv_database_ready.
+
+    Rows are added as they are written, so reads by patient or by source
+    document are served from indexed lookups with keyset pagination instead
+    of re-reading whole CSV files per request.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                patient_id TEXT,
+                source_file TEXT,
+                record_date TEXT,
+                written_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_patient ON records (patient_id, table_name, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_source ON records (source_file, id)")
+        self._conn.commit()
+
+    def _record_date(self, table_name: str, row: Dict[str, Any], written_at: str) -> str:
+        """The row's clinical date if it is ISO formatted, otherwise when it was written"""
+        for column in DATE_COLUMNS.get(table_name, []):
+            value = row.get(column)
+            if isinstance(value, str) and _ISO_DATE.match(value):
+                return value[:10]
+        return written_at[:10]
+
+    def add_dataframe(self, table_name: str, df) -> int:
+        """Index the rows of one table that were just written"""
+        if df.empty:
+            return 0
+
+        written_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = df.astype(object).where(df.notna(), None).to_dict('records')
+        values = [
+            (table_name, str(row.get('patient_id', '') or ''), row.get('source_file'),
+             self._record_date(table_name, row, written_at), written_at, json.dumps(row, default=str))
+            for row in rows
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO records (table_name, patient_id, source_file, record_date, written_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values
+            )
+            self._conn.commit()
+        return len(values)
+
+    def _page(self, where: str, params: List[Any], limit: int, cursor: Optional[int]) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if cursor:
+            where += " AND id > ?"
+            params.append(cursor)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, table_name, record_date, data FROM records WHERE {where} ORDER BY id LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'records': [
+                {'id': row[0], 'table': row[1], 'record_date': row[2], **json.loads(row[3])} for row in rows
+            ],
+            'next_cursor': rows[-1][0] if has_more else None
+        }
+
+    def patient_records(self, patient_id: str, table_name: Optional[str] = None, since: Optional[str] = None,
+                        limit: int = 100, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Page through a patient's records, optionally for one table and from a date (YYYY-MM-DD) on"""
+        where = "patient_id = ?"
+        params: List[Any] = [patient_id]
+        if table_name:
+            where += " AND table_name = ?"
+            params.append(table_name)
+        if since:
+            where += " AND record_date >= ?"
+            params.append(since)
+        return self._page(where, params, limit, cursor)
+
+    def document_records(self, source_file: str, limit: int = 100, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Page through every record extracted from one source document"""
+        return self._page("source_file = ?", [source_file], limit, cursor)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def rebuild_from_csv(self, csv_folder: str) -> int:
+        """Replace the index with the contents of the CSV tables (backfill for existing history)"""
+        import pandas as pd
+
+        with self._lock:
+            self._conn.execute("DELETE FROM records")
+            self._conn.commit()
+
+        total = 0
+        for filename in sorted(os.listdir(csv_folder)):
+            table_name, extension = os.path.splitext(filename)
+            if extension != '.csv':
+                continue
+            for chunk in pd.read_csv(os.path.join(csv_folder, filename), dtype=str, chunksize=50000):
+                total += self.add_dataframe(table_name, chunk)
+        print(f"✅ Indexed {total} records from {csv_folder}")
+        return total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_indexes: Dict[str, RecordIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_record_index(csv_folder: str) -> RecordIndex:
+    """Shared RecordIndex for a csv_database_ready folder"""
+    csv_folder = os.path.abspath(csv_folder)
+    with _indexes_lock:
+        index = _indexes.get(csv_folder)
+        if index is None:
+            os.makedirs(csv_folder, exist_ok=True)
+            index = _indexes[csv_folder] = RecordIndex(os.path.join(csv_folder, INDEX_FILENAME))
+        return index
+
+
+def main():
+    """Rebuild the record index for an existing csv_database_ready folder"""
+    if len(sys.argv) != 2:
+        print("Usage: python record_index.py <csv_database_ready folder>")
+        sys.exit(1)
+    get_record_index(sys.argv[1]).rebuild_from_csv(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+import threading
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+# Folder inside the output folder holding uploads in progress; being on the same
+# filesystem as the output folder lets finalize move the file instead of copying it
+UPLOADS_FOLDER = "resumable_uploads"
+
+# Received bytes are written (and hashed) in pieces of about this size
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+_UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+_SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadError(Exception):
+    """A request an upload cannot accept, with the HTTP status to answer it with"""
+
+    def __init__(self, status: int, message: str, received: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.received = received
+
+    def detail(self) -> Dict[str, Any]:
+        detail = {'error': self.message}
+        if self.received is not None:
+            detail['received'] = self.received
+        return detail
+
+
+class ResumableUpload:
+    """One upload in progress: a part file that only ever grows at its end, and a running SHA-256.
+
+    The part file's length is the number of bytes received, so an upload
+    survives a server restart; the hash is then rebuilt from the part file
+    before the next chunk.
+    """
+
+    def __init__(self, upload_id: str, folder: str, filename: str, size: int, expected_sha256: Optional[str],
+                 created: float, received: int = 0):
+        self.upload_id = upload_id
+        self.folder = folder
+        self.filename = filename
+        self.size = size
+        self.expected_sha256 = expected_sha256
+        self.created = created
+        self.received = received
+        self.part_path = os.path.join(folder, 'data.part')
+        self.finalized = False
+        self.lock = asyncio.Lock()
+        self._hasher = hashlib.sha256() if received == 0 else None
+
+    def write(self, data) -> None:
+        """Append data and add it to the hash (runs in a worker thread)"""
+        if self._hasher is None:
+            self._rehash()
+        with open(self.part_path, 'ab') as f:
+            f.write(data)
+        self._hasher.update(data)
+        self.received += len(data)
+
+    def _rehash(self):
+        hasher = hashlib.sha256()
+        with open(self.part_path, 'rb') as f:
+            for block in iter(lambda: f.read(WRITE_BUFFER_BYTES), b''):
+                hasher.update(block)
+        self._hasher = hasher
+
+    def sha256(self) -> str:
+        if self._hasher is None:
+            self._rehash()
+        return self._hasher.hexdigest()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.size,
+            'received': self.received,
+            'complete': self.received == self.size
+        }
+
+
+class UploadStore:
+    """Resumable uploads kept under <output folder>/resumable_uploads until they are finalized.
+
+    A client creates an upload with the file name and size, PUTs chunks at
+    the offset it has reached (asking for the received count after a
+    dropped connection), and finalizes. Chunks are streamed to the part
+    file as they arrive, so memory use does not grow with chunk or file
+    size. A retried chunk that overlaps bytes already stored is accepted
+    and only its new tail is written. Uploads untouched for longer than
+    the expiry are removed.
+    """
+
+    def __init__(self, root: str, max_bytes: int, expiry_seconds: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.expiry_seconds = expiry_seconds
+        self._uploads: Dict[str, ResumableUpload] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, filename: str, size: int, sha256: Optional[str] = None) -> ResumableUpload:
+        """Start an upload (blocking; call from a worker thread)"""
+        filename = os.path.basename((filename or '').replace('\\', '/'))
+        if filename in ('', '.', '..'):
+            raise UploadError(400, "A file name is required")
+        if size <= 0:
+            raise UploadError(400, "Upload size must be positive")
+        if size > self.max_bytes:
+            raise UploadError(413, f"Uploads are limited to {self.max_bytes // (1024 * 1024)} MB")
+        if sha256 is not None:
+            sha256 = sha256.strip().lower()
+            if not _SHA256.fullmatch(sha256):
+                raise UploadError(400, "sha256 must be 64 hexadecimal characters")
+
+        self.sweep()
+        if shutil.disk_usage(self.root).free < size:
+            raise UploadError(507, "Not enough disk space for this upload")
+
+        upload_id = uuid.uuid4().hex
+        folder = os.path.join(self.root, upload_id)
+        os.makedirs(folder)
+        upload = ResumableUpload(upload_id, folder, filename, size, sha256, time.time())
+        open(upload.part_path, 'wb').close()
+        with open(os.path.join(folder, 'state.json'), 'w', encoding='utf-8') as f:
+            json.dump({'filename': filename, 'size': size, 'sha256': sha256, 'created': upload.created}, f)
+
+        with self._lock:
+            self._uploads[upload_id] = upload
+        print(f"📥 Started resumable upload {upload_id} for {filename} ({size} bytes)")
+        return upload
+
+    def get(self, upload_id: str) -> ResumableUpload:
+        """The upload, reloaded from disk after a restart; raises UploadError(404) if unknown"""
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            raise UploadError(404, "Upload not found")
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+
+            folder = os.path.join(self.root, upload_id)
+            try:
+                with open(os.path.join(folder, 'state.json'), encoding='utf-8') as f:
+                    state = json.load(f)
+                received = os.path.getsize(os.path.join(folder, 'data.part'))
+            except (OSError, ValueError):
+                raise UploadError(404, "Upload not found")
+            upload = ResumableUpload(upload_id, folder, state['filename'], state['size'], state.get('sha256'),
+                                     state.get('created', 0.0), received)
+            self._uploads[upload_id] = upload
+            return upload
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> ResumableUpload:
+        """Stream one chunk starting at offset into the upload"""
+        upload = await asyncio.to_thread(self.get, upload_id)
+        async with upload.lock:
+            if upload.finalized:
+                raise UploadError(409, "Upload already finalized")
+            if offset < 0 or offset > upload.received:
+                raise UploadError(409, f"Chunk starts at byte {offset} but {upload.received} bytes have been "
+                                       f"received; resume from there", upload.received)
+
+            # A retried chunk may overlap what is already stored; only its new tail is written
+            skip = upload.received - offset
+            buffer = bytearray()
+            try:
+                async for piece in chunks:
+                    if skip:
+                        dropped = min(skip, len(piece))
+                        piece = piece[dropped:]
+                        skip -= dropped
+                    if not piece:
+                        continue
+                    if upload.received + len(buffer) + len(piece) > upload.size:
+                        raise UploadError(413, "Chunk runs past the declared upload size")
+                    buffer += piece
+                    if len(buffer) >= WRITE_BUFFER_BYTES:
+                        data, buffer = buffer, bytearray()
+                        await asyncio.to_thread(upload.write, data)
+            finally:
+                # Bytes that arrived before a dropped connection are kept, so the client resumes after them
+                if buffer:
+                    await asyncio.to_thread(upload.write, buffer)
+        return upload
+
+    async def finalize(self, upload_id: str, destination_folder: str) -> Tuple[str, str]:
+        """Move the completed file into destination_folder as <upload_id>_<filename>; returns (path, sha256)"""
+        upload = await asyncio.to_thread(self.get, upload_id)
+        async with upload.lock:
+            if upload.finalized:
+                raise UploadError(409, "Upload already finalized")
+            if upload.received != upload.size:
+                raise UploadError(409, f"Upload is incomplete: {upload.received} of {upload.size} bytes received",
+                                  upload.received)
+            sha256 = await asyncio.to_thread(upload.sha256)
+            if upload.expected_sha256 and sha256 != upload.expected_sha256:
+                raise UploadError(422, f"SHA-256 mismatch: received {sha256}, expected {upload.expected_sha256}; "
+                                       f"delete the upload and send the file again")
+
+            # Prefixed with the upload ID so that a file already there under the same name is never replaced
+            destination = os.path.join(destination_folder, f"{upload.upload_id}_{upload.filename}")
+            # A rename on the same filesystem: the file is not copied again
+            await asyncio.to_thread(os.replace, upload.part_path, destination)
+            upload.finalized = True
+            await asyncio.to_thread(self._remove, upload)
+        print(f"📦 Finalized upload {upload_id} as {destination}")
+        return destination, sha256
+
+    async def discard(self, upload_id: str):
+        """Delete an upload and whatever it has received"""
+        upload = await asyncio.to_thread(self.get, upload_id)
+        async with upload.lock:
+            upload.finalized = True
+            await asyncio.to_thread(self._remove, upload)
+
+    def _remove(self, upload: ResumableUpload):
+        shutil.rmtree(upload.folder, ignore_errors=True)
+        with self._lock:
+            self._uploads.pop(upload.upload_id, None)
+
+    def sweep(self) -> int:
+        """Remove uploads with no activity for longer than the expiry; returns how many"""
+        cutoff = time.time() - self.expiry_seconds
+        removed = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_dir() or not _UPLOAD_ID.fullmatch(entry.name):
+                    continue
+                try:
+                    last_activity = os.path.getmtime(os.path.join(entry.path, 'data.part'))
+                except OSError:
+                    last_activity = entry.stat().st_mtime
+                if last_activity < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    with self._lock:
+                        self._uploads.pop(entry.name, None)
+                    removed += 1
+        if removed:
+            print(f"🧹 Removed {removed} expired resumable uploads")
+        return removed
@@ -0,0 +1,151 @@
+import os
+import uuid
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from profiling import profiled
+
+# Supported review artifact formats and their file extensions
+REVIEW_FORMATS = {'docx': '.docx', 'markdown': '.md', 'text': '.txt'}
+
+# Consolidation modes: one file per scan (None), per processing batch, or per patient
+CONSOLIDATION_MODES = (None, 'batch', 'patient')
+
+_STOP = object()
+
+
+def write_docx(text: str, output_path: str, patient_id: str):
+    """Save extracted text to a single Word document"""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading('Extracted Medical Document Text', 0)
+    doc.add_paragraph(f'Patient ID: {patient_id}')
+    doc.add_paragraph(f'Processing Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+    doc.add_paragraph('')  # Empty line
+
+    for line in text.split('\n'):
+        if line.strip():
+            doc.add_paragraph(line.strip())
+
+    doc.save(output_path)
+
+
+def _format_plain(text: str, patient_id: str, source_file: str, markdown: bool) -> str:
+    """Render one scan's text as Markdown or plain text"""
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if markdown:
+        header = [f"## {source_file}", "", f"- Patient ID: {patient_id}", f"- Processing Date: {timestamp}", ""]
+    else:
+        header = [source_file, "=" * len(source_file), f"Patient ID: {patient_id}",
+                  f"Processing Date: {timestamp}", ""]
+    return '\n'.join(header + lines) + '\n'
+
+
+class ReviewDocumentWriter:
+    """Background writer for review artifacts, kept off the extraction critical path.
+
+    submit() only queues the text and returns the path the artifact will be
+    written to; a single writer thread renders the files. close() waits for
+    the queue to drain and saves any consolidated documents.
+    """
+
+    def __init__(self, output_folder: str, review_format: str = 'docx', consolidate: Optional[str] = None):
+        if review_format not in REVIEW_FORMATS:
+            raise ValueError(f"Unsupported review format: {review_format}")
+        if consolidate not in CONSOLIDATION_MODES:
+            raise ValueError(f"Unsupported consolidation mode: {consolidate}")
+
+        self.output_folder = output_folder
+        self.review_format = review_format
+        self.consolidate = consolidate
+        # The random suffix keeps runs started in the same second from sharing consolidated files
+        self.batch_stamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.errors: List[Dict[str, str]] = []
+
+        # Consolidated documents under construction, keyed by output path
+        self._documents: Dict[str, object] = {}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=profiled(self._run), name="review-writer", daemon=True)
+        self._thread.start()
+
+    def output_path_for(self, source_file: str, patient_id: str) -> str:
+        """Path of the artifact that will hold a given scan"""
+        extension = REVIEW_FORMATS[self.review_format]
+        if self.consolidate == 'batch':
+            name = f"batch_{self.batch_stamp}_extracted{extension}"
+        elif self.consolidate == 'patient':
+            name = f"patient_{patient_id}_{self.batch_stamp}_extracted{extension}"
+        else:
+            name = f"{os.path.splitext(source_file)[0]}_extracted{extension}"
+        return os.path.join(self.output_folder, name)
+
+    def submit(self, text: str, source_file: str, patient_id: str) -> str:
+        """Queue a scan's extracted text for writing and return the artifact path"""
+        output_path = self.output_path_for(source_file, patient_id)
+        self._queue.put((text, source_file, patient_id, output_path))
+        return output_path
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            text, source_file, patient_id, output_path = item
+            try:
+                self._write(text, source_file, patient_id, output_path)
+            except Exception as e:
+                print(f"Error saving review document {output_path}: {e}")
+                self.errors.append({'filename': source_file, 'error': str(e)})
+
+    def _write(self, text: str, source_file: str, patient_id: str, output_path: str):
+        if self.review_format == 'docx':
+            if self.consolidate:
+                self._append_docx(text, source_file, patient_id, output_path)
+            else:
+                write_docx(text, output_path, patient_id)
+            return
+
+        content = _format_plain(text, patient_id, source_file, self.review_format == 'markdown')
+        mode = 'a' if self.consolidate else 'w'
+        with open(output_path, mode, encoding='utf-8') as f:
+            if self.consolidate and f.tell() > 0:
+                f.write('\n---\n\n' if self.review_format == 'markdown' else '\n\f\n')
+            f.write(content)
+
+    def _append_docx(self, text: str, source_file: str, patient_id: str, output_path: str):
+        """Add one scan to a consolidated Word document, starting on a new page"""
+        doc = self._documents.get(output_path)
+        if doc is None:
+            from docx import Document
+
+            doc = Document()
+            doc.add_heading('Extracted Medical Document Text', 0)
+            doc.add_paragraph(f'Processing Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
+            self._documents[output_path] = doc
+        else:
+            doc.add_page_break()
+
+        doc.add_heading(source_file, 1)
+        doc.add_paragraph(f'Patient ID: {patient_id}')
+        for line in text.split('\n'):
+            if line.strip():
+                doc.add_paragraph(line.strip())
+
+    def close(self) -> List[str]:
+        """Wait for queued artifacts to be written and save consolidated documents"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+        for output_path, doc in self._documents.items():
+            try:
+                doc.save(output_path)
+            except Exception as e:
+                print(f"Error saving review document {output_path}: {e}")
+                self.errors.append({'filename': output_path, 'error': str(e)})
+        self._documents.clear()
+
+        return self.errors
@@ -0,0 +1,155 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+import config
+
+# Priority classes, highest first. A class is only served when every higher class is empty.
+PRIORITY_CLASSES = ('stat', 'routine', 'bulk')
+DEFAULT_PRIORITY = 'routine'
+
+# Recent admissions kept per class for wait-time percentiles
+WAIT_SAMPLES = 1000
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class FairScheduler:
+    """Admission control for files entering the model pipeline.
+
+    At most `capacity` files run at once across every request in the
+    process. Each file makes one model call at a time, so this also caps
+    concurrent model calls. Waiting files are served by strict priority
+    class. Within a class, tenants (a submitter or patient) take turns
+    round-robin, so one large import cannot hold the queue ahead of
+    everyone else's single scans. Lives on one event loop and needs no
+    locking.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("Scheduler capacity must be at least 1")
+        self.capacity = capacity
+        self.running = 0
+        # class -> tenant -> waiting (future, enqueued_at) entries, tenants in turn order
+        self._waiting: Dict[str, OrderedDict] = {priority: OrderedDict() for priority in PRIORITY_CLASSES}
+        self._queued = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._running = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._admitted = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITY_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, priority: str = DEFAULT_PRIORITY, tenant: str = ''):
+        """Hold one of the global slots for the duration of the block"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+
+        if self.running < self.capacity and not any(self._queued.values()):
+            self._admit(priority, 0.0)
+        else:
+            await self._wait(priority, tenant)
+
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def try_acquire(self, priority: str = DEFAULT_PRIORITY) -> bool:
+        """Take a spare slot without waiting, only when nothing is queued; pair with release()"""
+        if self.running < self.capacity and not any(self._queued.values()):
+            self._admit(priority, 0.0)
+            return True
+        return False
+
+    def release(self, priority: str = DEFAULT_PRIORITY):
+        """Return a slot taken with try_acquire()"""
+        self._release(priority)
+
+    async def _wait(self, priority: str, tenant: str):
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        self._waiting[priority].setdefault(tenant, deque()).append(entry)
+        self._queued[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before the cancellation landed; hand the slot on
+                self._release(priority)
+            else:
+                self._remove(priority, tenant, entry)
+            raise
+
+    def _remove(self, priority: str, tenant: str, entry):
+        entries = self._waiting[priority].get(tenant)
+        if entries is not None and entry in entries:
+            entries.remove(entry)
+            self._queued[priority] -= 1
+            if not entries:
+                del self._waiting[priority][tenant]
+
+    def _admit(self, priority: str, waited: float):
+        self.running += 1
+        self._running[priority] += 1
+        self._admitted[priority] += 1
+        self._waits[priority].append(waited)
+
+    def _release(self, priority: str):
+        self.running -= 1
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiting files while there is free capacity"""
+        while self.running < self.capacity:
+            priority = next((priority for priority in PRIORITY_CLASSES if self._queued[priority]), None)
+            if priority is None:
+                return
+
+            tenants = self._waiting[priority]
+            tenant, entries = next(iter(tenants.items()))
+            future, enqueued_at = entries.popleft()
+            self._queued[priority] -= 1
+            if entries:
+                tenants.move_to_end(tenant)
+            else:
+                del tenants[tenant]
+            if future.cancelled():
+                continue
+
+            self._admit(priority, time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Capacity use plus per-class queue depth, admissions and wait times (ms)"""
+        classes = {}
+        for priority in PRIORITY_CLASSES:
+            waits = self._waits[priority]
+            classes[priority] = {
+                'queued': self._queued[priority],
+                'tenants_waiting': len(self._waiting[priority]),
+                'running': self._running[priority],
+                'admitted': self._admitted[priority],
+                'wait_ms': {
+                    'mean': round(sum(waits) / len(waits) * 1000, 1),
+                    'p50': round(_percentile(waits, 0.50) * 1000, 1),
+                    'p95': round(_percentile(waits, 0.95) * 1000, 1),
+                    'max': round(max(waits) * 1000, 1)
+                } if waits else None
+            }
+        return {'capacity': self.capacity, 'running': self.running, 'classes': classes}
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def get_scheduler() -> FairScheduler:
+    """Process-wide scheduler sized by OCR_MAX_MODEL_CALLS"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler(config.get_max_model_calls())
+    return _scheduler
@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+
+def request_key(patient_id: str, uploads: Iterable[Tuple[str, bytes]], *options: Any) -> str:
+    """Content key for a processing request: patient, upload contents and any output options"""
+    digest = hashlib.sha256()
+    digest.update(str(patient_id).encode())
+    for option in options:
+        digest.update(b'\0' + str(option).encode())
+    for _, content in uploads:
+        digest.update(b'\0' + hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work as a task; callers that
+    arrive while it is still running await the same task and receive the
+    same result (or exception). The key is released when the task finishes,
+    so later identical requests run again normally. The task is shielded,
+    so a caller that disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or join the execution already in flight"""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._in_flight)
+        }
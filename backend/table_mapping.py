@@ -0,0 +1,359 @@
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+# Column sources used in SECTION_MAPPINGS. Each column of a table row comes from
+# one of: a field of the section's JSON (with the value used when the field is
+# absent), a constant, a per-document value, the document's notes, or a transform
+# of a field's value.
+TIMESTAMP = object()  # field default: the document's processing timestamp
+
+
+def field(name: str, default: Any = '') -> Tuple:
+    return ('field', name, default)
+
+
+def constant(value: Any) -> Tuple:
+    return ('constant', value)
+
+
+def document(name: str) -> Tuple:
+    """'patient_id', 'source_file' or 'timestamp'"""
+    return ('document', name)
+
+
+def notes(key: str) -> Tuple:
+    return ('notes', key)
+
+
+def transform(function, name: str) -> Tuple:
+    """function(value of the field, or None when absent)"""
+    return ('transform', function, name)
+
+
+def first_name(name: Optional[str]) -> str:
+    parts = name.split() if name else []
+    return parts[0] if parts else ''
+
+
+def last_name(name: Optional[str]) -> str:
+    parts = name.split() if name else []
+    return ' '.join(parts[1:])
+
+
+def systolic(blood_pressure: Optional[str]) -> str:
+    return blood_pressure.split('/')[0] if blood_pressure else ''
+
+
+def diastolic(blood_pressure: Optional[str]) -> str:
+    parts = blood_pressure.split('/') if blood_pressure else []
+    return parts[1] if len(parts) > 1 else ''
+
+
+# Structured JSON section -> database table. Object sections become one row when
+# any of their fields is set; list sections one row per entry whose `requires`
+# field is set. Columns are written in the order listed.
+SECTION_MAPPINGS = {
+    'PATIENT_INFO': {
+        'table': 'patients_registration',
+        'list': False,
+        'columns': {
+            'patient_id': document('patient_id'),
+            'first_name': transform(first_name, 'name'),
+            'last_name': transform(last_name, 'name'),
+            'date_of_birth': field('dob'),
+            'gender': field('gender'),
+            'phone': field('phone'),
+            'email': field('email'),
+            'address': field('address'),
+            'emergency_contact': constant(''),
+            'medical_record_number': field('mrn'),
+            'notes': notes('patient_notes'),
+            'source_file': document('source_file'),
+            'processed_date': document('timestamp'),
+        }
+    },
+    'VITALS': {
+        'table': 'vitals_history',
+        'list': False,
+        'columns': {
+            'patient_id': document('patient_id'),
+            'blood_pressure_systolic': transform(systolic, 'blood_pressure'),
+            'blood_pressure_diastolic': transform(diastolic, 'blood_pressure'),
+            'heart_rate': field('heart_rate'),
+            'temperature': field('temperature'),
+            'weight': field('weight'),
+            'height': field('height'),
+            'date_recorded': field('date', TIMESTAMP),
+            'notes': notes('vitals_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'MEDICATIONS': {
+        'table': 'prescription',
+        'list': True,
+        'requires': 'name',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'medication': field('name'),
+            'dosage': field('dosage'),
+            'frequency': field('frequency'),
+            'start_date': field('start_date', TIMESTAMP),
+            'end_date': field('end_date'),
+            'doctor_id': constant(''),
+            'instructions': field('instructions'),
+            'notes': notes('medication_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'ALLERGIES': {
+        'table': 'allergy_records',
+        'list': True,
+        'requires': 'allergen',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'allergen': field('allergen'),
+            'reaction_type': field('reaction'),
+            'severity': field('severity'),
+            'date_recorded': document('timestamp'),
+            'notes': notes('allergy_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'DIAGNOSES': {
+        'table': 'diagnosis',
+        'list': True,
+        'requires': 'condition',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'primary_diagnosis': field('condition'),
+            'secondary_diagnosis': constant(''),
+            'icd_code': field('icd_code'),
+            'diagnosis_date': field('date', TIMESTAMP),
+            'doctor_id': constant(''),
+            'status': field('status', 'active'),
+            'notes': notes('diagnosis_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'LAB_RESULTS': {
+        'table': 'bloodtests',
+        'list': True,
+        'requires': 'test_name',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'test_type': field('test_name'),
+            'result_value': field('result'),
+            'unit': field('unit'),
+            'reference_range': field('reference_range'),
+            'test_date': field('date', TIMESTAMP),
+            'lab_id': constant(''),
+            'notes': notes('lab_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'SYMPTOMS': {
+        'table': 'symptoms_checker',
+        'list': True,
+        'requires': 'symptom',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'symptom': field('symptom'),
+            'severity': field('severity'),
+            'duration': field('duration'),
+            'date_reported': field('date', TIMESTAMP),
+            'notes': notes('symptom_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'FAMILY_HISTORY': {
+        'table': 'family_history',
+        'list': True,
+        'requires': 'condition',
+        'columns': {
+            'patient_id': document('patient_id'),
+            'relation': field('relation'),
+            'condition': field('condition'),
+            'age_of_onset': field('age_of_onset'),
+            'status': constant('reported'),
+            'notes': notes('family_history_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+    'SOCIAL_HISTORY': {
+        'table': 'social_history',
+        'list': False,
+        'columns': {
+            'patient_id': document('patient_id'),
+            'smoking_status': field('smoking'),
+            'alcohol_use': field('alcohol'),
+            'drug_use': constant(''),
+            'exercise_frequency': field('exercise'),
+            'occupation': field('occupation'),
+            'notes': notes('social_history_notes'),
+            'source_file': document('source_file'),
+        }
+    },
+}
+
+_DOCUMENT_VALUES = ('patient_id', 'source_file', 'timestamp')
+
+
+def _entry_column(source: Tuple) -> Tuple[str, Any, Any]:
+    """(field name, default, converter or None) for a column read from the section's JSON"""
+    if source[0] == 'transform':
+        return source[2], None, source[1]
+    return source[1], source[2], None
+
+
+def _document_column(section: str, column: str, source: Tuple):
+    """Getter for a column that is the same for every row of a document, given (patient_id, source_file, timestamp, notes)"""
+    kind = source[0]
+    if kind == 'constant':
+        value = source[1]
+        return lambda document: value
+    if kind == 'document':
+        if source[1] not in _DOCUMENT_VALUES:
+            raise ValueError(f"{section}.{column}: unknown document value {source[1]!r}")
+        position = _DOCUMENT_VALUES.index(source[1])
+        return lambda document: document[position]
+    if kind == 'notes':
+        key = source[1]
+        return lambda document: document[3].get(key, '')
+    raise ValueError(f"{section}.{column}: unknown column source {kind!r}")
+
+
+class _SectionMapping:
+    """One section's column sources resolved into getter tuples, applied by a loop per row"""
+
+    def __init__(self, section: str, mapping: Dict[str, Any]):
+        self.column_names = list(mapping['columns'])
+        self.requires = mapping.get('requires') if mapping['list'] else None
+        # (index, field name, default, converter) for columns read from each entry
+        self.entry_columns = []
+        # (index, getter) for columns shared by all rows of a document
+        self.document_columns = []
+        for index, (column, source) in enumerate(mapping['columns'].items()):
+            if source[0] in ('field', 'transform'):
+                self.entry_columns.append((index, *_entry_column(source)))
+            else:
+                self.document_columns.append((index, _document_column(section, column, source)))
+
+    def _has_data(self, content: Any) -> bool:
+        if self.requires:
+            return bool(content.get(self.requires))
+        return bool(content) and any(content.values())
+
+    def _entry_values(self, content: Dict[str, Any], timestamp: str):
+        get = content.get
+        for index, name, default, convert in self.entry_columns:
+            value = get(name, timestamp if default is TIMESTAMP else default)
+            yield index, (convert(value) if convert is not None else value)
+
+    def row(self, content: Any, document: Tuple) -> Optional[Dict[str, Any]]:
+        if not self._has_data(content):
+            return None
+        values = [None] * len(self.column_names)
+        for index, value in self._entry_values(content, document[2]):
+            values[index] = value
+        for index, value_of in self.document_columns:
+            values[index] = value_of(document)
+        return dict(zip(self.column_names, values))
+
+    def append_columns(self, content: Any, document: Tuple, columns: List[List[Any]]) -> int:
+        """Append the section's rows for one document to per-column lists; returns the number of rows"""
+        rows = 0
+        for entry in (content if self.requires else (content,)):
+            if not self._has_data(entry):
+                continue
+            for index, value in self._entry_values(entry, document[2]):
+                columns[index].append(value)
+            rows += 1
+        if rows:
+            # Per-document values are extended once per document rather than appended row by row
+            for index, value_of in self.document_columns:
+                columns[index].extend([value_of(document)] * rows)
+        return rows
+
+
+class TableMapper:
+    """SECTION_MAPPINGS resolved once into per-column getters for each section.
+
+    Column sources are checked and turned into (field, default, converter)
+    tuples for entry fields and small getters for per-document values
+    (constants, patient ID, notes) when the mapper is created, so building a
+    row is a loop over the tuples. rows() gives one document's records;
+    columns() and dataframes() convert many documents at once into
+    per-table column arrays without building a dict per row.
+    """
+
+    def __init__(self, database_tables: Dict[str, List[str]], mappings: Dict[str, Dict] = SECTION_MAPPINGS):
+        self.mappings = mappings
+        # Section -> (table, is_list), in output order
+        self.sections: Dict[str, Tuple[str, bool]] = {}
+        self.table_columns: Dict[str, List[str]] = {}
+        self._section_mappings: Dict[str, _SectionMapping] = {}
+
+        for section, mapping in mappings.items():
+            table = mapping['table']
+            if table not in database_tables:
+                raise ValueError(f"{section} maps to unknown table {table}")
+            missing = [column for column in database_tables[table] if column not in mapping['columns']]
+            if missing:
+                raise ValueError(f"{section} does not fill {table} columns: {', '.join(missing)}")
+            if mapping['list'] and not mapping.get('requires'):
+                raise ValueError(f"List section {section} needs a 'requires' field")
+
+            self.sections[section] = (table, mapping['list'])
+            self.table_columns[table] = list(mapping['columns'])
+            self._section_mappings[section] = _SectionMapping(section, mapping)
+
+    def row(self, section: str, content: Any, patient_id: str, source_file: str, timestamp: str,
+            notes: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Row for an object section or one list entry, or None when it has nothing to record"""
+        return self._section_mappings[section].row(content, (patient_id, source_file, timestamp, notes))
+
+    def rows(self, structured_data: Dict[str, Any], patient_id: str, source_file: str, timestamp: str,
+             notes: Dict[str, str]) -> Dict[str, List[Dict]]:
+        """One document's records by table"""
+        document = (patient_id, source_file, timestamp, notes)
+        database_records = {}
+        for section, (table, is_list) in self.sections.items():
+            content = structured_data.get(section)
+            section_mapping = self._section_mappings[section]
+            if not is_list:
+                row = section_mapping.row(content, document)
+                if row is not None:
+                    database_records[table] = [row]
+            elif content:
+                rows = []
+                for item in content:
+                    row = section_mapping.row(item, document)
+                    if row is not None:
+                        rows.append(row)
+                database_records[table] = rows
+        return database_records
+
+    def columns(self, documents: Iterable[Tuple[Dict[str, Any], str, str, str, Dict[str, str]]]
+                ) -> Dict[str, Dict[str, List[Any]]]:
+        """Per-table column lists for many documents, each (structured_data, patient_id, source_file, timestamp, notes).
+
+        Tables without any rows are left out.
+        """
+        arrays = {table: [[] for _ in columns] for table, columns in self.table_columns.items()}
+        counts = dict.fromkeys(arrays, 0)
+        steps = [(section, table, is_list, self._section_mappings[section], arrays[table])
+                 for section, (table, is_list) in self.sections.items()]
+        for structured_data, patient_id, source_file, timestamp, notes in documents:
+            document = (patient_id, source_file, timestamp, notes)
+            for section, table, is_list, section_mapping, columns in steps:
+                content = structured_data.get(section)
+                if is_list and not content:
+                    continue
+                counts[table] += section_mapping.append_columns(content, document, columns)
+        return {table: dict(zip(self.table_columns[table], arrays[table]))
+                for table in arrays if counts[table]}
+
+    def dataframes(self, documents: Iterable[Tuple[Dict[str, Any], str, str, str, Dict[str, str]]]):
+        """columns() as one pandas DataFrame per table"""
+        import pandas as pd
+
+        return {table: pd.DataFrame(columns) for table, columns in self.columns(documents).items()}
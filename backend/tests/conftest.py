@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Stand-in for the Gemini model: OCR answers by image bytes, structuring by the first known marker in the prompt"""
+
+    def __init__(self):
+        self.page_texts = {}       # image bytes -> OCR text
+        self.default_text = None   # OCR text for images not in page_texts
+        self.structured = []       # (marker found in the prompt, structured JSON)
+        self.ocr_calls = 0
+        self.structure_calls = 0
+        self.delay = 0.0           # seconds each async call takes
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _respond(self, contents) -> FakeResponse:
+        if isinstance(contents, list):
+            self.ocr_calls += 1
+            return FakeResponse(self.page_texts.get(contents[0]['data'], self.default_text))
+        self.structure_calls += 1
+        for marker, structured in self.structured:
+            if marker in contents:
+                return FakeResponse(json.dumps(structured))
+        return FakeResponse('{}')
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        return self._respond(contents)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._respond(contents)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Route every model call in the process to a FakeModel"""
+    import model_pool
+    from model_pool import ModelClient, ModelPool
+
+    model = FakeModel()
+    client = ModelClient('fake', 'fake-model', model=model)
+    monkeypatch.setattr(model_pool, '_pool', ModelPool({'ocr': [client], 'structure': [client]}))
+    return model
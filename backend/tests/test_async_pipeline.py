@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from OCR import MedicalOCRInterface
+from scheduler import FairScheduler
+
+
+def write_fax(path, pages: int):
+    frames = [Image.new('L', (400, 500), 255 - 20 * page) for page in range(pages)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+
+
+@pytest.fixture
+def interface(tmp_path, fake_model):
+    interface = MedicalOCRInterface()
+    interface.duplicate_detection = False
+    interface.processor.fill_gaps = False
+    interface.processor.stream_responses = False
+    interface.processor.index_records = False
+    interface.set_review_output('text')
+    interface.set_output_folder(str(tmp_path))
+    fake_model.default_text = "Page text"
+    fake_model.delay = 0.02
+    return interface
+
+
+def run(interface, jobs, max_concurrency):
+    return asyncio.run(interface._run_pipeline_async(jobs, interface.output_folder, max_concurrency=max_concurrency))
+
+
+def test_pages_of_one_document_are_ocrd_concurrently(tmp_path, fake_model, interface):
+    fax = str(tmp_path / 'fax.tif')
+    write_fax(fax, 4)
+
+    results = run(interface, [(fax, '1001')], max_concurrency=4)
+
+    assert results['processed_files'] == 1
+    assert fake_model.ocr_calls == 4
+    assert fake_model.max_in_flight == 4
+
+
+def test_pages_stay_within_the_run_concurrency(tmp_path, fake_model, interface):
+    jobs = []
+    for n in range(3):
+        fax = str(tmp_path / f'fax{n}.tif')
+        write_fax(fax, 4)
+        jobs.append((fax, '1001'))
+
+    results = run(interface, jobs, max_concurrency=2)
+
+    assert results['processed_files'] == 3
+    assert fake_model.ocr_calls == 12
+    assert fake_model.max_in_flight <= 2
+
+
+def test_pages_stay_within_the_scheduler_cap(tmp_path, fake_model, interface):
+    interface.set_scheduler(FairScheduler(1))
+    fax = str(tmp_path / 'fax.tif')
+    write_fax(fax, 4)
+
+    results = run(interface, [(fax, '1001')], max_concurrency=4)
+
+    assert results['processed_files'] == 1
+    assert fake_model.max_in_flight == 1
+
+
+def test_batch_keeps_its_review_format_when_the_interface_is_reconfigured(tmp_path, fake_model, interface):
+    fax = str(tmp_path / 'fax.tif')
+    write_fax(fax, 2)
+
+    async def batch_while_reconfigured():
+        batch = asyncio.ensure_future(interface.process_batch_async(
+            [(fax, '1001')], str(tmp_path), review_format='markdown'))
+        await asyncio.sleep(0)
+        interface.set_review_output('docx')
+        return await batch
+
+    results = asyncio.run(batch_while_reconfigured())
+
+    assert results['processed_files'] == 1
+    assert all(path.endswith('.md') for path in results['review_files'])
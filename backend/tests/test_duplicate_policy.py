@@ -0,0 +1,148 @@
+import os
+
+import pandas as pd
+import pytest
+from PIL import Image, ImageDraw
+
+from duplicate_index import compute_page_hash, hamming_distance
+from OCR import MedicalOCRInterface
+
+ALICE = {"PATIENT_INFO": {"name": "Alice Smith", "dob": "1980-01-01"}}
+BOB = {"PATIENT_INFO": {"name": "Bob Jones", "dob": "1975-05-05"}}
+
+
+def draw_form(path: str, name: str, quality: int = 90):
+    """A page of the shared intake template with only the handwritten name differing"""
+    page = Image.new('L', (850, 1100), 255)
+    draw = ImageDraw.Draw(page)
+    draw.rectangle((40, 40, 810, 140), fill=0)
+    for y in range(200, 1050, 60):
+        draw.line((60, y, 790, y), fill=0, width=3)
+    draw.text((70, 175), name, fill=0)
+    page.convert('RGB').save(path, 'JPEG', quality=quality)
+
+
+@pytest.fixture
+def interface(tmp_path, fake_model):
+    interface = MedicalOCRInterface()
+    interface.processor.fill_gaps = False
+    interface.processor.stream_responses = False
+    interface.processor.index_records = False
+    interface.set_review_output('text')
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'out').mkdir()
+    interface.set_output_folder(str(tmp_path / 'out'))
+    fake_model.structured = [("Alice Smith", ALICE), ("Bob Jones", BOB)]
+    yield interface
+    for page_index in interface._page_indexes.values():
+        page_index.close()
+
+
+def scan(tmp_path, fake_model, filename: str, name: str, quality: int = 90) -> str:
+    path = str(tmp_path / 'in' / filename)
+    draw_form(path, name, quality)
+    with open(path, 'rb') as f:
+        fake_model.page_texts[f.read()] = f"Intake form\nName: {name}"
+    return path
+
+
+def process(interface, patient_id: str, path: str):
+    assert interface.set_patient_id(patient_id)
+    assert interface.set_selected_files([path])
+    return interface.process_files()
+
+
+def registrations(interface) -> pd.DataFrame:
+    path = os.path.join(interface.output_folder, 'csv_database_ready', 'patients_registration.csv')
+    return pd.read_csv(path, dtype=str)
+
+
+@pytest.mark.parametrize('policy', ['flag', 'reuse'])
+def test_same_template_for_another_patient_is_never_reused(tmp_path, fake_model, interface, policy):
+    interface.set_duplicate_policy(policy)
+    alice = scan(tmp_path, fake_model, 'alice.jpg', 'Alice Smith')
+    bob = scan(tmp_path, fake_model, 'bob.jpg', 'Bob Jones')
+    assert hamming_distance(compute_page_hash(alice), compute_page_hash(bob)) <= interface.duplicate_threshold
+
+    process(interface, '1001', alice)
+    results = process(interface, '1002', bob)
+
+    assert results['files_duplicate'] == []
+    assert results['processed_files'] == 1
+    assert fake_model.ocr_calls == 2
+    rows = registrations(interface).set_index('patient_id')
+    assert rows.loc['1001', 'first_name'] == 'Alice'
+    assert rows.loc['1002', 'first_name'] == 'Bob'
+
+
+def test_same_template_for_same_patient_is_processed_when_text_differs(tmp_path, fake_model, interface):
+    interface.set_duplicate_policy('reuse')
+    process(interface, '1001', scan(tmp_path, fake_model, 'visit1.jpg', 'Alice Smith'))
+    results = process(interface, '1001', scan(tmp_path, fake_model, 'visit2.jpg', 'Bob Jones'))
+
+    assert results['files_duplicate'] == []
+    assert fake_model.structure_calls == 2
+    assert sorted(registrations(interface)['first_name']) == ['Alice', 'Bob']
+
+
+def test_identical_bytes_skip_ocr_under_reuse(tmp_path, fake_model, interface):
+    interface.set_duplicate_policy('reuse')
+    first = scan(tmp_path, fake_model, 'scan.jpg', 'Alice Smith')
+    copy = str(tmp_path / 'in' / 'scan_copy.jpg')
+    with open(first, 'rb') as src, open(copy, 'wb') as dst:
+        dst.write(src.read())
+
+    process(interface, '1001', first)
+    results = process(interface, '1001', copy)
+
+    assert [(d['match'], d['action']) for d in results['files_duplicate']] == [('content', 'reuse')]
+    assert fake_model.ocr_calls == 1
+    assert fake_model.structure_calls == 1
+    assert results['processed_files'] == 1
+
+
+def test_rescan_with_same_text_reuses_structuring_only(tmp_path, fake_model, interface):
+    interface.set_duplicate_policy('reuse')
+    process(interface, '1001', scan(tmp_path, fake_model, 'scan.jpg', 'Alice Smith'))
+    results = process(interface, '1001', scan(tmp_path, fake_model, 'rescan.jpg', 'Alice Smith', quality=60))
+
+    assert [d['match'] for d in results['files_duplicate']] == ['text']
+    assert fake_model.ocr_calls == 2
+    assert fake_model.structure_calls == 1
+
+
+def test_flag_is_default_and_skips_confirmed_duplicates(tmp_path, fake_model, interface):
+    assert interface.duplicate_policy == 'flag'
+    process(interface, '1001', scan(tmp_path, fake_model, 'scan.jpg', 'Alice Smith'))
+    results = process(interface, '1001', scan(tmp_path, fake_model, 'rescan.jpg', 'Alice Smith', quality=60))
+
+    assert [(d['match'], d['action']) for d in results['files_duplicate']] == [('text', 'flag')]
+    assert results['processed_files'] == 0
+    assert len(registrations(interface)) == 1
+
+
+def test_async_pipeline_never_reuses_another_patients_page(tmp_path, fake_model, interface):
+    import asyncio
+
+    interface.set_duplicate_policy('reuse')
+    alice = scan(tmp_path, fake_model, 'alice.jpg', 'Alice Smith')
+    bob = scan(tmp_path, fake_model, 'bob.jpg', 'Bob Jones')
+    asyncio.run(interface._run_pipeline_async([(alice, '1001')], interface.output_folder))
+    results = asyncio.run(interface._run_pipeline_async([(bob, '1002')], interface.output_folder))
+
+    assert results['files_duplicate'] == []
+    assert registrations(interface).set_index('patient_id').loc['1002', 'first_name'] == 'Bob'
+
+
+def test_batches_use_the_page_index_of_their_own_output_folder(tmp_path, fake_model, interface):
+    batch_folder = tmp_path / 'batch'
+    batch_folder.mkdir()
+    first = scan(tmp_path, fake_model, 'scan.jpg', 'Alice Smith')
+    rescan = scan(tmp_path, fake_model, 'rescan.jpg', 'Alice Smith', quality=60)
+
+    interface.process_batch([(first, '1001')], str(batch_folder))
+    results = interface.process_batch([(rescan, '1001')], str(batch_folder))
+
+    assert [d['match'] for d in results['files_duplicate']] == ['text']
+    assert (batch_folder / 'page_hash_index.sqlite').exists()
+    assert not os.path.exists(os.path.join(interface.output_folder, 'page_hash_index.sqlite'))
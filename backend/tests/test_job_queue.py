@@ -0,0 +1,154 @@
+import pytest
+
+from job_queue import JobQueue
+from worker import QueueWorker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite'))
+    yield queue
+    queue.close()
+
+
+def test_lease_hands_each_job_to_one_worker(queue):
+    first = queue.enqueue({'n': 1})
+    second = queue.enqueue({'n': 2})
+
+    assert queue.lease('a')['id'] == first
+    assert queue.lease('b')['id'] == second
+    assert queue.lease('c') is None
+
+
+def test_expired_lease_is_handed_out_again(queue):
+    job_id = queue.enqueue({'n': 1})
+    queue.lease('a', visibility_timeout=0)
+
+    job = queue.lease('b')
+
+    assert job['id'] == job_id
+    assert job['attempts'] == 2
+    assert queue.complete(job_id, 'a', {}) is False
+    assert queue.complete(job_id, 'b', {}) is True
+    assert queue.get(job_id)['status'] == 'done'
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    job_id = queue.enqueue({'n': 1})
+    queue.lease('a', visibility_timeout=0)
+
+    assert queue.heartbeat(job_id, 'a', visibility_timeout=60)
+    assert queue.lease('b') is None
+    assert not queue.heartbeat(job_id, 'b')
+
+
+def test_failures_retry_with_backoff_then_dead_letter(queue):
+    job_id = queue.enqueue({'n': 1}, max_attempts=2)
+
+    queue.lease('a')
+    assert queue.fail(job_id, 'a', 'boom', retry_delay=0) == 'queued'
+    queue.lease('a')
+    assert queue.fail(job_id, 'a', 'boom again', retry_delay=0) == 'dead'
+
+    job = queue.get(job_id)
+    assert (job['status'], job['last_error']) == ('dead', 'boom again')
+    assert queue.lease('a') is None
+    assert queue.requeue_dead(job_id)
+    assert queue.lease('a')['attempts'] == 1
+
+
+def test_retry_waits_for_its_backoff(queue):
+    job_id = queue.enqueue({'n': 1})
+    queue.lease('a')
+    queue.fail(job_id, 'a', 'boom', retry_delay=60)
+
+    assert queue.lease('a') is None
+
+
+def test_expired_lease_out_of_attempts_is_dead_lettered(queue):
+    job_id = queue.enqueue({'n': 1}, max_attempts=1)
+    queue.lease('a', visibility_timeout=0)
+
+    assert queue.lease('b') is None
+    assert queue.get(job_id)['status'] == 'dead'
+    assert queue.fail(job_id, 'a', 'late') == 'lost'
+
+
+def test_partial_failure_continues_as_follow_up_job(queue):
+    job_id = queue.enqueue({'files': ['a.png', 'b.png']}, max_attempts=3)
+    queue.lease('a')
+
+    retry = queue.complete_with_retry(job_id, 'a', {'processed_files': 1}, {'files': ['b.png']}, 'b.png: timeout',
+                                      retry_delay=0)
+
+    assert retry['status'] == 'queued'
+    assert queue.get(job_id)['result']['retry_job'] == retry
+    follow_up = queue.lease('a')
+    assert (follow_up['id'], follow_up['payload'], follow_up['attempts']) == (retry['job_id'], {'files': ['b.png']}, 2)
+
+
+def test_partial_failure_out_of_attempts_is_dead_lettered(queue):
+    job_id = queue.enqueue({'files': ['a.png', 'b.png']}, max_attempts=1)
+    queue.lease('a')
+
+    retry = queue.complete_with_retry(job_id, 'a', {}, {'files': ['b.png']}, 'b.png: timeout')
+
+    assert retry['status'] == 'dead'
+    assert queue.get(retry['job_id'])['last_error'] == 'b.png: timeout'
+
+
+def test_partial_failure_after_lost_lease_changes_nothing(queue):
+    job_id = queue.enqueue({'files': ['a.png']})
+    queue.lease('a', visibility_timeout=0)
+    queue.lease('b')
+
+    assert queue.complete_with_retry(job_id, 'a', {}, {'files': ['a.png']}, 'late') is None
+    assert queue.stats() == {'queued': 0, 'leased': 1, 'done': 0, 'dead': 0}
+
+
+def results(processed, failed):
+    return {'success': True, 'processed_files': len(processed), 'files_duplicate': [],
+            'files_processed': [{'filename': name} for name in processed],
+            'files_failed': [{'filename': name, 'error': 'timeout'} for name in failed]}
+
+
+@pytest.fixture
+def worker(tmp_path):
+    return QueueWorker(str(tmp_path / 'jobs.sqlite'), 'w1')
+
+
+def test_worker_requeues_only_the_failed_files(worker, queue):
+    job_id = queue.enqueue({'patient_id': '1001', 'files': ['/in/a.png', '/in/b.png']})
+    worker.run_job = lambda payload: results(['a.png'], ['b.png'])
+    worker.run(once=True)
+
+    parent = queue.get(job_id)
+    follow_up = queue.get(parent['result']['retry_job']['job_id'])
+    assert parent['status'] == 'done'
+    assert follow_up['status'] == 'queued'
+    assert follow_up['payload'] == {'patient_id': '1001', 'files': ['/in/b.png'], 'retry_of': job_id}
+
+
+def test_worker_does_not_report_done_after_losing_its_lease(worker, queue):
+    job_id = queue.enqueue({'files': ['/in/a.png']})
+    job = queue.lease('w1', visibility_timeout=0)
+    queue.lease('w2')
+
+    assert worker.finish_job(job, results(['a.png'], [])) == 'lost'
+    assert worker.finish_job(job, results([], ['a.png'])) == 'lost'
+    assert queue.get(job_id)['lease_owner'] == 'w2'
+    worker.queue.close()
+
+
+def test_worker_checks_patients_against_the_registry(tmp_path, monkeypatch):
+    registry = tmp_path / 'registry.csv'
+    registry.write_text("patient_id,name,date_of_birth,mrn\n1001,Alice Smith,1980-01-01,MRN-1\n")
+    monkeypatch.setenv('PATIENT_DIRECTORY_PATH', str(registry))
+
+    worker = QueueWorker(str(tmp_path / 'jobs.sqlite'), 'w1')
+    try:
+        assert worker.interface.patient_directory.get('1001') is not None
+        with pytest.raises(ValueError, match="Invalid patient ID"):
+            worker.run_job({'patient_id': '9999', 'output_folder': str(tmp_path), 'files': []})
+    finally:
+        worker.queue.close()
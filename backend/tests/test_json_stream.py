@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from json_stream import StreamingJSONParser
+
+RESPONSE = '```json\n' + json.dumps({
+    'PATIENT_INFO': {'name': 'Zoë "ZZ" Smith', 'dob': '1980-01-02', 'tags': ['a', 'b']},
+    'VITALS': {'blood_pressure': '120/80', 'heart_rate': 72, 'temperature': 36.6},
+    'MEDICATIONS': [
+        {'name': 'Metformin', 'dosage': '500 mg', 'instructions': 'with food\\evening, "twice"'},
+        {'name': 'Aspirin', 'doses': [81, {'unit': 'mg'}], 'active': True, 'end_date': None},
+    ],
+    'LAB_RESULTS': [{'test_name': 'HbA1c', 'result': 7.1}, 'free text entry', 42, [1, [2]]],
+    'ALLERGIES': [],
+    'notes': 'line one\nline two ✓',
+}, ensure_ascii=False, indent=2) + '\n```'
+EXPECTED = json.loads(RESPONSE[len('```json\n'):-len('\n```')])
+
+
+def parse(chunks):
+    parser = StreamingJSONParser()
+    completed = []
+    for chunk in chunks:
+        completed.extend(parser.feed(chunk))
+    return completed, parser.close()
+
+
+def array_elements(document):
+    return [(key, index, element) for key, value in document.items() if isinstance(value, list)
+            for index, element in enumerate(value)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 16, 64, len(RESPONSE)])
+def test_any_chunking_gives_the_same_elements_and_object(size):
+    completed, result = parse([RESPONSE[start:start + size] for start in range(0, len(RESPONSE), size)])
+
+    assert result == EXPECTED
+    # Arrays inside object sections (PATIENT_INFO.tags) are part of their section, not streamed
+    assert completed == array_elements(EXPECTED)
+
+
+def test_elements_are_returned_as_soon_as_they_are_complete():
+    parser = StreamingJSONParser()
+    text = '{"MEDICATIONS": [{"name": "A"}, {"name": "B"}], "VITALS": {}}'
+    first_end = text.index('}') + 1
+
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end + 1]) == [('MEDICATIONS', 0, {'name': 'A'})]
+    assert parser.feed(text[first_end + 1:]) == [('MEDICATIONS', 1, {'name': 'B'})]
+    assert parser.close() == json.loads(text)
+
+
+def test_escapes_split_across_chunks():
+    text = '{"LAB_RESULTS": ["a\\"b", "c\\\\", "\\u00e9"]}'
+    for split in range(len(text)):
+        completed, result = parse([text[:split], text[split:]])
+        assert result == json.loads(text)
+        assert [element for _, _, element in completed] == ['a"b', 'c\\', 'é']
+
+
+def test_incomplete_or_non_object_input_is_rejected():
+    parser = StreamingJSONParser()
+    parser.feed('{"MEDICATIONS": [{"name": "A"}')
+    with pytest.raises(ValueError, match="ended before"):
+        parser.close()
+
+    with pytest.raises(ValueError, match="Expected a JSON object"):
+        StreamingJSONParser().feed('[1, 2]')
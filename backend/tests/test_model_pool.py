@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+genai = pytest.importorskip('google.generativeai')
+glm = pytest.importorskip('google.ai.generativelanguage')
+
+import model_pool
+from model_pool import ModelClient
+
+
+def reply(text: str):
+    return glm.GenerateContentResponse(candidates=[{'content': {'role': 'model', 'parts': [{'text': text}]}}])
+
+
+class RecordingClient:
+    def __init__(self):
+        self.requests = []
+
+    def generate_content(self, request, **kwargs):
+        self.requests.append(request)
+        return reply('from key client')
+
+
+class RecordingAsyncClient(RecordingClient):
+    async def generate_content(self, request, **kwargs):
+        return super().generate_content(request)
+
+
+def test_models_for_extra_keys_get_their_own_service_client():
+    model = ModelClient('key 2', 'gemini-1.5-flash', api_key='key-two', own_clients=True).get_model()
+
+    assert isinstance(model._client, glm.GenerativeServiceClient)
+
+
+def test_sdk_sends_calls_through_the_per_key_clients():
+    # The pool relies on GenerativeModel using these attributes; a SDK change that
+    # stops doing so would quietly send every call with the default key
+    client = ModelClient('key 2', 'gemini-1.5-flash', api_key='key-two', own_clients=True)
+    model = client.get_model()
+    model._client = RecordingClient()
+
+    assert model.generate_content('hello').text == 'from key client'
+    assert len(model._client.requests) == 1
+
+    async def call_async():
+        async_model = client.get_async_model()
+        assert isinstance(async_model._async_client, glm.GenerativeServiceAsyncClient)
+        async_model._async_client = RecordingAsyncClient()
+        return await async_model.generate_content_async('hello')
+
+    assert asyncio.run(call_async()).text == 'from key client'
+
+
+def test_missing_sdk_client_attributes_are_an_error(monkeypatch):
+    class BareModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+    monkeypatch.setattr(genai, 'GenerativeModel', BareModel)
+
+    with pytest.raises(RuntimeError, match="separate API keys"):
+        model_pool._build_model('key-two', 'gemini-1.5-flash', own_clients=True)
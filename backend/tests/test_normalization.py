@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from normalization import TableNormalizer
+from OCR import MedicalDataProcessor
+
+
+@pytest.fixture(scope='module')
+def patterns():
+    return MedicalDataProcessor().cleansing_patterns
+
+
+def prescriptions(*start_dates):
+    return pd.DataFrame({'patient_id': ['1001'] * len(start_dates), 'start_date': list(start_dates),
+                         'end_date': [''] * len(start_dates)})
+
+
+def test_dates_readable_one_way_are_rewritten_without_an_order(patterns):
+    df = TableNormalizer(patterns, '').normalize(
+        'prescription', prescriptions('25/03/2024', '03/25/2024', '04/04/2024', 'March 4, 2024', '2024/3/4'))
+
+    assert list(df['start_date']) == ['2024-03-25', '2024-03-25', '2024-04-04', '2024-03-04', '2024-03-04']
+    assert list(df['ambiguous_dates']) == [''] * 5
+
+
+def test_ambiguous_dates_are_kept_and_flagged_without_an_order(patterns):
+    df = TableNormalizer(patterns, '').normalize('prescription', prescriptions('03/04/2024', 'unknown'))
+
+    assert list(df['start_date']) == ['03/04/2024', 'unknown']
+    assert list(df['ambiguous_dates']) == ['start_date', '']
+
+
+@pytest.mark.parametrize('order, expected', [('MDY', '2024-03-04'), ('DMY', '2024-04-03')])
+def test_configured_order_reads_ambiguous_dates(patterns, order, expected):
+    df = TableNormalizer(patterns, order).normalize('prescription', prescriptions('03/04/2024', '25/03/2024'))
+
+    assert list(df['start_date']) == [expected, '2024-03-25']
+    assert list(df['ambiguous_dates']) == ['', '']
+
+
+def test_order_comes_from_the_environment(patterns, monkeypatch):
+    monkeypatch.setenv('OCR_DATE_ORDER', 'dmy')
+    assert TableNormalizer(patterns).date_order == 'DMY'
+    monkeypatch.setenv('OCR_DATE_ORDER', 'sometimes')
+    assert TableNormalizer(patterns).date_order == ''
+
+
+def test_bulk_pass_with_an_order_converts_flagged_history(patterns, tmp_path):
+    TableNormalizer(patterns, '').normalize('prescription', prescriptions('03/04/2024', '2024-01-02')) \
+        .to_csv(tmp_path / 'prescription.csv', index=False)
+
+    TableNormalizer(patterns, 'DMY').normalize_csv_folder(str(tmp_path))
+
+    df = pd.read_csv(tmp_path / 'prescription.csv', dtype=str, keep_default_na=False)
+    assert list(df['start_date']) == ['2024-04-03', '2024-01-02']
+    assert list(df['ambiguous_dates']) == ['', '']
+
+
+def test_vitals_get_canonical_units(patterns):
+    df = TableNormalizer(patterns, '').normalize('vitals_history', pd.DataFrame({
+        'weight': ['180 lbs', '82 kg'], 'height': ['5\'10"', '178 cm'], 'temperature': ['98.6F', '37 C'],
+        'date_recorded': ['2024-03-04 10:00:00', '2024-03-05 10:00:00']}))
+
+    assert list(df['weight_kg']) == [81.6, 82.0]
+    assert list(df['height_cm']) == [177.8, 178.0]
+    assert list(df['temperature_c']) == [37.0, 37.0]
+    assert list(df['date_recorded']) == ['2024-03-04', '2024-03-05']
+
+
+def test_command_line_goes_through_the_locked_history_rewrite(tmp_path, monkeypatch):
+    import sys
+    import normalization
+
+    calls = []
+    monkeypatch.setattr(MedicalDataProcessor, 'normalize_csv_history', lambda self, folder: calls.append(folder))
+    monkeypatch.setattr(sys, 'argv', ['normalization.py', str(tmp_path)])
+
+    normalization.main()
+
+    assert calls == [str(tmp_path)]
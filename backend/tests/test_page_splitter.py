@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from PIL import Image
+
+from OCR import MedicalOCRInterface
+from page_splitter import plan_segments, render_segments, stitch_text, strip_boxes
+
+
+@pytest.fixture
+def interface(tmp_path, fake_model):
+    interface = MedicalOCRInterface()
+    interface.duplicate_detection = False
+    interface.set_output_folder(str(tmp_path))
+    interface.tile_max_side = 400
+    interface.tile_overlap = 40
+    fake_model.default_text = "Page text"
+    return interface
+
+
+def test_strips_span_the_full_width_and_cover_the_height():
+    boxes = strip_boxes(1000, 2500, 1000, 100)
+
+    assert all(left == 0 and right == 1000 for _, (left, _, right, _) in boxes)
+    assert boxes[0][1][1] == 0 and boxes[-1][1][3] == 2500
+    for (_, previous), (_, following) in zip(boxes, boxes[1:]):
+        assert following[1] < previous[3]  # neighbouring strips overlap
+    assert all(bottom - top <= 1000 for _, (_, top, _, bottom) in boxes)
+
+
+def test_wide_frames_are_scaled_down_to_the_strip_width(tmp_path):
+    path = str(tmp_path / 'wide.png')
+    Image.new('L', (1600, 2000), 255).save(path)
+
+    segments, _ = render_segments(path, plan_segments(path, 400, 40), max_side=400)
+
+    assert len(segments) > 1
+    for segment in segments:
+        with Image.open(io.BytesIO(segment['data'])) as strip:
+            assert strip.width == 400 and strip.height <= 400
+
+
+def test_side_by_side_text_keeps_its_reading_order():
+    segments = [
+        {'frame': 0, 'row': 0, 'text': "Name: Jane Doe    DOB: 01/02/1980\nAllergies: none    Weight: 60 kg"},
+        {'frame': 0, 'row': 1, 'text': "Allergies: none    Weight: 60 kg\nBP: 120/80    Pulse: 72"},
+    ]
+
+    assert stitch_text(segments) == ("Name: Jane Doe    DOB: 01/02/1980\n"
+                                      "Allergies: none    Weight: 60 kg\n"
+                                      "BP: 120/80    Pulse: 72")
+
+
+def test_oversized_single_page_is_sent_unsplit(tmp_path, fake_model, interface):
+    interface.max_decoded_bytes = 1000
+    path = str(tmp_path / 'scan.png')
+    Image.new('L', (300, 900), 255).save(path)
+
+    page_hash, segments = interface._prepare_pages(path, with_hash=True)
+
+    assert segments is None
+    assert interface.extract_text_from_image(path, segments) == "Page text"
+    assert fake_model.ocr_calls == 1
+
+
+def test_oversized_frame_does_not_fail_the_other_pages(tmp_path, fake_model, interface):
+    interface.max_decoded_bytes = 200 * 300
+    path = str(tmp_path / 'fax.tif')
+    frames = [Image.new('L', (200, 300), 255), Image.new('L', (300, 300), 255), Image.new('L', (200, 300), 255)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+
+    _, segments = interface._prepare_pages(path, with_hash=False)
+    text = interface.extract_text_from_image(path, segments)
+
+    assert fake_model.ocr_calls == 2
+    assert "--- Page 1 ---\nPage text" in text
+    assert "--- Page 2 ---\n[Page 2 not read" in text
+    assert "--- Page 3 ---\nPage text" in text
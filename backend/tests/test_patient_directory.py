@@ -0,0 +1,86 @@
+import random
+import string
+
+import pytest
+
+from patient_directory import PatientDirectory, edit_distance
+
+
+@pytest.fixture
+def directory():
+    directory = PatientDirectory()
+    directory.add('1001', 'Alice Smith', '1980-01-01', 'MRN-1')
+    directory.add('1002', 'Bob Li', '1975-05-05', 'MRN-2')
+    directory.add('1003', 'Ann Wu', '1990-02-03')
+    directory.add('1004', 'Anna Wu', '1991-02-03')
+    return directory
+
+
+def typo(word: str, rng: random.Random) -> str:
+    chars = list(word)
+    for _ in range(rng.choice((1, 2))):
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.choice('sdit')
+        if operation == 's' and position < len(chars):
+            chars[position] = rng.choice(string.ascii_lowercase)
+        elif operation == 'd' and position < len(chars) and len(chars) > 1:
+            del chars[position]
+        elif operation == 't' and position + 1 < len(chars):
+            chars[position], chars[position + 1] = chars[position + 1], chars[position]
+        else:
+            chars.insert(position, rng.choice(string.ascii_lowercase))
+    return ''.join(chars)
+
+
+def test_similar_tokens_finds_every_short_token_within_the_edit_limit():
+    rng = random.Random(7)
+    words = {''.join(rng.choice('aeilnorstu') for _ in range(rng.randint(2, 8))) for _ in range(800)}
+    directory = PatientDirectory()
+    for number, word in enumerate(sorted(words)):
+        directory.add(str(number), word)
+
+    for word in rng.sample(sorted(words), 150):
+        query = typo(word, rng)
+        expected = {token for token in words if edit_distance(query, token, 2) <= 2}
+        found = {directory._tokens[token_id] for token_id in directory._similar_tokens(query, 2)}
+        assert found == expected, query
+
+
+def test_search_tolerates_typos_in_short_names(directory):
+    assert [match['patient_id'] for match in directory.search('Bob Lee')] == ['1002']
+    assert directory.search('Alcie Smiht')[0]['patient_id'] == '1001'
+    assert directory.search('Zed Zed') == []
+
+
+def test_resolve_name_only_resolves_exact_names_unless_asked(directory):
+    assert directory.resolve_name('smith, alice') == '1001'
+    assert directory.resolve_name('Alise Smith') is None
+    assert directory.resolve_name('Alise Smith', fuzzy=True) == '1001'
+    # Equally close to two patients
+    assert directory.resolve_name('Anne Wu', fuzzy=True) is None
+
+
+def test_cross_check_flags_mismatched_details(directory):
+    assert directory.cross_check('1001', {'name': 'Alice Smyth', 'dob': 'January 1, 1980', 'mrn': 'mrn 1'}) == []
+    mismatches = directory.cross_check('1001', {'name': 'Bob Li', 'dob': '1980-02-01'})
+    assert len(mismatches) == 2
+    assert directory.cross_check('9999', {}) == ["Patient ID 9999 is not in the registry"]
+
+
+def test_ambiguous_dob_matches_either_reading_without_a_date_order(directory, monkeypatch):
+    monkeypatch.delenv('OCR_DATE_ORDER', raising=False)
+    directory.add('1005', 'Cara Diaz', '1980-03-04', 'MRN-5')
+
+    assert directory.cross_check('1005', {'dob': '03/04/1980'}) == []
+    assert directory.cross_check('1005', {'dob': '04/03/1980'}) == []
+    assert len(directory.cross_check('1005', {'dob': '05/04/1980'})) == 1
+
+    monkeypatch.setenv('OCR_DATE_ORDER', 'MDY')
+    assert directory.cross_check('1005', {'dob': '03/04/1980'}) == []
+    assert len(directory.cross_check('1005', {'dob': '04/03/1980'})) == 1
+
+
+def test_mrn_letters_must_match_too(directory):
+    assert directory.cross_check('1001', {'mrn': 'mrn / 1'}) == []
+    assert len(directory.cross_check('1001', {'mrn': 'XYZ-1'})) == 1
+    assert len(directory.cross_check('1002', {'mrn': 'MRN'})) == 1
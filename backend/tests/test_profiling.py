@@ -0,0 +1,74 @@
+import cProfile
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from profiling import JobProfiler, profiled
+
+
+class BusyProfile:
+    """A cProfile.Profile that cannot start, as when another profiler is active"""
+
+    def enable(self):
+        raise ValueError("Another profiling tool is already active")
+
+    def disable(self):
+        pass
+
+
+def work(n):
+    return sum(range(n))
+
+
+def run_in_threads(tmp_path):
+    with JobProfiler(str(tmp_path), 'job') as profiler:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(profiled(work), [10, 20, 30]))
+    return profiler, results
+
+
+def test_worker_threads_are_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PER_THREAD_PROFILES', True)
+
+    profiler, results = run_in_threads(tmp_path)
+
+    assert results == [45, 190, 435]
+    assert profiler.summary['enabled']
+    assert profiler.summary['threads_profiled'] == 3
+
+
+def test_one_profiler_covers_threads_where_per_thread_profiles_are_unsupported(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PER_THREAD_PROFILES', False)
+
+    profiler, results = run_in_threads(tmp_path)
+
+    assert results == [45, 190, 435]
+    assert profiler.summary['enabled']
+    assert profiler.summary['threads_profiled'] == 0
+
+
+def test_stage_runs_unprofiled_when_its_profiler_cannot_start(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PER_THREAD_PROFILES', True)
+    profiler = JobProfiler(str(tmp_path), 'job')
+    monkeypatch.setattr(cProfile, 'Profile', BusyProfile)
+
+    with profiler:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(profiled(work), [10, 20]))
+
+    assert results == [45, 190]
+    assert profiler.summary['enabled']
+    assert profiler.summary['threads_profiled'] == 0
+
+
+def test_job_runs_unprofiled_when_the_profiler_cannot_start(tmp_path, monkeypatch):
+    profiler = JobProfiler(str(tmp_path), 'job')
+    profiler._profile = BusyProfile()
+
+    with profiler:
+        assert work(10) == 45
+
+    assert not profiler.summary['enabled']
+    assert 'could not start' in profiler.summary['reason']
+    with JobProfiler(str(tmp_path), 'next') as following:
+        pass
+    assert following.summary['enabled']
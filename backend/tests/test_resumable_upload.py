@@ -0,0 +1,119 @@
+import os
+import asyncio
+import hashlib
+
+import pytest
+
+from resumable_upload import UploadError, UploadStore
+
+CONTENT = bytes(range(256)) * 40
+
+
+async def pieces(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'), max_bytes=1024 * 1024, expiry_seconds=3600)
+
+
+def send(store, upload_id, offset, *chunks):
+    return asyncio.run(store.write_chunk(upload_id, offset, pieces(*chunks)))
+
+
+def finalize(store, upload_id, folder):
+    return asyncio.run(store.finalize(upload_id, str(folder)))
+
+
+def test_chunks_at_the_received_offset_complete_the_file(tmp_path, store):
+    upload = store.create('scan.tif', len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+
+    send(store, upload.upload_id, 0, CONTENT[:4000])
+    send(store, upload.upload_id, 4000, CONTENT[4000:7000], CONTENT[7000:])
+    path, sha256 = finalize(store, upload.upload_id, tmp_path)
+
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_chunk_past_the_received_offset_is_refused_with_the_resume_point(store):
+    upload = store.create('scan.tif', len(CONTENT))
+    send(store, upload.upload_id, 0, CONTENT[:1000])
+
+    with pytest.raises(UploadError) as error:
+        send(store, upload.upload_id, 2000, CONTENT[2000:3000])
+
+    assert error.value.status == 409
+    assert error.value.received == 1000
+
+
+def test_retried_chunk_only_adds_its_new_tail(tmp_path, store):
+    upload = store.create('scan.tif', len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+    send(store, upload.upload_id, 0, CONTENT[:3000])
+
+    upload = send(store, upload.upload_id, 2000, CONTENT[2000:5000])
+    assert upload.received == 5000
+    send(store, upload.upload_id, 5000, CONTENT[5000:])
+
+    path, _ = finalize(store, upload.upload_id, tmp_path)
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_chunk_past_the_declared_size_is_refused(store):
+    upload = store.create('scan.tif', 100)
+
+    with pytest.raises(UploadError) as error:
+        send(store, upload.upload_id, 0, CONTENT[:150])
+
+    assert error.value.status == 413
+
+
+def test_upload_resumes_after_a_restart(tmp_path, store):
+    upload = store.create('scan.tif', len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+    send(store, upload.upload_id, 0, CONTENT[:6000])
+
+    restarted = UploadStore(store.root, store.max_bytes, store.expiry_seconds)
+    assert restarted.get(upload.upload_id).received == 6000
+    send(restarted, upload.upload_id, 6000, CONTENT[6000:])
+    _, sha256 = finalize(restarted, upload.upload_id, tmp_path)
+
+    assert sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_incomplete_or_corrupted_uploads_are_not_finalized(tmp_path, store):
+    incomplete = store.create('a.tif', len(CONTENT))
+    send(store, incomplete.upload_id, 0, CONTENT[:10])
+    corrupted = store.create('b.tif', 10, hashlib.sha256(b'x' * 10).hexdigest())
+    send(store, corrupted.upload_id, 0, CONTENT[:10])
+
+    with pytest.raises(UploadError) as error:
+        finalize(store, incomplete.upload_id, tmp_path)
+    assert error.value.status == 409
+    with pytest.raises(UploadError) as error:
+        finalize(store, corrupted.upload_id, tmp_path)
+    assert error.value.status == 422
+
+
+def test_finalize_never_replaces_an_existing_file(tmp_path, store):
+    existing = tmp_path / 'scan.tif'
+    existing.write_bytes(b'earlier scan')
+    first = store.create('scan.tif', 10)
+    second = store.create('scan.tif', 10)
+    send(store, first.upload_id, 0, CONTENT[:10])
+    send(store, second.upload_id, 0, CONTENT[10:20])
+
+    first_path, _ = finalize(store, first.upload_id, tmp_path)
+    second_path, _ = finalize(store, second.upload_id, tmp_path)
+
+    assert existing.read_bytes() == b'earlier scan'
+    assert first_path != second_path
+    assert os.path.basename(first_path) == f"{first.upload_id}_scan.tif"
+    with open(second_path, 'rb') as f:
+        assert f.read() == CONTENT[10:20]
+    with pytest.raises(UploadError) as error:
+        finalize(store, first.upload_id, tmp_path)
+    assert error.value.status == 404
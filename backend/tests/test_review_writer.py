@@ -0,0 +1,20 @@
+import pytest
+
+from review_writer import ReviewDocumentWriter
+
+
+@pytest.mark.parametrize('review_format', ['docx', 'text'])
+@pytest.mark.parametrize('consolidate', ['batch', 'patient'])
+def test_runs_started_together_never_share_a_consolidated_file(tmp_path, review_format, consolidate):
+    first = ReviewDocumentWriter(str(tmp_path), review_format, consolidate)
+    second = ReviewDocumentWriter(str(tmp_path), review_format, consolidate)
+
+    first_path = first.submit("First run text", 'a.jpg', '1001')
+    second_path = second.submit("Second run text", 'b.jpg', '1001')
+    assert first.close() == [] and second.close() == []
+
+    assert first_path != second_path
+    if review_format == 'text':
+        with open(first_path, encoding='utf-8') as f:
+            content = f.read()
+        assert "First run text" in content and "Second run text" not in content
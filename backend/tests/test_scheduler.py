@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from scheduler import FairScheduler
+
+
+async def admit_in_order(scheduler, requests):
+    """Queue (priority, tenant, label) requests behind a held slot, free it, and return the labels in admission order"""
+    order = []
+    hold = asyncio.Event()
+
+    async def holder():
+        async with scheduler.slot('bulk'):
+            await hold.wait()
+
+    async def request(priority, tenant, label):
+        async with scheduler.slot(priority, tenant):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    holding = asyncio.ensure_future(holder())
+    await asyncio.sleep(0)
+    tasks = []
+    for priority, tenant, label in requests:
+        tasks.append(asyncio.ensure_future(request(priority, tenant, label)))
+        await asyncio.sleep(0)
+    hold.set()
+    await asyncio.gather(holding, *tasks)
+    return order
+
+
+def test_higher_priority_classes_go_first():
+    order = asyncio.run(admit_in_order(FairScheduler(1), [
+        ('bulk', 'import', 'bulk'), ('routine', 'clinic', 'routine'), ('stat', 'ward', 'stat')]))
+
+    assert order == ['stat', 'routine', 'bulk']
+
+
+def test_tenants_in_a_class_take_turns():
+    order = asyncio.run(admit_in_order(FairScheduler(1), [
+        ('bulk', 'import', 'import-1'), ('bulk', 'import', 'import-2'), ('bulk', 'import', 'import-3'),
+        ('bulk', 'clinic', 'clinic-1')]))
+
+    assert order == ['import-1', 'clinic-1', 'import-2', 'import-3']
+
+
+def test_spare_slots_are_not_taken_ahead_of_waiting_files():
+    async def scenario():
+        scheduler = FairScheduler(1)
+        async with scheduler.slot('bulk'):
+            async def wait():
+                async with scheduler.slot('stat'):
+                    return scheduler.running
+            waiting = asyncio.ensure_future(wait())
+            await asyncio.sleep(0)
+            assert not scheduler.try_acquire('stat')
+        assert await waiting == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def scenario():
+        scheduler = FairScheduler(1)
+        async with scheduler.slot('routine'):
+            async def wait():
+                async with scheduler.slot('routine', 'a'):
+                    pass
+            task = asyncio.ensure_future(wait())
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert scheduler.stats()['classes']['routine']['queued'] == 0
+        assert scheduler.running == 0
+        assert scheduler.try_acquire()
+
+    asyncio.run(scenario())
+
+
+def test_capacity_and_priority_are_checked():
+    with pytest.raises(ValueError):
+        FairScheduler(0)
+
+    async def scenario():
+        async with FairScheduler(1).slot('urgent'):
+            pass
+
+    with pytest.raises(ValueError, match="Unknown priority class"):
+        asyncio.run(scenario())
@@ -0,0 +1,194 @@
+import pytest
+
+from OCR import DATABASE_TABLES
+from table_mapping import TableMapper, field
+
+TIMESTAMP = '2024-05-01 10:00:00'
+NOTES = {'patient_notes': 'pn', 'vitals_notes': 'vn', 'medication_notes': 'mn', 'allergy_notes': 'an',
+         'diagnosis_notes': 'dn', 'lab_notes': 'ln', 'symptom_notes': 'sn', 'family_history_notes': 'fn',
+         'social_history_notes': 'shn'}
+
+
+# The hand-written conversion TableMapper replaced, kept as the reference its output must match
+
+def old_object_row(section, content, patient_id, source_file, timestamp, notes):
+    if not content or not any(content.values()):
+        return None
+    if section == "PATIENT_INFO":
+        name_parts = content.get("name", "").split() if content.get("name") else ["", ""]
+        return {
+            "patient_id": patient_id,
+            "first_name": name_parts[0] if name_parts else "",
+            "last_name": " ".join(name_parts[1:]) if len(name_parts) > 1 else "",
+            "date_of_birth": content.get("dob", ""),
+            "gender": content.get("gender", ""),
+            "phone": content.get("phone", ""),
+            "email": content.get("email", ""),
+            "address": content.get("address", ""),
+            "emergency_contact": "",
+            "medical_record_number": content.get("mrn", ""),
+            "notes": notes.get("patient_notes", ""),
+            "source_file": source_file,
+            "processed_date": timestamp
+        }
+    if section == "VITALS":
+        bp_parts = content.get("blood_pressure", "").split("/") if content.get("blood_pressure") else ["", ""]
+        return {
+            "patient_id": patient_id,
+            "blood_pressure_systolic": bp_parts[0] if len(bp_parts) > 0 else "",
+            "blood_pressure_diastolic": bp_parts[1] if len(bp_parts) > 1 else "",
+            "heart_rate": content.get("heart_rate", ""),
+            "temperature": content.get("temperature", ""),
+            "weight": content.get("weight", ""),
+            "height": content.get("height", ""),
+            "date_recorded": content.get("date", timestamp),
+            "notes": notes.get("vitals_notes", ""),
+            "source_file": source_file
+        }
+    return {
+        "patient_id": patient_id,
+        "smoking_status": content.get("smoking", ""),
+        "alcohol_use": content.get("alcohol", ""),
+        "drug_use": "",
+        "exercise_frequency": content.get("exercise", ""),
+        "occupation": content.get("occupation", ""),
+        "notes": notes.get("social_history_notes", ""),
+        "source_file": source_file
+    }
+
+
+def old_item_row(section, item, patient_id, source_file, timestamp, notes):
+    if section == "MEDICATIONS":
+        if not item.get("name"):
+            return None
+        return {"patient_id": patient_id, "medication": item.get("name", ""), "dosage": item.get("dosage", ""),
+                "frequency": item.get("frequency", ""), "start_date": item.get("start_date", timestamp),
+                "end_date": item.get("end_date", ""), "doctor_id": "", "instructions": item.get("instructions", ""),
+                "notes": notes.get("medication_notes", ""), "source_file": source_file}
+    if section == "ALLERGIES":
+        if not item.get("allergen"):
+            return None
+        return {"patient_id": patient_id, "allergen": item.get("allergen", ""),
+                "reaction_type": item.get("reaction", ""), "severity": item.get("severity", ""),
+                "date_recorded": timestamp, "notes": notes.get("allergy_notes", ""), "source_file": source_file}
+    if section == "DIAGNOSES":
+        if not item.get("condition"):
+            return None
+        return {"patient_id": patient_id, "primary_diagnosis": item.get("condition", ""), "secondary_diagnosis": "",
+                "icd_code": item.get("icd_code", ""), "diagnosis_date": item.get("date", timestamp),
+                "doctor_id": "", "status": item.get("status", "active"), "notes": notes.get("diagnosis_notes", ""),
+                "source_file": source_file}
+    if section == "LAB_RESULTS":
+        if not item.get("test_name"):
+            return None
+        return {"patient_id": patient_id, "test_type": item.get("test_name", ""),
+                "result_value": item.get("result", ""), "unit": item.get("unit", ""),
+                "reference_range": item.get("reference_range", ""), "test_date": item.get("date", timestamp),
+                "lab_id": "", "notes": notes.get("lab_notes", ""), "source_file": source_file}
+    if section == "SYMPTOMS":
+        if not item.get("symptom"):
+            return None
+        return {"patient_id": patient_id, "symptom": item.get("symptom", ""), "severity": item.get("severity", ""),
+                "duration": item.get("duration", ""), "date_reported": item.get("date", timestamp),
+                "notes": notes.get("symptom_notes", ""), "source_file": source_file}
+    if not item.get("condition"):
+        return None
+    return {"patient_id": patient_id, "relation": item.get("relation", ""), "condition": item.get("condition", ""),
+            "age_of_onset": item.get("age_of_onset", ""), "status": "reported",
+            "notes": notes.get("family_history_notes", ""), "source_file": source_file}
+
+
+OLD_SECTION_TABLES = {
+    'PATIENT_INFO': ('patients_registration', False),
+    'VITALS': ('vitals_history', False),
+    'MEDICATIONS': ('prescription', True),
+    'ALLERGIES': ('allergy_records', True),
+    'DIAGNOSES': ('diagnosis', True),
+    'LAB_RESULTS': ('bloodtests', True),
+    'SYMPTOMS': ('symptoms_checker', True),
+    'FAMILY_HISTORY': ('family_history', True),
+    'SOCIAL_HISTORY': ('social_history', False)
+}
+
+
+def old_convert(structured_data, patient_id, source_file, timestamp, notes):
+    database_records = {}
+    for section, (table, is_list) in OLD_SECTION_TABLES.items():
+        content = structured_data.get(section)
+        if not is_list:
+            row = old_object_row(section, content, patient_id, source_file, timestamp, notes)
+            if row is not None:
+                database_records[table] = [row]
+        elif content:
+            rows = [old_item_row(section, item, patient_id, source_file, timestamp, notes) for item in content]
+            database_records[table] = [row for row in rows if row is not None]
+    return database_records
+
+
+DOCUMENTS = [
+    {
+        'PATIENT_INFO': {'name': 'Jane Mary Doe', 'dob': '1980-01-02', 'gender': 'F', 'mrn': 'M1'},
+        'VITALS': {'blood_pressure': '120/80', 'heart_rate': '72', 'date': '2024-04-30'},
+        'MEDICATIONS': [{'name': 'Metformin', 'dosage': '500 mg', 'start_date': None},
+                        {'name': '', 'dosage': '10 mg'}, {'dosage': '5 mg'}, {'name': 'Aspirin'}],
+        'ALLERGIES': [{'allergen': 'Penicillin', 'reaction': 'Rash', 'severity': 'moderate'}],
+        'DIAGNOSES': [{'condition': 'Type 2 diabetes', 'icd_code': 'E11'}, {'condition': 'Asthma', 'status': None}],
+        'LAB_RESULTS': [{'test_name': 'HbA1c', 'result': '7.1', 'unit': '%', 'date': '2024-04-01'}],
+        'SYMPTOMS': [{'symptom': 'Fatigue', 'duration': '2 weeks'}],
+        'FAMILY_HISTORY': [{'relation': 'Mother', 'condition': 'Hypertension'}, {'relation': 'Father'}],
+        'SOCIAL_HISTORY': {'smoking': 'never', 'occupation': 'Teacher'},
+    },
+    {
+        'PATIENT_INFO': {'name': 'Cher', 'dob': ''},
+        'VITALS': {'blood_pressure': '135', 'weight': '80 kg'},
+        'MEDICATIONS': [],
+        'SOCIAL_HISTORY': {'smoking': '', 'alcohol': ''},
+    },
+    {
+        'PATIENT_INFO': {'name': None, 'phone': '555-0100'},
+        'VITALS': {},
+        'LAB_RESULTS': [{'test_name': 'LDL'}, {'result': '3.2'}],
+    },
+    {},
+]
+
+
+@pytest.fixture
+def mapper():
+    return TableMapper(DATABASE_TABLES)
+
+
+@pytest.mark.parametrize('structured_data', DOCUMENTS)
+def test_rows_match_the_old_conversion(mapper, structured_data):
+    expected = old_convert(structured_data, '1001', 'scan.jpg', TIMESTAMP, NOTES)
+
+    records = mapper.rows(structured_data, '1001', 'scan.jpg', TIMESTAMP, NOTES)
+
+    assert records == expected
+    for table, rows in records.items():
+        for row in rows:
+            assert list(row) == mapper.table_columns[table]
+
+
+def test_columns_match_the_rows_of_every_document(mapper):
+    documents = [(structured_data, f'10{n:02d}', f'scan{n}.jpg', TIMESTAMP, NOTES)
+                 for n, structured_data in enumerate(DOCUMENTS)]
+    expected = {}
+    for document in documents:
+        for table, rows in old_convert(*document).items():
+            expected.setdefault(table, []).extend(rows)
+
+    columns = mapper.columns(documents)
+
+    assert set(columns) == {table for table, rows in expected.items() if rows}
+    for table, table_columns in columns.items():
+        assert [dict(zip(table_columns, values)) for values in zip(*table_columns.values())] == expected[table]
+
+
+def test_mapping_errors_are_reported_when_the_mapper_is_built():
+    mappings = {'VITALS': {'table': 'vitals_history', 'list': False,
+                           'columns': {column: field(column) for column in DATABASE_TABLES['vitals_history']}}}
+    mappings['VITALS']['columns']['notes'] = ('unknown', 'x')
+
+    with pytest.raises(ValueError, match="VITALS.notes: unknown column source"):
+        TableMapper(DATABASE_TABLES, mappings)
@@ -0,0 +1,163 @@
+import os
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing
+from typing import Dict, Any
+import config
+from job_queue import JobQueue, DEFAULT_VISIBILITY_TIMEOUT
+from OCR import MedicalOCRInterface
+from patient_directory import load_patient_directory
+
+
+class QueueWorker:
+    """Worker process that leases jobs from the shared queue and runs the OCR pipeline"""
+
+    def __init__(self, queue_path: str, worker_id: str = None,
+                 visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT, poll_interval: float = 1.0):
+        self.queue = JobQueue(queue_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        # Configured like the API's interface, so queued jobs get the same registry checks as /process
+        self.interface = MedicalOCRInterface()
+        self.interface.set_patient_directory(load_patient_directory(config.get_patient_directory_path()))
+        self._stopping = threading.Event()
+
+    def stop(self, *_):
+        """Finish the current job, then exit"""
+        print(f"🛑 Worker {self.worker_id} stopping after current job")
+        self._stopping.set()
+
+    def _keep_lease_alive(self, job_id: int, done: threading.Event):
+        """Extend the lease while the job is running so long files are not handed to another worker"""
+        while not done.wait(self.visibility_timeout / 3):
+            if not self.queue.heartbeat(job_id, self.worker_id, self.visibility_timeout):
+                print(f"⚠️  Lost lease on job {job_id}")
+                return
+
+    def run_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the pipeline for one queued job"""
+        interface = self.interface
+        if not interface.set_patient_id(payload['patient_id']):
+            raise ValueError(f"Invalid patient ID: {payload['patient_id']}")
+        if not interface.set_output_folder(payload['output_folder']):
+            raise ValueError(f"Invalid output folder: {payload['output_folder']}")
+        if not interface.set_selected_files(payload['files']):
+            raise ValueError("None of the job's files exist")
+
+        results = interface.process_files(profile=payload.get('profile'))
+        if not results.get('success'):
+            raise RuntimeError(results.get('error', 'Processing failed'))
+
+        # Retry only when nothing succeeded; re-running a partly processed job would append duplicate rows
+        if results['files_failed'] and not results['processed_files'] and not results['files_duplicate']:
+            raise RuntimeError(f"All files failed: {results['files_failed'][0]['error']}")
+        return results
+
+    def finish_job(self, job: Dict[str, Any], results: Dict[str, Any]) -> str:
+        """Record a job that ran; failed files continue as a follow-up job. Returns the outcome"""
+        failed_names = {entry['filename'] for entry in results['files_failed']}
+        failed_files = [path for path in job['payload']['files'] if os.path.basename(path) in failed_names]
+
+        if not failed_files:
+            if not self.queue.complete(job['id'], self.worker_id, results):
+                return self._lost_lease(job)
+            print(f"✅ Job {job['id']} done")
+            return 'done'
+
+        error = '; '.join(f"{entry['filename']}: {entry['error']}" for entry in results['files_failed'])
+        retry = self.queue.complete_with_retry(job['id'], self.worker_id, results,
+                                               {**job['payload'], 'files': failed_files, 'retry_of': job['id']},
+                                               error)
+        if retry is None:
+            return self._lost_lease(job)
+        print(f"⚠️  Job {job['id']} done with {len(failed_files)} failed files; "
+              f"they continue as job {retry['job_id']} ({retry['status']})")
+        return 'partial'
+
+    def _lost_lease(self, job: Dict[str, Any]) -> str:
+        # The lease expired (a stalled heartbeat) and the job went back to the queue or to the dead
+        # letters; this run's output stays written, and a retry may write the same rows again
+        print(f"⚠️  Job {job['id']} finished after its lease was lost; not marked done, the queue will "
+              f"retry or dead-letter it")
+        return 'lost'
+
+    def run(self, once: bool = False):
+        """Poll the queue until stopped (or until it is empty when once=True)"""
+        print(f"👷 Worker {self.worker_id} polling {self.queue.db_path}")
+
+        while not self._stopping.is_set():
+            job = self.queue.lease(self.worker_id, self.visibility_timeout)
+            if job is None:
+                if once:
+                    break
+                self._stopping.wait(self.poll_interval)
+                continue
+
+            print(f"📥 Leased job {job['id']} (attempt {job['attempts']}/{job['max_attempts']})")
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self._keep_lease_alive, args=(job['id'], done), daemon=True)
+            heartbeat.start()
+
+            try:
+                results = self.run_job(job['payload'])
+            except Exception as e:
+                done.set()
+                heartbeat.join()
+                status = self.queue.fail(job['id'], self.worker_id, str(e))
+                print(f"❌ Job {job['id']} failed ({status}): {e}")
+            else:
+                done.set()
+                heartbeat.join()
+                self.finish_job(job, results)
+
+        self.queue.close()
+
+
+def run_worker(queue_path: str, worker_id: str, visibility_timeout: float, poll_interval: float, once: bool):
+    """Run one worker in this process until it is stopped by SIGTERM/SIGINT"""
+    worker = QueueWorker(queue_path, worker_id, visibility_timeout, poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=once)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medical OCR queue worker")
+    parser.add_argument("--queue", default=config.get_queue_path(), help="Path to the shared job queue database")
+    parser.add_argument("--worker-id", default=None, help="Worker name recorded on leased jobs")
+    parser.add_argument("--visibility-timeout", type=float, default=DEFAULT_VISIBILITY_TIMEOUT,
+                        help="Seconds before an unacknowledged job is handed to another worker")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes to start, each leasing jobs independently")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.queue, args.worker_id, args.visibility_timeout, args.poll_interval, args.once)
+        return
+
+    processes = [multiprocessing.Process(target=run_worker, name=f"worker-{number}",
+                                         args=(args.queue, f"{args.worker_id}-{number}" if args.worker_id else None,
+                                               args.visibility_timeout, args.poll_interval, args.once))
+                 for number in range(1, args.processes + 1)]
+    for process in processes:
+        process.start()
+
+    def stop_all(*_):
+        # Each worker finishes its current job before exiting
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop_all)
+    signal.signal(signal.SIGINT, stop_all)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()